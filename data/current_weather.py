@@ -1,18 +1,68 @@
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 from io import StringIO
+import threading
+import time
 
 from weather import Weather
 
+# One pooled session for every query, so repeated requests reuse the same connections
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
 
-def _weatherDataToDF(text: str):
+# Parsed responses of recent radial queries: (lat, long, radius, hour) -> (expiry time, DataFrame)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def session():
+    f"""
+    The shared @Link{requests.Session} used for all ADDS queries, created on first use.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _SESSION.mount("https://", adapter)
+            _SESSION.mount("http://", adapter)
+        return _SESSION
+
+
+def clear_cache():
+    f"""
+    Forget every cached ADDS response.
+    """
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+# The only columns the fire model uses, and their types
+LEAN_COLUMNS = {"station_id": str, "observation_time": str, "latitude": np.float32, "longitude": np.float32,
+                "temp_c": np.float32, "dewpoint_c": np.float32, "wind_dir_degrees": np.float32,
+                "wind_speed_kt": np.float32, "wind_gust_kt": np.float32}
+
+
+def _weatherDataToDF(text: str, lean=False):
     f"""
     Convert an ADDS server response to a DataFrame indexed by station.
     @param text: The string of weather data to be converted.
+    @param lean: Parse only LEAN_COLUMNS, as 32 bit floats, keeping each station's most recent report.
+                 Skips the other ~35 columns, most notably raw_text, so it is several times faster and smaller.
     """
     buffer = StringIO(text)
-    df = pd.read_csv(buffer, skiprows=5, parse_dates=['observation_time'])
-    df = df.drop(["raw_text"], axis=1)
+    if not lean:
+        df = pd.read_csv(buffer, skiprows=5, parse_dates=['observation_time'])
+        df = df.drop(["raw_text"], axis=1)
+        df.set_index("station_id", inplace=True)
+        return df
+
+    df = pd.read_csv(buffer, skiprows=5, usecols=list(LEAN_COLUMNS), dtype=LEAN_COLUMNS, engine="c")
+    df["observation_time"] = pd.to_datetime(df["observation_time"], format="%Y-%m-%dT%H:%M:%SZ", utc=True)
+    # ADDS lists the reports of a station newest first
+    df = df.drop_duplicates("station_id")
     df.set_index("station_id", inplace=True)
     return df
 
@@ -25,40 +75,96 @@ class CurrentWeather(Weather):
     BASE_URL = "https://aviationweather.gov/adds/dataserver_current/httpparam"
     SINGLE_METAR_SIZE = 42
 
-    def __init__(self, radius, lat, long):
+    TIMEOUT = 10  # Seconds to wait for the ADDS server
+    CACHE_TTL = 3600  # Seconds a response is reused for, at most until the next METAR cycle
+    CACHE_PRECISION = 2  # Decimals query centers are rounded to, nearby queries share a response
+    CACHE_SIZE = 256  # Most responses cached at once
+
+    def __init__(self, radius, lat, long, timeout=None, lean=False):
         f"""
         Initialize a @Link{CurrentWeather} object. 
         :param radius: The radius to collect weather data within. [Statute Miles]
         :param lat: The latitude to center data collection on.
         :param long: The longitude to center data collection on.
+        :param timeout: Seconds to wait for the ADDS server, TIMEOUT if None.
+        :param lean: Keep only the columns the fire model uses, one report per station, see _weatherDataToDF.
         """
         self.radius = radius  # Statute miles
+        self.timeout = timeout
+        self.lean = lean
         super().__init__(lat, long)
 
     def refresh_data(self):
         f"""
-        Pull the most recent data from the ADDS server.
+        Pull the most recent data from the ADDS server, or from the cache if a query
+        around the same point was made during this METAR cycle. The DataFrame is shared, don't modify it.
         """
-        data_text = self.query()
-        return _weatherDataToDF(data_text)
+        now = time.time()
+        key = (round(self.lat, self.CACHE_PRECISION), round(self.long, self.CACHE_PRECISION), self.radius,
+               int(now // 3600), self.lean)
+        with _CACHE_LOCK:
+            if key in _CACHE and _CACHE[key][0] > now:
+                return _CACHE[key][1]
+
+        data = _weatherDataToDF(self.query(*key[:2]), lean=self.lean)
+
+        with _CACHE_LOCK:
+            for old in [old for old in _CACHE if _CACHE[old][0] <= now]:
+                del _CACHE[old]
+            while len(_CACHE) >= self.CACHE_SIZE:
+                del _CACHE[next(iter(_CACHE))]
+            _CACHE[key] = min(now + self.CACHE_TTL, (key[3] + 1) * 3600), data
+        return data
 
-    def query(self) -> str:
+    def query(self, lat=None, long=None) -> str:
         f"""
         Collect current weather data from all stations available within this @Link{CurrentWeather} 
         object's radius.
+        @param lat: The latitude to center the query on, this object's if None.
+        @param long: The longitude to center the query on, this object's if None.
         """
-        distance_string = F"{self.radius};{self.long},{self.lat}"
+        lat = self.lat if lat is None else lat
+        long = self.long if long is None else long
+        distance_string = F"{self.radius};{long},{lat}"
 
         query = {"dataSource": "metars", "requestType": "retrieve", "format": "csv",
                  "radialDistance": distance_string, "hoursBeforeNow": "1"}
 
-        data = requests.get(self.BASE_URL, params=query)
+        return self.retrieve(query, self.timeout)
+
+    @classmethod
+    def retrieve(cls, query, timeout=None) -> str:
+        f"""
+        Send a query to the ADDS server.
+        @param query: the query parameters
+        @param timeout: seconds to wait for the server, TIMEOUT if None
+        """
+        data = session().get(cls.BASE_URL, params=query, timeout=cls.TIMEOUT if timeout is None else timeout)
 
         if data.status_code != 200:
             raise ValueError(f"ADDS Server returned status code {data}; check arguments and retry query")
 
         return data.text
 
+    @classmethod
+    def covering(cls, min_lat, min_long, max_lat, max_long, timeout=None, lean=False):
+        f"""
+        Bulk pull of the most recent data from all stations in a box, such as the extent of a landscape,
+        in a single query. Use nearestStations on the result to look up many points at once.
+        @param min_lat: southern edge of the box
+        @param min_long: western edge of the box
+        @param max_lat: northern edge of the box
+        @param max_long: eastern edge of the box
+        @param timeout: seconds to wait for the server, TIMEOUT if None
+        @param lean: keep only the columns the fire model uses, one report per station, see _weatherDataToDF
+        """
+        query = {"dataSource": "metars", "requestType": "retrieve", "format": "csv",
+                 "minLat": min_lat, "minLon": min_long, "maxLat": max_lat, "maxLon": max_long, "hoursBeforeNow": "1"}
+        weather = cls.bulk(_weatherDataToDF(cls.retrieve(query, timeout), lean=lean), (min_lat + max_lat) / 2,
+                           (min_long + max_long) / 2)
+        weather.radius, weather.timeout, weather.lean = None, timeout, lean
+        return weather
+
     def most_recent(self):
         f"""
         Get the most recent data available.
@@ -72,7 +178,8 @@ class CurrentWeather(Weather):
         @param station: The station to search for
         """
         data = self.data.loc[station]
-        if data.size > self.SINGLE_METAR_SIZE:
+        # stations with several reports give a DataFrame, newest first
+        if isinstance(data, pd.DataFrame):
             return data.iloc[0]
         return data
 
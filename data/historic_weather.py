@@ -3,9 +3,100 @@ import urllib
 import json
 import pandas as pd
 import datetime
+import os
+import sqlite3
+import threading
+import time
 
 from weather import Weather
 
+_TOKEN = None
+
+
+def _token():
+    """
+    The NCDC API token, read from .ncdc_token once per process
+    """
+    global _TOKEN
+    if _TOKEN is None:
+        _TOKEN = open(".ncdc_token").read().strip()
+    return _TOKEN
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter, safe to share between threads
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        @param rate: tokens added per second
+        @param capacity: most tokens the bucket holds, i.e. the largest burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if the bucket is empty
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """
+    Persistent cache of API responses in SQLite, keyed by resource and parameters, safe to share between threads
+    """
+
+    def __init__(self, path):
+        """
+        @param path: the SQLite database file, created if necessary
+        """
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                    "(key TEXT PRIMARY KEY, fetched REAL NOT NULL, body TEXT NOT NULL)")
+
+    @staticmethod
+    def key(resource, params):
+        """
+        @return: the cache key of a query, independent of the order of its parameters
+        """
+        return resource + "?" + json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, resource, params, max_age=None):
+        """
+        @param max_age: oldest response to accept [seconds], any age if None
+        @return: the cached response body, None if there is none
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT fetched, body FROM responses WHERE key = ?",
+                                          (self.key(resource, params),)).fetchone()
+        if row is None or (max_age is not None and time.time() - row[0] > max_age):
+            return None
+        return row[1]
+
+    def put(self, resource, params, body):
+        """
+        Store a response body
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                                    (self.key(resource, params), time.time(), body))
+
 
 class HistoricWeather(Weather):
     """
@@ -15,14 +106,27 @@ class HistoricWeather(Weather):
     DATA_ID = ""
     DATA_TYPES = ""
 
+    TIMEOUT = 30  # Seconds to wait for the NCDC server
+    PAGE_SIZE = 1000  # Most results the NCDC API returns per request
+    MAX_RETRIES = 5  # Attempts at a query the NCDC server turns away for going over quota
+    CACHE_PATH = ".ncdc_cache.sqlite"
+
+    # Shared by every query in the process: the CDO quotas of 5 requests per second and 10,000 per day
+    # (the daily bucket starts full, so a fresh process can't know what earlier ones have spent)
+    SECOND_LIMITER = TokenBucket(5, 5)
+    DAY_LIMITER = TokenBucket(10000 / 86400, 10000)
+
+    _session = requests.Session()
+    _caches = {}
+    _caches_lock = threading.Lock()
+
     def __init__(self, start_date, end_date, lat, long):
         """
         Initialize a HistoricWeather object
         @param start_date: The start date for weather queries
         @param end_date: The end date for weather queries
         """
-        token = open(".ncdc_token").read()
-        self.headers = {"token": token}
+        self.headers = {"token": _token()}
         start_date = start_date.strftime("%Y-%m-%d")
         self.start_date = start_date
         end_date = end_date.strftime("%Y-%m-%d")
@@ -32,16 +136,63 @@ class HistoricWeather(Weather):
     def refresh_data(self):
         return self.get_stations(2)
 
+    @classmethod
+    def cache(cls):
+        """
+        The response cache at CACHE_PATH, opened once per process
+        """
+        with cls._caches_lock:
+            path = os.path.abspath(cls.CACHE_PATH)
+            if path not in cls._caches:
+                cls._caches[path] = ResponseCache(path)
+            return cls._caches[path]
+
     def query(self, resource, params):
         """
-        Query the NCDC web API
+        Query the NCDC web API, answering from the response cache when the same query has been made before
         @param resource: The resource to query
         @param params: The parameters to use
-        @return:
+        @return: The response body
         """
+        cache = self.cache()
+        body = cache.get(resource, params)
+        if body is not None:
+            return body
+
         endpoint = self.BASE_URL + resource
-        response = requests.get(endpoint, headers=self.headers, params=params)
-        return response
+        for attempt in range(self.MAX_RETRIES):
+            self.SECOND_LIMITER.acquire()
+            self.DAY_LIMITER.acquire()
+            response = self._session.get(endpoint, headers=self.headers, params=params, timeout=self.TIMEOUT)
+            if response.status_code != 429:
+                break
+            time.sleep(2 ** attempt)
+
+        if response.status_code != 200:
+            raise ValueError(f"NCDC Server returned status code {response.status_code}; check arguments and retry")
+
+        # an empty body means no data, which is worth remembering as well
+        cache.put(resource, params, response.text)
+        return response.text
+
+    def query_all(self, resource, params):
+        """
+        Query the NCDC web API for every page of results
+        @param resource: The resource to query
+        @param params: The parameters to use, without limit or offset
+        @return: A list of all results
+        """
+        results, offset = [], 1
+        while True:
+            body = self.query(resource, dict(params, limit=self.PAGE_SIZE, offset=offset))
+            data = json.loads(body) if body else {}
+            results += data.get("results", [])
+
+            # offsets count from 1, the resultset tells how many results there are in total
+            count = data.get("metadata", {}).get("resultset", {}).get("count", 0)
+            offset += self.PAGE_SIZE
+            if offset > count:
+                return results
 
     def get_stations(self, width):
         """
@@ -53,11 +204,10 @@ class HistoricWeather(Weather):
         extent = f"{self.lat - width/2},{self.long-width/2},{self.lat+width/2},{self.long+width/2}"
         params = {"datasetid": self.DATA_ID, "startdate": self.start_date, "enddate": self.end_date,
                   "extent": extent, "sortfield": "maxdate", "sortorder": "desc", "datatypeid": self.DATA_TYPES}
-        response = self.query("stations", params)
-        if response.text == "{}":
+        stations = self.query_all("stations", params)
+        if not stations:
             raise ValueError(F"Data is not available for this date {self.end_date} and location {self.long, self.lat}. Try again with different parameters.")
-        data = json.loads(response.text)
-        stations = pd.DataFrame(data["results"])
+        stations = pd.DataFrame(stations)
         stations.set_index("id", inplace=True)
         return stations
 
@@ -69,8 +219,7 @@ class HistoricWeather(Weather):
         """
         params = {"datasetid": self.DATA_ID, "startdate": self.start_date, "enddate": self.end_date, "limit": 3,
                   "sortfield": "date", "sortorder": "desc", "stationid":station, "datatypeid": self.DATA_TYPES}
-        response = self.query("data", params)
-        data = json.loads(response.text)
+        data = json.loads(self.query("data", params))
         reports = pd.DataFrame(data["results"])
         reports.drop(["station", "attributes", "date"], axis=1, inplace=True)
         reports.set_index("datatype", inplace=True)
@@ -81,11 +230,47 @@ class DailyWeather(HistoricWeather):
     DATA_ID = "GHCND"
     DATA_TYPES = "TMAX,WDF2,WSF2"
 
-    def __init__(self, date, lat, long):
-        start_date = datetime.datetime.strptime(date, "%Y-%m-%d") + datetime.timedelta(days=-1)
-        end_date = datetime.datetime.strptime(date, "%Y-%m-%d")
+    # The NCDC API serves daily data for at most a year per query
+    MAX_RANGE_DAYS = 365
+
+    def __init__(self, date, lat, long, end_date=None):
+        """
+        Initialize a DailyWeather object for a single date, or a range of dates
+        @param date: The date to query, or the first date of the range ["%Y-%m-%d"]
+        @param end_date: The last date of the range ["%Y-%m-%d"], a single date if None
+        """
+        if end_date is None:
+            start_date = datetime.datetime.strptime(date, "%Y-%m-%d") + datetime.timedelta(days=-1)
+            end_date = datetime.datetime.strptime(date, "%Y-%m-%d")
+        else:
+            start_date = datetime.datetime.strptime(date, "%Y-%m-%d")
+            end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d")
         super().__init__(start_date, end_date, lat, long)
 
+    def weather_range(self, station):
+        """
+        Return every day of data from a single station in this object's range of dates, in as few requests as the
+        API allows: one per page of results per year
+        @param station: The station to query
+        @return: A dataframe with a row for each date and a column for each variable
+        """
+        start = datetime.datetime.strptime(self.start_date, "%Y-%m-%d")
+        end = datetime.datetime.strptime(self.end_date, "%Y-%m-%d")
+        results = []
+        while start <= end:
+            stop = min(end, start + datetime.timedelta(days=self.MAX_RANGE_DAYS - 1))
+            params = {"datasetid": self.DATA_ID, "startdate": start.strftime("%Y-%m-%d"),
+                      "enddate": stop.strftime("%Y-%m-%d"), "sortfield": "date", "sortorder": "asc",
+                      "stationid": station, "datatypeid": self.DATA_TYPES}
+            results += self.query_all("data", params)
+            start = stop + datetime.timedelta(days=1)
+
+        if not results:
+            return pd.DataFrame(columns=self.DATA_TYPES.split(","), dtype=float)
+        reports = pd.DataFrame(results)
+        reports["date"] = pd.to_datetime(reports["date"])
+        return reports.pivot_table(index="date", columns="datatype", values="value", aggfunc="first")
+
 
 class WeatherNormals(HistoricWeather):
     DATA_ID = "NORMAL_MLY"
@@ -112,6 +297,16 @@ def daily_example():
     print(F"wind direction: {weather['value']['WDF2']} degrees CW from N\n")
 
 
+def range_example():
+    """
+    Example usage of a DailyWeather range query
+    """
+    lat, long = 42.73131121772554, -84.4827754135353
+    w = DailyWeather("2021-08-01", lat, long, end_date="2021-08-31")
+    weather = w.weather_range(w.getNearestStation())
+    print(F"maximum temperatures in August 2021: {list(weather['TMAX'] / 10)} C\n")
+
+
 def normals_example():
     """
     Example usage of the WeatherNormals class
@@ -125,4 +320,5 @@ def normals_example():
 
 if __name__ == '__main__':
     daily_example()
+    range_example()
     normals_example()
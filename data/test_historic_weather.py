@@ -0,0 +1,241 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import historic_weather
+from historic_weather import DailyWeather, HistoricWeather, TokenBucket
+
+STATIONS = [{"id": "GHCND:USW00014836", "latitude": 42.7761, "longitude": -84.5997, "maxdate": "2022-03-10"},
+            {"id": "GHCND:USC00201250", "latitude": 42.7000, "longitude": -84.4500, "maxdate": "2022-03-10"}]
+
+
+class StandInNCDC:
+    """
+    Local stand-in for the NCDC CDO web API, paging its results by limit and offset as the API does, turning
+    away the first refusals queries with a 429, and recording every query
+    """
+
+    def __init__(self, refusals=0):
+        self.queries, self.refusals = [], refusals
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                stand_in.queries.append((url.path.rsplit("/", 1)[-1], params, self.headers.get("token")))
+                if stand_in.refusals:
+                    stand_in.refusals -= 1
+                    self.send_response(429)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                results = stand_in.results(url.path.rsplit("/", 1)[-1], params)
+                offset, limit = int(params.get("offset", 1)), int(params.get("limit", 25))
+                # the API answers a query without results with an empty object
+                body = json.dumps({"metadata": {"resultset": {"offset": offset, "count": len(results),
+                                                              "limit": limit}},
+                                   "results": results[offset - 1:offset - 1 + limit]} if results else {}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/cdo-web/api/v2/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def results(resource, params):
+        """
+        Every station, or one report of each data type for each day from startdate to enddate
+        """
+        if resource == "stations":
+            return STATIONS
+        start = datetime.date.fromisoformat(params["startdate"])
+        end = datetime.date.fromisoformat(params["enddate"])
+        return [{"date": f"{start + datetime.timedelta(days=day)}T00:00:00", "datatype": datatype,
+                 "station": params["stationid"], "attributes": ",,W,", "value": (start.toordinal() + day) % 100}
+                for day in range((end - start).days + 1) for datatype in params["datatypeid"].split(",")]
+
+    def requests(self, resource):
+        """
+        Parameters of every query of a resource, in order
+        """
+        return [params for queried, params, _ in self.queries if queried == resource]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HistoricWeatherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.ncdc = StandInNCDC()
+        self.addCleanup(self.ncdc.close)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_path = os.path.join(directory.name, "cache.sqlite")
+
+        for patch in (mock.patch.object(historic_weather, "_TOKEN", "stand-in token"),
+                      mock.patch.object(HistoricWeather, "BASE_URL", self.ncdc.url),
+                      mock.patch.object(HistoricWeather, "CACHE_PATH", self.cache_path),
+                      mock.patch.object(HistoricWeather, "SECOND_LIMITER", TokenBucket(1000, 1000)),
+                      mock.patch.object(HistoricWeather, "DAY_LIMITER", TokenBucket(1000, 1000)),
+                      mock.patch.object(HistoricWeather, "PAGE_SIZE", 10),
+                      mock.patch.dict(HistoricWeather._caches, clear=True)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        # the caches opened by a test are closed before the patches come off
+        self.addCleanup(lambda: [cache.connection.close() for cache in HistoricWeather._caches.values()])
+        self.weather = DailyWeather("2022-03-10", 42.7313, -84.4828)
+
+    def test_stations(self):
+        """
+        GIVEN a stand-in NCDC server
+        WHEN weather around a point is set up
+        THEN the stations come from one query carrying the token, and the nearest one is found among them
+        """
+        (_, params, token), = self.ncdc.queries
+        self.assertEqual("stand-in token", token)
+        self.assertEqual(("GHCND", "2022-03-09", "2022-03-10"),
+                         (params["datasetid"], params["startdate"], params["enddate"]))
+        self.assertEqual("GHCND:USC00201250", self.weather.getNearestStation())
+
+    def test_pagination(self):
+        """
+        GIVEN queries with 25 and 20 results, 10 to a page
+        WHEN every page of each is queried
+        THEN the offsets step a page at a time from 1, stopping at the last page even when it is full
+        """
+        for days, offsets in ((25, ["1", "11", "21"]), (20, ["1", "11"])):
+            self.ncdc.queries.clear()
+            end = datetime.date(2022, 3, 1) + datetime.timedelta(days=days - 1)
+            results = self.weather.query_all("data", {"datasetid": "GHCND", "startdate": "2022-03-01",
+                                                      "enddate": str(end), "stationid": STATIONS[0]["id"],
+                                                      "datatypeid": "TMAX"})
+            self.assertEqual(days, len(results))
+            self.assertEqual(days, len({result["date"] for result in results}))
+            self.assertEqual(offsets, [params["offset"] for params in self.ncdc.requests("data")])
+            self.assertTrue(all(params["limit"] == "10" for params in self.ncdc.requests("data")))
+
+    def test_cached(self):
+        """
+        GIVEN a query answered by the stand-in NCDC server
+        WHEN the same query is made again, with its parameters in another order, then again from a cache
+             opened anew on the same SQLite file, as a later process would
+        THEN both are answered from the cache without any request
+        """
+        first = self.weather.weather_by_station(STATIONS[0]["id"])
+        self.assertEqual(1, len(self.ncdc.requests("data")))
+
+        params = {"datasetid": "GHCND", "startdate": "2022-03-09", "enddate": "2022-03-10", "limit": 3,
+                  "sortfield": "date", "sortorder": "desc", "stationid": STATIONS[0]["id"],
+                  "datatypeid": "TMAX,WDF2,WSF2"}
+        body = self.weather.query("data", dict(reversed(list(params.items()))))
+        self.assertEqual(1, len(self.ncdc.requests("data")))
+
+        for cache in HistoricWeather._caches.values():
+            cache.connection.close()
+        HistoricWeather._caches.clear()
+        self.assertEqual(body, self.weather.query("data", params))
+        self.assertEqual(first.to_dict(), self.weather.weather_by_station(STATIONS[0]["id"]).to_dict())
+        self.assertEqual(1, len(self.ncdc.requests("data")))
+
+    def test_retry(self):
+        """
+        GIVEN a stand-in NCDC server turning away the next query for going over quota
+        WHEN the query is made
+        THEN it is retried after waiting a second, and its answer cached
+        """
+        self.ncdc.refusals = 1
+        start = time.monotonic()
+        weather = self.weather.weather_by_station(STATIONS[1]["id"])
+        self.assertGreaterEqual(time.monotonic() - start, 1.)
+        self.assertEqual(2, len(self.ncdc.requests("data")))
+        self.assertEqual({"TMAX", "WDF2", "WSF2"}, set(weather.index))
+
+        self.weather.weather_by_station(STATIONS[1]["id"])
+        self.assertEqual(2, len(self.ncdc.requests("data")))
+
+    def test_refused(self):
+        """
+        GIVEN a stand-in NCDC server turning away every query for going over quota
+        WHEN a query is made
+        THEN it gives up after MAX_RETRIES attempts, caching nothing
+        """
+        self.ncdc.refusals = 3
+        with mock.patch.object(HistoricWeather, "MAX_RETRIES", 3), mock.patch("historic_weather.time.sleep"):
+            with self.assertRaises(ValueError):
+                self.weather.weather_by_station(STATIONS[1]["id"])
+        self.assertEqual(3, len(self.ncdc.requests("data")))
+
+        self.weather.weather_by_station(STATIONS[1]["id"])
+        self.assertEqual(4, len(self.ncdc.requests("data")))
+
+    def test_weather_range(self):
+        """
+        GIVEN a range of a year and a half of dates
+        WHEN its daily weather is pulled from a station
+        THEN it takes one paginated query per year of the range, and comes back one row per date with a column
+             per variable
+        """
+        weather = DailyWeather("2021-01-01", 42.7313, -84.4828, end_date="2022-06-30")
+        self.ncdc.queries.clear()
+        reports = weather.weather_range(STATIONS[0]["id"])
+
+        years = [(params["startdate"], params["enddate"]) for params in self.ncdc.requests("data")
+                 if params["offset"] == "1"]
+        self.assertEqual([("2021-01-01", "2021-12-31"), ("2022-01-01", "2022-06-30")], years)
+        self.assertEqual(-(-365 * 3 // 10) + -(-181 * 3 // 10), len(self.ncdc.requests("data")))
+        self.assertEqual(546, len(reports))
+        self.assertEqual(["TMAX", "WDF2", "WSF2"], sorted(reports.columns))
+        self.assertEqual(datetime.date(2021, 1, 1).toordinal() % 100, reports["TMAX"].iloc[0])
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def test_rate(self):
+        """
+        GIVEN a bucket of 20 tokens a second holding at most 2
+        WHEN four threads take 6 tokens each
+        THEN after the first 2 the tokens are spaced out at the rate of the bucket, across all the threads
+        """
+        bucket, times, lock = TokenBucket(20, 2), [], threading.Lock()
+
+        def take():
+            for _ in range(6):
+                bucket.acquire()
+                with lock:
+                    times.append(time.monotonic())
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        times.sort()
+        self.assertEqual(24, len(times))
+        # the 22 tokens beyond the burst arrive one every 1/20 seconds
+        self.assertGreaterEqual(times[-1] - times[0], 21 / 20 * .95)
+        self.assertLess(times[-1] - times[0], 22 / 20 + .5)
+        # in no half second are more tokens taken than the burst and the rate allow
+        for first, start in enumerate(times):
+            self.assertLessEqual(sum(start <= other < start + .5 for other in times[first:]), 2 + 20 * .5 + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
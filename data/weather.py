@@ -1,7 +1,12 @@
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
 import geopy.distance
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_MI = 3958.7613
 
 
 def _coordDistance(row, lat, long):
@@ -15,14 +20,109 @@ def _coordDistance(row, lat, long):
     return geopy.distance.distance((lat, long), (row['latitude'], row['longitude'])).mi
 
 
+def haversine(lat, long, lats, longs):
+    f"""
+    Great-circle distances from one point to many, on a spherical Earth.
+    Within 0.5% of the geodesic distances geopy computes, at a fraction of the cost.
+    @param lat: the latitude of the point to calculate distances from [degrees]
+    @param long: the longitude of the point to calculate distances from [degrees]
+    @param lats: array of latitudes to calculate distances to [degrees]
+    @param longs: array of longitudes to calculate distances to [degrees]
+    @return: array of distances [statute miles]
+    """
+    lat, long = np.radians(lat), np.radians(long)
+    lats, longs = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(longs, dtype=np.float64))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((longs - long) / 2) ** 2
+    return 2 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _unitVectors(lats, longs):
+    f"""
+    Points on the unit sphere, where straight-line and great-circle distances grow together.
+    @param lats: array of latitudes [degrees]
+    @param longs: array of longitudes [degrees]
+    @return: (n, 3) array of unit vectors
+    """
+    lats, longs = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(longs, dtype=np.float64))
+    return np.stack([np.cos(lats) * np.cos(longs), np.cos(lats) * np.sin(longs), np.sin(lats)], axis=-1)
+
+
+class StationIndex:
+    f"""
+    KD-tree over weather stations on the unit sphere, answering nearest and k-nearest
+    queries for whole batches of points at once.
+    """
+    def __init__(self, stations):
+        f"""
+        Build the index once from a table of stations.
+        @param stations: DataFrame indexed by station with 'latitude' and 'longitude' columns.
+                         Stations with several reports are indexed once, at their first report.
+        """
+        stations = stations[~stations.index.duplicated()]
+        stations = stations[stations['latitude'].notna() & stations['longitude'].notna()]
+        self.stations = stations.index.to_numpy()
+        self.tree = cKDTree(_unitVectors(stations['latitude'], stations['longitude']))
+
+    def __len__(self):
+        return len(self.stations)
+
+    def query(self, lats, longs, k=1):
+        f"""
+        Find the stations nearest to a batch of points.
+        @param lats: array of latitudes of the points [degrees]
+        @param longs: array of longitudes of the points [degrees]
+        @param k: number of stations to find per point
+        @return: (n, k) arrays of stations and great-circle distances [statute miles], nearest first
+        """
+        chords, rows = self.tree.query(_unitVectors(np.atleast_1d(lats), np.atleast_1d(longs)), k=k)
+        chords, rows = chords.reshape(len(rows), k), rows.reshape(len(rows), k)
+        return self.stations[rows], 2 * EARTH_RADIUS_MI * np.arcsin(np.clip(chords / 2, 0, 1))
+
+
 class Weather:
     """
     Abstract class for weather queries
     """
+    MAX_CONCURRENT = 8  # Most station queries in flight at once
     def __init__(self, lat, long):
         self.lat = lat
         self.long = long
         self.data = self.refresh_data()
+        self._index = None
+
+    @classmethod
+    def bulk(cls, data, lat=None, long=None):
+        f"""
+        Bulk constructor: wraps station data pulled once, e.g. over a whole landscape,
+        so many points can be looked up in it without querying again.
+        @param data: station data, as refresh_data would return it
+        @param lat: the latitude single-point queries are made from
+        @param long: the longitude single-point queries are made from
+        """
+        weather = cls.__new__(cls)
+        weather.lat, weather.long = lat, long
+        weather.data = data
+        weather._index = None
+        return weather
+
+    @property
+    def index(self):
+        f"""
+        The @Link{StationIndex} over this @Link{Weather}'s stations, built on first use.
+        """
+        if self._index is None:
+            self._index = StationIndex(self.data)
+        return self._index
+
+    def nearestStations(self, lats, longs, k=1):
+        f"""
+        Find the nearest weather stations to a batch of points.
+        @param lats: array of latitudes [degrees]
+        @param longs: array of longitudes [degrees]
+        @param k: number of stations to find per point
+        @return: (n, k) arrays of stations and distances [statute miles], nearest first
+        """
+        return self.index.query(lats, longs, k=k)
 
     @abstractmethod
     def refresh_data(self):
@@ -32,10 +132,70 @@ class Weather:
     def weather_by_station(self, station):
         pass
 
-    def getNearestStation(self):
+    def stationDistances(self, geodesic=False):
+        f"""
+        Distance from the latitude and longitude provided to every station in this @Link{Weather}.
+        @param geodesic: use geopy's geodesic distance instead of the much faster great-circle one
+        @return: Series of distances [statute miles], indexed like the station data
+        """
+        if geodesic:
+            return self.data.apply(_coordDistance, axis=1, lat=self.lat, long=self.long)
+        distances = haversine(self.lat, self.long, self.data['latitude'], self.data['longitude'])
+        return pd.Series(distances, index=self.data.index)
+
+    def weather_by_stations(self, stations, max_workers=None, skip_failed=False):
+        f"""
+        Get the data of several stations, querying them concurrently. Each query keeps its own timeout,
+        so the whole batch takes about as long as the slowest station.
+        @param stations: the stations to query
+        @param max_workers: most queries in flight at once, MAX_CONCURRENT if None
+        @param skip_failed: leave out stations whose query failed, instead of raising the first failure
+        @return: DataFrame with one row per station, or per station and variable if weather_by_station
+                 returns a DataFrame, indexed by station first
+        """
+        stations = list(stations)
+
+        def fetch(station):
+            try:
+                return self.weather_by_station(station)
+            except Exception:
+                if skip_failed:
+                    return None
+                raise
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.MAX_CONCURRENT) as pool:
+            results = list(pool.map(fetch, stations))
+
+        stations = [station for station, result in zip(stations, results) if result is not None]
+        results = [result for result in results if result is not None]
+        if not results:
+            return pd.DataFrame()
+        if isinstance(results[0], pd.Series):
+            return pd.DataFrame(results, index=pd.Index(stations, name="station"))
+        return pd.concat(results, keys=stations, names=["station"])
+
+    def nearest_weather(self, k, max_workers=None, skip_failed=False):
+        f"""
+        Get the data of the k nearest stations to the latitude and longitude provided, concurrently.
+        @param k: the number of stations
+        @return: see weather_by_stations, with a 'distance' column [statute miles]
+        """
+        distances = self.getNearestStation(k=k)
+        weather = self.weather_by_stations(distances.index, max_workers=max_workers, skip_failed=skip_failed)
+        if not weather.empty:
+            weather["distance"] = distances.reindex(weather.index.get_level_values("station")).to_numpy()
+        return weather
+
+    def getNearestStation(self, k=None, geodesic=False):
         f"""
         Find the nearest weather station in this @Link{Weather} to the
         latitude and longitude provided.
+        @param k: if given, find the k nearest stations instead
+        @param geodesic: use geopy's geodesic distance instead of the much faster great-circle one
+        @return: the nearest station, or a Series of the distances [statute miles] to the k nearest, nearest first
         """
-        distances = self.data.apply(_coordDistance, axis=1, lat=self.lat, long=self.long)
-        return distances.idxmin()
+        distances = self.stationDistances(geodesic=geodesic)
+        if k is None:
+            return distances.idxmin()
+        # stations with several reports appear once per report
+        return distances[~distances.index.duplicated()].nsmallest(k)
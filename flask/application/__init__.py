@@ -1,5 +1,14 @@
+import os
+import threading
+
 from flask import Flask
 
+PATH_PICKLE = "modeling/data/pickled_data/farsite.pickle"
+PATH_LANDSCAPE = "modeling/data/landscape"
+PATH_RISK = "modeling/data/risk.npz"
+
+_simulator_lock = threading.Lock()
+
 
 def init_app(test_config=None):
     """
@@ -15,3 +24,30 @@ def init_app(test_config=None):
         # include defined routes
         from . import routes
         return app
+
+
+def get_simulator(app):
+    """
+    The app's resident simulation workers (see modeling/simulator.py), started on first use.
+    Uses the memory-mapped landscape if one has been built, the pickle otherwise.
+    """
+    with _simulator_lock:
+        if "simulator" not in app.extensions:
+            from modeling.simulator import Simulator
+            app.extensions["simulator"] = Simulator(
+                path_pickle=PATH_PICKLE, path_landscape=PATH_LANDSCAPE if os.path.isdir(PATH_LANDSCAPE) else None,
+                workers=app.config.get("SIMULATION_WORKERS", 2))
+        return app.extensions["simulator"]
+
+
+def get_jobs(app):
+    """
+    The app's store of asynchronous simulation jobs (see modeling/jobs.py), running on its simulator
+    """
+    simulator = get_simulator(app)
+    with _simulator_lock:
+        if "jobs" not in app.extensions:
+            from modeling.jobs import JobStore
+            app.extensions["jobs"] = JobStore(simulator, max_jobs=app.config.get("JOBS_MAX", 100),
+                                              ttl=app.config.get("JOBS_TTL", 600))
+        return app.extensions["jobs"]
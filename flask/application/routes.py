@@ -1,4 +1,7 @@
-from flask import render_template, request
+from concurrent.futures import TimeoutError
+import os
+
+from flask import jsonify, make_response, render_template, request
 from flask import current_app as app
 import pandas as pd
 import json
@@ -8,10 +11,16 @@ import plotly.graph_objects as go
 import xarray as xr
 from matplotlib.cm import viridis
 
-from modeling.farsite import burn
+from application import PATH_RISK, get_jobs, get_simulator
+from modeling.jobs import JOB_FAILED, JobNotDone, JobStoreFull
+from modeling.risk import open_risk, sample_risk
+from modeling.results import perimeter, to_binary, to_bitmask, to_geojson, to_isochrones, to_perimeter, to_rle
 import matplotlib.pyplot as plt
 
 token = open("application/static/.mapbox_token").read()
+
+# binary serializations of a job's result, by the name of their ?format=
+BINARY_FORMATS = {"binary": lambda cells: to_binary(cells.latlon()), "bitmask": to_bitmask, "rle": to_rle}
 px.set_mapbox_access_token(token)
 
 
@@ -32,8 +41,15 @@ def index():
         df /= df.max(axis=0)
         df["y"], df["x"] = lat, lon
 
-        # add fake risk, population, housing data
-        df["Risk"] = df["US_210CC"] * 100
+        # risk is the percentage of simulated ignitions which burn each point, see modeling/risk.py;
+        # canopy cover stands in until a risk map has been built
+        if os.path.exists(PATH_RISK):
+            RISK, _, X, Y, _ = open_risk(PATH_RISK)
+            df["Risk"] = sample_risk(RISK, X, Y, df["x"], df["y"]) * 100
+        else:
+            df["Risk"] = df["US_210CC"] * 100
+
+        # add fake population, housing data
         df["Population"] = (1 - df["US_210EVC"]) * 100
         df.loc[df["US_DEM"] < 0.005, "Population"] = 0
         df["Housing"] = df["Population"]
@@ -121,25 +137,34 @@ def index():
         form_data = request.form
         # df = burn(lat=float(form_data["lat"]), lon=float(form_data["lon"]),
         #           path_landfire="application/static/farsite.nc", path_fueldict="application/static/FUEL_DIC.csv", mins=500)
-        df = burn(lat=float(form_data["lat"]), lon=float(form_data["lon"]),
-                  path_pickle="modeling/data/pickled_data/farsite.pickle", mins=50)
+        # runs on the resident simulation workers, this thread only waits for the result
+        lat, lon = float(form_data["lat"]), float(form_data["lon"])
+        try:
+            cells = get_simulator(app._get_current_object()).burn(
+                lat=lat, lon=lon, mins=50, output="cells", timeout=app.config.get("SIMULATION_TIMEOUT", 120))
+        except TimeoutError:
+            return "The simulation timed out, please try again later", 504
 
         # generate layout for Plotly
-        layout = go.Layout(mapbox=dict(accesstoken=token, center=dict(lat=df["y"].mean(), lon=df["x"].mean()), zoom=12),
+        layout = go.Layout(mapbox=dict(accesstoken=token, center=dict(lat=lat, lon=lon), zoom=12),
                            height=1000, margin=dict(l=10, r=10, b=10, t=10))
         layout.update(mapbox_style="satellite-streets")
 
+        # the simplified perimeter, a few points per ring rather than a marker per burned cell,
+        # rings closed and separated by gaps
+        lons, lats = [], []
+        for polygon in perimeter(cells):
+            for ring in polygon:
+                lons += ring[:, 0].tolist() + [ring[0, 0], None]
+                lats += ring[:, 1].tolist() + [ring[0, 1], None]
+
         # load data
         data = []
         data.append(
-            go.Scattermapbox(lat=df["y"], lon=df["x"], mode="markers", opacity=0.5, visible=True,
-                             marker=dict(
-                                 size=8,
-                                 color="orange",
-                             ),
+            go.Scattermapbox(lat=lats, lon=lons, mode="lines", fill="toself", opacity=0.5, visible=True,
+                             line=dict(color="orange"),
                              hovertemplate=f"Fire<br>" +
-                                           "Latitude: %{lat}<br>" +
-                                           "Longitude: %{lon}<br>" +
+                                           f"Burned cells: {len(cells)}<br>" +
                                            "<extra></extra>",
                              )
         )
@@ -149,6 +174,81 @@ def index():
         return render_template("index.html", graph_json=graph_json)
 
 
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Queues a simulation from form or JSON fields lat, lon, and optionally mins, wind_speed (kt) and wind_dir (degrees)
+    """
+    fields = request.get_json(silent=True) or request.form
+    try:
+        lat, lon = float(fields["lat"]), float(fields["lon"])
+        mins = int(fields.get("mins", 50))
+        wind = None
+        if "wind_speed" in fields or "wind_dir" in fields:
+            wind = float(fields["wind_speed"]), float(fields["wind_dir"])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify(error=f"Bad simulation parameters: {e}"), 400
+    if not 0 < mins <= app.config.get("JOBS_MAX_MINS", 1440):
+        return jsonify(error=f"mins must be between 1 and {app.config.get('JOBS_MAX_MINS', 1440)}"), 400
+
+    try:
+        job_id = get_jobs(app._get_current_object()).submit(lat, lon, mins=mins, wind=wind, output="cells")
+    except JobStoreFull as e:
+        return jsonify(error=str(e)), 503
+    return jsonify(id=job_id), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """
+    State of a simulation, with the minute it has reached and the size of its frontier while it runs, and with
+    ?perimeter=1 (and an optional &tolerance in cells) the GeoJSON perimeter it has burned so far
+    """
+    perimeter = request.args.get("perimeter", 0, type=int) > 0
+    tolerance = request.args.get("tolerance", 1., type=float)
+    try:
+        return jsonify(get_jobs(app._get_current_object()).status(job_id, perimeter=perimeter, tolerance=tolerance))
+    except KeyError:
+        return jsonify(error=f"Unknown or expired job {job_id}"), 404
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    """
+    Burned cells of a finished simulation, as ?format=geojson (default), binary, bitmask, rle, perimeter
+    (with an optional &tolerance in cells) or isochrones (perimeters &every so many minutes, 10 by default),
+    see modeling/results.py
+    """
+    jobs = get_jobs(app._get_current_object())
+    try:
+        status = jobs.status(job_id)
+        if status["state"] == JOB_FAILED:
+            return jsonify(status), 500
+        cells = jobs.result(job_id)
+    except KeyError:
+        return jsonify(error=f"Unknown or expired job {job_id}"), 404
+    except JobNotDone:
+        return jsonify(status), 409
+
+    result_format = request.args.get("format", "geojson")
+    if result_format in BINARY_FORMATS:
+        response = make_response(BINARY_FORMATS[result_format](cells))
+        response.headers["Content-Type"] = "application/octet-stream"
+        return response
+    tolerance = request.args.get("tolerance", 1., type=float)
+    if result_format == "perimeter":
+        return jsonify(to_perimeter(cells, tolerance=tolerance))
+    if result_format == "isochrones":
+        every = request.args.get("every", 10, type=int)
+        if every <= 0:
+            return jsonify(error="every must be a positive number of minutes"), 400
+        last = int(cells.MINUTES.max()) if len(cells) else 0
+        return jsonify(to_isochrones(cells, range(every, last + every, every), tolerance=tolerance))
+    if result_format == "geojson":
+        return jsonify(to_geojson(cells.latlon()))
+    return jsonify(error=f"Unknown format {result_format}"), 400
+
+
 @app.route("/about")
 def about():
     return render_template("about.html")
@@ -5,14 +5,74 @@ import xarray as xr
 import rioxarray
 
 from modeling.data.current_weather import CurrentWeather
+from modeling.data.landscape import save_landscape
 
 
-def create_pickle():
-    data = prepare_data("landfire_data/farsite.nc", "csv/FUEL_DIC.csv")
+def create_pickle(data=None):
+    if data is None:
+        data = prepare_data("landfire_data/farsite.nc", "csv/FUEL_DIC.csv")
 
     with open("pickled_data/farsite.pickle", "wb") as f:
         pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
 
+
+def create_landscape(data=None):
+    """
+    Writes the prepared data as a memory-mapped landscape directory, see landscape.py
+    """
+    if data is None:
+        data = prepare_data("landfire_data/farsite.nc", "csv/FUEL_DIC.csv")
+
+    save_landscape("landscape", *data)
+
+
+def build_fuel_table(path_fueldict):
+    """
+    Builds the per-fuel-model rows of INPUT from the fuel dictionary
+    :param path_fueldict: path to the file FUEL_DIC.csv, containing translation info for fuel types
+    :return: CODES, the sorted FBFM40 codes, and TABLE, an (n_models, 6) float32 array of INPUT rows for each code
+             (dims 0-4 as described in prepare_data, dim 5 left at 0 for elevation)
+    """
+    FUEL_TYPE_MAP = pd.read_csv(path_fueldict, header='infer').sort_values('VALUE')
+
+    TABLE = np.zeros((len(FUEL_TYPE_MAP), 6), dtype=np.float32)
+    TABLE[:, 0] = FUEL_TYPE_MAP['FuelBedDepth']
+    TABLE[:, 1] = FUEL_TYPE_MAP['SAV']
+    TABLE[:, 2] = FUEL_TYPE_MAP['OvenDryLoad']
+    TABLE[:, 3] = FUEL_TYPE_MAP['Mx'] / 100
+    TABLE[:, 4] = (FUEL_TYPE_MAP['Mx'] * .95) / 100
+
+    # (dim 2): ton/acre -> lb/ft^2
+    TABLE[:, 2] *= .0459137
+
+    return FUEL_TYPE_MAP['VALUE'].to_numpy(dtype=np.float64), TABLE
+
+
+def build_input(FUEL, ELEV, path_fueldict):
+    """
+    Maps raw fuel types and elevation to the INPUT array, with one table gather instead of a per-pixel loop
+    :param FUEL: (rows, cols) raw fuel types (FBFM40 codes, 0 for no data)
+    :param ELEV: (rows, cols) elevation in meters
+    :param path_fueldict: path to the file FUEL_DIC.csv, containing translation info for fuel types
+    :return: (rows, cols, 6) float32 INPUT array, described in prepare_data
+    """
+    CODES, TABLE = build_fuel_table(path_fueldict)
+
+    # map FBFM40 codes to dense table indices, no data is stored as -9999 in the fuel dictionary
+    FUEL = np.where(FUEL == 0, -9999., FUEL)
+    index = np.minimum(np.searchsorted(CODES, FUEL), len(CODES) - 1)
+    unknown = CODES[index] != FUEL
+    if np.any(unknown):
+        raise KeyError(f"Fuel types {np.unique(FUEL[unknown])} are missing from {path_fueldict}")
+
+    INPUT = np.take(TABLE, index, axis=0)
+
+    # get elevation for final dimension
+    INPUT[..., 5] = ELEV
+
+    return INPUT
+
+
 def prepare_data(path_landfire, path_fueldict):
     """
     Prepares the data required for fire modeling
@@ -37,8 +97,6 @@ def prepare_data(path_landfire, path_fueldict):
     FUEL = LANDFIRE['US_210F40'][:].data
     ELEV = LANDFIRE['US_DEM'][:].data
 
-    INPUT = np.zeros((FUEL.shape[0], FUEL.shape[1], 6), dtype=np.float32)  # 32 bit float for efficiency
-
     # from fuel types we need:
     #
     # (dim 0) Fuel Bed Depth (delta)  - Mean fuel array value in ft
@@ -51,28 +109,15 @@ def prepare_data(path_landfire, path_fueldict):
     # from elevation we need:
     #
     # (dim 5) Elevation in meters
+    #
+    # INPUT is a 32 bit float for efficiency
 
-    FUEL_TYPE_MAP = pd.read_csv(path_fueldict, header='infer').set_index('VALUE')
-    FUEL_TYPE_MAP = {float(ind): np.array([FUEL_TYPE_MAP['FuelBedDepth'][ind],
-                                           FUEL_TYPE_MAP['SAV'][ind],
-                                           FUEL_TYPE_MAP['OvenDryLoad'][ind],
-                                           FUEL_TYPE_MAP['Mx'][ind] / 100,
-                                           (FUEL_TYPE_MAP['Mx'][ind] * .95) / 100, 0])
-                     for ind in FUEL_TYPE_MAP.index}
-
-    for i in range(INPUT.shape[0]):
-        for j in range(INPUT.shape[1]):
-            # pull essential data
-            INPUT[i, j, :] = FUEL_TYPE_MAP[FUEL[i, j] if FUEL[i, j] else -9999.]
-
-            # (dim 2): ton/acre -> lb/ft^2
-            INPUT[i, j, 2] *= .0459137
-
-            # get elevation for final dimension
-            INPUT[i, j, 5] = ELEV[i,j]
+    INPUT = build_input(FUEL, ELEV, path_fueldict)
 
     return INPUT, FUEL, X, Y
 
 
 if __name__ == "__main__":
-    create_pickle()
+    data = prepare_data("landfire_data/farsite.nc", "csv/FUEL_DIC.csv")
+    create_pickle(data)
+    create_landscape(data)
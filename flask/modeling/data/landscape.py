@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+# A landscape is a directory holding one .npy file per array of prepare_data's output, plus a small JSON header.
+# Arrays are memory-mapped when opened, so only the pages a fire actually touches are ever read from disk.
+LANDSCAPE_ARRAYS = ("INPUT", "FUEL", "X", "Y")
+LANDSCAPE_HEADER = "landscape.json"
+LANDSCAPE_VERSION = 1
+
+# landscapes opened by this process: path -> (header modification time, header, arrays)
+_OPENED = {}
+
+
+def checksum(arrays):
+    """
+    Fingerprints a set of arrays, reading them in chunks so memory-mapped arrays are never loaded whole
+    :param arrays: iterable of arrays
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        digest.update(str((array.dtype.str, array.shape)).encode())
+        flat = array.reshape(-1)
+        step = max(1, 2 ** 24 // max(1, array.itemsize))
+        for start in range(0, flat.shape[0], step):
+            digest.update(np.ascontiguousarray(flat[start:start + step]).tobytes())
+    return digest.hexdigest()
+
+
+def save_landscape(path_landscape, INPUT, FUEL, X, Y):
+    """
+    Writes the output of prepare_data as a landscape directory
+    :param path_landscape: directory to write, created if necessary
+    :param INPUT: input array, see prepare_data
+    :param FUEL: raw fuel types
+    :param X: longitudes
+    :param Y: latitudes
+    :return: the header written to landscape.json
+    """
+    os.makedirs(path_landscape, exist_ok=True)
+    arrays = dict(zip(LANDSCAPE_ARRAYS, (INPUT, FUEL, X, Y)))
+
+    for name, array in arrays.items():
+        np.save(os.path.join(path_landscape, name + ".npy"), np.ascontiguousarray(array))
+
+    header = {"version": LANDSCAPE_VERSION,
+              "shape": list(FUEL.shape),
+              "checksum": checksum(arrays.values()),
+              "arrays": {name: {"dtype": array.dtype.str, "shape": list(array.shape)}
+                         for name, array in arrays.items()}}
+
+    # the header goes last, a landscape without one is incomplete
+    with open(os.path.join(path_landscape, LANDSCAPE_HEADER), "w") as f:
+        json.dump(header, f, indent=2)
+    return header
+
+
+def open_landscape(path_landscape):
+    """
+    Opens a landscape directory once per process, memory-mapping its arrays read-only
+    :param path_landscape: directory written by save_landscape
+    :return: header, (INPUT, FUEL, X, Y)
+    """
+    path_header = os.path.join(path_landscape, LANDSCAPE_HEADER)
+    key = os.path.abspath(path_landscape)
+    mtime = os.path.getmtime(path_header)
+
+    if key not in _OPENED or _OPENED[key][0] != mtime:
+        with open(path_header) as f:
+            header = json.load(f)
+        if header["version"] != LANDSCAPE_VERSION:
+            raise ValueError(f"Landscape {path_landscape} has version {header['version']}, "
+                             f"expected {LANDSCAPE_VERSION}; rebuild it with create_pickle.py")
+
+        arrays = tuple(np.load(os.path.join(path_landscape, name + ".npy"), mmap_mode="r")
+                       for name in LANDSCAPE_ARRAYS)
+        _OPENED[key] = mtime, header, arrays
+
+    return _OPENED[key][1], _OPENED[key][2]
+
+
+def open_pickle(path_pickle):
+    """
+    Loads a prepare_data pickle once per process, with a header like open_landscape's
+    :param path_pickle: path to the preprocessed pickle data
+    :return: header, (INPUT, FUEL, X, Y)
+    """
+    key = os.path.abspath(path_pickle)
+    mtime = os.path.getmtime(path_pickle)
+
+    if key not in _OPENED or _OPENED[key][0] != mtime:
+        with open(path_pickle, "rb") as f:
+            arrays = tuple(pickle.load(f))
+        header = {"version": LANDSCAPE_VERSION,
+                  "shape": list(arrays[1].shape),
+                  "checksum": checksum(arrays)}
+        _OPENED[key] = mtime, header, arrays
+
+    return _OPENED[key][1], _OPENED[key][2]
@@ -0,0 +1,98 @@
+#################################################
+#################################################
+#################################################
+##### Monte Carlo Ensembles
+#####
+##### Burn probability rather than one deterministic footprint: every member of an ensemble burns with its own
+##### perturbed wind, fuel moisture and ignition point. On a Simulator the members run across its workers, which
+##### share the landscape (memory-mapped once per worker, never pickled per member) and need nothing from each other.
+
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from modeling.farsite import burn, nearest_wind
+
+# meters in a degree of latitude
+METERS_PER_DEGREE = 111320.
+
+
+def sample_members(lat, lon, wind, members, wind_speed_sd=2., wind_dir_sd=15., moisture_sd=.1, ignition_sd=30.,
+                   seed=None):
+    """
+    Draws the perturbed inputs of an ensemble
+    :param lat: latitude of ignition
+    :param lon: longitude of ignition
+    :param wind: (wind speed (kt), wind direction (degrees)) every member is perturbed from
+    :param members: number of members
+    :param wind_speed_sd: standard deviation of the wind speed (kt), speeds being held at or above 0
+    :param wind_dir_sd: standard deviation of the wind direction (degrees)
+    :param moisture_sd: standard deviation of the log of the fuel moisture factor, see propagation.propagate
+    :param ignition_sd: standard deviation of the ignition point along each axis (meters)
+    :param seed: seed of the random generator, so an ensemble can be drawn again
+    :return: list of one dict of burn() arguments per member: lat, lon, wind and moisture
+    """
+    rng = np.random.default_rng(seed)
+    wind_speed, wind_dir = wind
+    speeds = np.maximum(wind_speed + rng.normal(0, wind_speed_sd, members), 0)
+    dirs = (wind_dir + rng.normal(0, wind_dir_sd, members)) % 360
+    moistures = np.exp(rng.normal(0, moisture_sd, members))
+
+    # meters -> degrees, a degree of longitude shrinking with latitude
+    lats = lat + rng.normal(0, ignition_sd, members) / METERS_PER_DEGREE
+    lons = lon + rng.normal(0, ignition_sd, members) / (METERS_PER_DEGREE * np.cos(np.radians(lat)))
+
+    return [{"lat": float(lats[k]), "lon": float(lons[k]), "wind": (float(speeds[k]), float(dirs[k])),
+             "moisture": float(moistures[k])} for k in range(members)]
+
+
+def burn_probability(lat, lon, members=32, simulator=None, wind=None, wind_speed_sd=2., wind_dir_sd=15.,
+                     moisture_sd=.1, ignition_sd=30., seed=None, timeout=None, **kwargs):
+    """
+    Runs a Monte Carlo ensemble of burn() and counts how often each cell burns
+    :param lat: latitude of ignition
+    :param lon: longitude of ignition
+    :param members: number of members
+    :param simulator: Simulator to run the members on, in parallel; in this process, one after the other, if None
+    :param wind: (wind speed (kt), wind direction (degrees)), fetched from the nearest station once if None
+    :param wind_speed_sd: see sample_members
+    :param wind_dir_sd: see sample_members
+    :param moisture_sd: see sample_members
+    :param ignition_sd: see sample_members
+    :param seed: see sample_members
+    :param timeout: seconds to wait for the whole ensemble at most, None for no limit; only with a simulator,
+                    whose members still queued or running are cancelled after that, as on any failure
+    :param kwargs: any other arguments of burn(), such as mins; path_pickle or path_landscape without a simulator
+    :return: (rows, cols) float32 raster of the fraction of members which burned each cell, X, Y of the grid
+    """
+    if members < 1:
+        raise ValueError(f"An ensemble needs at least one member, got {members}")
+    if wind is None:
+        wind = nearest_wind(lat, lon)
+    samples = sample_members(lat, lon, wind, members, wind_speed_sd=wind_speed_sd, wind_dir_sd=wind_dir_sd,
+                             moisture_sd=moisture_sd, ignition_sd=ignition_sd, seed=seed)
+
+    # members come back as compact BurnedCells, counted as they finish
+    if simulator is None:
+        results = (burn(output="cells", **sample, **kwargs) for sample in samples)
+    else:
+        # numbered as Simulator.burn numbers its simulations, so members already running can be cancelled
+        jobs = [next(simulator.numbers) for _ in samples]
+        futures = [simulator.submit(job=job, output="cells", **sample, **kwargs) for job, sample in zip(jobs, samples)]
+        results = (future.result() for future in as_completed(futures, timeout=timeout))
+
+    COUNTS = None
+    try:
+        for cells in results:
+            if COUNTS is None:
+                COUNTS, X, Y = np.zeros(cells.shape, dtype=np.int32), cells.X, cells.Y
+            # the cells of a member are unique, so each is counted once
+            COUNTS.ravel()[cells.CELLS] += 1
+    except Exception:
+        if simulator is not None:
+            for future, job in zip(futures, jobs):
+                if not future.cancel() and not future.done():
+                    simulator.cancel(job)
+        raise
+
+    return (COUNTS / np.float32(members)).astype(np.float32), X, Y
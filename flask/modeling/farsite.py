@@ -10,25 +10,64 @@
 
 # weather processing module (thank you nathan)
 from modeling.data.current_weather import CurrentWeather
-from modeling.models.rothermel import compute_surface_spread
+from modeling.data.landscape import open_landscape, open_pickle
+from modeling.models.rothermel import (build_fuel_constants, compute_surface_spread_fuel_grid,
+                                      compute_surface_spread_grid)
+from modeling.models.propagation import (AFC_GRID, AFC_X_INC, AFC_X1_INC, AFC_X2_INC, AFC_Y_INC, AFC_Y1_INC,
+                                         AFC_Y2_INC, CLOSE_EVERY, ESCAPED_FIRST_COL, ESCAPED_FIRST_ROW,
+                                         ESCAPED_LAST_COL, ESCAPED_LAST_ROW, ESCAPED_SIZE, MOISTURE_CEILING,
+                                         NON_BURNABLE, PIFC_RETAIN, PROGRESS_BURNED, PROGRESS_CANCEL,
+                                         PROGRESS_FRONTIER, PROGRESS_MINUTE, BurnCancelled, arrival_raster,
+                                         cell_reach, close_cells, ignition_schedule, propagate, weather_segments,
+                                         wind_at)
+from modeling.models.wind import wind_field
+from modeling.results import BurnedCells, snapshot_arrival
 
 # Data containers and pre-processing
 import pandas as pd
-import pickle
 
 # Computational Tools
 import numpy as np
 import pandas as pd
 import os
+import time
 
 
-def regrid(AFC, INPUT, wind_speed, wind_dir, new_i, new_j, new_x, new_y, cell):
+def afc_entry(RATE, WIND_DIR, i, j):
+    """
+    Computes the AFC entry of a cell, laid out as in propagation.AFC_X_INC ... AFC_R
+    :param RATE: spread rate raster (ft/min) of the current weather, see propagation.weather_segments
+    :param WIND_DIR: wind direction raster (radians), see propagation.as_raster
+    :param i: index of row
+    :param j: index of column
+    :return: tuple of the forward, first and second orthogonal (x, y) increments, wind_orthogonal_spread,
+             grid_dimension and R, all as floats
+    """
+    wind_dir = float(wind_at(WIND_DIR, i, j))
+    R = float(RATE[i, j]) * .3048
+
+    wind_orthogonal_spread = ((2 ** .5) / 5) * R
+    grid_dimension = int(np.ceil(30 / wind_orthogonal_spread))
+
+    # convert m/min -> grid steps per min
+    R *= (grid_dimension / 30)
+    wind_orthogonal_spread *= (grid_dimension / 30)
+
+    # wind is constant over the run, so all three children of a fire in this cell move by fixed offsets
+    return (float(np.rint(R * np.cos(wind_dir))), float(np.rint(R * np.sin(wind_dir))),
+            float(np.rint(wind_orthogonal_spread * np.cos(wind_dir + np.pi / 2))),
+            float(np.rint(wind_orthogonal_spread * np.sin(wind_dir + np.pi / 2))),
+            float(np.rint(wind_orthogonal_spread * np.cos(wind_dir - np.pi / 2))),
+            float(np.rint(wind_orthogonal_spread * np.sin(wind_dir - np.pi / 2))),
+            float(wind_orthogonal_spread), float(grid_dimension), float(R))
+
+
+def regrid(AFC, RATE, WIND_DIR, new_i, new_j, new_x, new_y, cell):
     """
     regrids fires when they switch cells, updates AFC for cell if necessary
     :param AFC: A reference to the active fire cache
-    :param INPUT: the input array as described above
-    :param wind_speed: wind speed (ft/min)
-    :param wind_dir: wind direction (radians)
+    :param RATE: spread rate raster (ft/min)
+    :param WIND_DIR: wind direction raster (radians)
     :param new_i: index of new row
     :param new_j: index of new column
     :param new_x: the (prior to regrid) new x
@@ -36,44 +75,25 @@ def regrid(AFC, INPUT, wind_speed, wind_dir, new_i, new_j, new_x, new_y, cell):
     :param cell: the cell where the fire spread from
     :return: new_x, new_y - these are the coordinates post regrid
     """
-    if (new_i, new_j) in AFC:
-
-        new_grid_dimension = AFC[(new_i, new_j)][3]
-
-    else:
-
+    if (new_i, new_j) not in AFC:
         # if the cell isn't in the AFC, reconcile then place it
-        new_cell_inputs = INPUT[new_i, new_j]
-        new_R = compute_surface_spread(new_cell_inputs, wind_speed) * .3048
-
-        new_orthogonal_spread = ((2 ** .5) / 5) * new_R
-        new_grid_dimension = int(np.ceil(30 / new_orthogonal_spread))
-
-        # convert m/min -> grid steps per min
-        new_R *= (new_grid_dimension / 30)
-        new_orthogonal_spread *= (new_grid_dimension / 30)
+        AFC[(new_i, new_j)] = afc_entry(RATE, WIND_DIR, new_i, new_j)
 
-        new_x_inc = int(np.rint(new_R * np.cos(wind_dir)))
-        new_y_inc = int(np.rint(new_R * np.sin(wind_dir)))
-
-        AFC[(new_i, new_j)] = np.array([new_x_inc, new_y_inc, new_orthogonal_spread,
-                                        new_grid_dimension, new_R])
-
-    grid_dimension = AFC[cell][3]
+    new_grid_dimension = AFC[(new_i, new_j)][AFC_GRID]
+    grid_dimension = AFC[cell][AFC_GRID]
     new_x = int(np.floor((new_x / (grid_dimension - 1)) * new_grid_dimension))
     new_y = int(np.floor((new_y / (grid_dimension - 1)) * new_grid_dimension))
 
     return new_x, new_y
 
-def handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_speed, wind_dir, cell, new_i, new_j,
-                          new_x, new_y):
+def handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, FUEL, RATE, WIND_DIR, cell, new_i, new_j, new_x, new_y,
+                          stale=None, escaped=None, CLOSED=None):
     """
     Handles a new fire (updates frontier, both caches, regrids, ect)
     :param new_frontier: new frontier of fires this fire is pushed to
-    :param INPUT: input array as described above
     :param FUEL: fuel array as described above
-    :param wind_speed: wind speed (ft/min)
-    :param wind_dir: wind direction (radians)
+    :param RATE: spread rate raster (ft/min)
+    :param WIND_DIR: wind direction raster (radians)
     :param AFC: A reference to the active fire cache
     :param FIRES: all fires
     :param NB: set of non burnable terrains
@@ -83,14 +103,25 @@ def handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_
     :param new_j: index of new column
     :param new_x: the (prior to regrid) new x
     :param new_y: the (prior to regrid) new y
+    :param stale: cells whose AFC entries were computed under earlier weather, see change_weather
+    :param escaped: bool array set where the fire left the arrays, see propagation.ESCAPED_FIRST_ROW
+    :param CLOSED: bool raster of cells closed for good, which take no new fires, see propagation.close_cells
     """
+    if escaped is not None:
+        escaped[ESCAPED_FIRST_ROW] |= new_i < 0
+        escaped[ESCAPED_LAST_ROW] |= new_i >= FUEL.shape[0]
+        escaped[ESCAPED_FIRST_COL] |= new_j < 0
+        escaped[ESCAPED_LAST_COL] |= new_j >= FUEL.shape[1]
 
-    if (0 <= new_i < INPUT.shape[0]) and (0 <= new_j < INPUT.shape[1]) and FUEL[new_i, new_j] not in NB:
+    if (0 <= new_i < FUEL.shape[0]) and (0 <= new_j < FUEL.shape[1]) and FUEL[new_i, new_j] not in NB and \
+            (CLOSED is None or not CLOSED[new_i, new_j]):
 
         # we added a new fire, that means we need to know the dimension of the grid it is placed
         # if the dimension differs from that of our original cell, we need to reconcile
         if new_i != cell[0] or new_j != cell[1]:
-            new_x, new_y = regrid(AFC, INPUT, wind_speed, wind_dir, new_i, new_j, new_x, new_y, cell)
+            if stale:
+                refresh_afc(AFC, PIFC, stale, RATE, WIND_DIR, (new_i, new_j))
+            new_x, new_y = regrid(AFC, RATE, WIND_DIR, new_i, new_j, new_x, new_y, cell)
 
         if (new_i, new_j) not in PIFC or (new_x, new_y) not in PIFC[(new_i, new_j)]:
 
@@ -109,106 +140,519 @@ def handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_
             FIRES.add((new_i, new_j))
 
 
-def pre_burn(lat, lon, path_pickle):
+def ignite(frontier, FIRES, AFC, PIFC, stale, RATE, WIND_DIR, cell):
     """
-    Processes a provided data pickle, as well as lat/lon to get info for burn
-    :param lat: latitudinal coordinate of ignition
-    :param lon: longitudinal coordiante of ignition
-    :param path_pickle: path to the preprocessed pickle data
-    :return: unpickled data, istart, jstart, wind speed, wind direction
+    Seeds a fire at the center of a burnable cell, unless the center already had fire
+    :param frontier: frontier of fires the new fire is pushed to
+    :param FIRES: all fires
+    :param AFC: A reference to the active fire cache
+    :param PIFC: a reference to the past intracellular fire cache
+    :param stale: cells whose AFC entries were computed under earlier weather, see change_weather
+    :param RATE: current spread rate raster (ft/min)
+    :param WIND_DIR: current wind direction raster (radians)
+    :param cell: the cell to ignite
     """
-    # INPUT (landfire stuff), FUEL (raw fuel type), X (longitudes), Y (latitudes)
-    # INPUT must be expanded to account for slope in direction of wind
-    with open(path_pickle, "rb") as f:
-        data = pickle.load(f)
+    if cell in AFC:
+        refresh_afc(AFC, PIFC, stale, RATE, WIND_DIR, cell)
+    else:
+        AFC[cell] = afc_entry(RATE, WIND_DIR, cell[0], cell[1])
 
-    # get starting cell
-    i_start, j_start = np.argmin(np.abs(data[2] - lon)), np.argmin(np.abs(data[3] - lat))
+    center = int(np.floor(AFC[cell][AFC_GRID] / 2))
+    if (center, center) in PIFC.get(cell, ()):
+        return
+    PIFC.setdefault(cell, set()).add((center, center))
+    frontier.setdefault(cell, set()).add((center, center))
+    FIRES.add(cell)
 
-    ######
-    ## get weather info
 
-    weather = CurrentWeather(20, lat, lon)
-    weather = weather.weather_by_station(weather.getNearestStation())
+def refresh_afc(AFC, PIFC, stale, RATE, WIND_DIR, cell):
+    """
+    Recomputes the AFC entry of a cell under the current weather if it was computed under earlier weather.
+    A cell whose grid dimension changed loses its PIFC, its points being on the old grid
+    :param AFC: A reference to the active fire cache
+    :param PIFC: a reference to the past intracellular fire cache
+    :param stale: cells whose AFC entries were computed under earlier weather
+    :param RATE: current spread rate raster (ft/min)
+    :param WIND_DIR: current wind direction raster (radians)
+    :param cell: the cell to refresh
+    """
+    if cell not in stale:
+        return
+    stale.discard(cell)
+    old_grid_dimension = AFC[cell][AFC_GRID]
+    AFC[cell] = afc_entry(RATE, WIND_DIR, cell[0], cell[1])
+    if AFC[cell][AFC_GRID] != old_grid_dimension:
+        PIFC.pop(cell, None)
+
 
-    wind_speed, wind_dir = weather.loc['wind_speed_kt'], weather.loc['wind_dir_degrees']
+def change_weather(AFC, PIFC, stale, frontier, RATE, WIND_DIR):
+    """
+    Switches a burning fire to new weather. Only the AFC entries of cells in the frontier are recomputed,
+    every other entry goes stale and is recomputed if fire comes back (see refresh_afc). Fires in a cell whose
+    grid dimension changed are regridded as when they switch cells
+    :param AFC: A reference to the active fire cache
+    :param PIFC: a reference to the past intracellular fire cache
+    :param stale: cells whose AFC entries were computed under earlier weather, updated in place
+    :param frontier: fires which will be iterated on next
+    :param RATE: new spread rate raster (ft/min)
+    :param WIND_DIR: new wind direction raster (radians)
+    :return: the frontier under the new weather
+    """
+    # the compiled engine tags entries with their weather instead, this reference marks them all
+    stale.update(AFC)
+    old_grid_dimensions = {cell: AFC[cell][AFC_GRID] for cell in frontier}
+    for cell in frontier:
+        refresh_afc(AFC, PIFC, stale, RATE, WIND_DIR, cell)
 
-    # convert kt -> ft/min
-    wind_speed *= 101.269
+    new_frontier = {}
+    for cell, fires in frontier.items():
+        old_grid_dimension, grid_dimension = old_grid_dimensions[cell], AFC[cell][AFC_GRID]
+        if grid_dimension == old_grid_dimension:
+            new_frontier[cell] = fires
+            continue
 
-    ######
-    ## Get slope in direction of wind
+        fires = {(int(min(np.floor((x / (old_grid_dimension - 1)) * grid_dimension), grid_dimension - 1)),
+                  int(min(np.floor((y / (old_grid_dimension - 1)) * grid_dimension), grid_dimension - 1)))
+                 for x, y in fires}
+        PIFC[cell] = set(fires)
+        new_frontier[cell] = fires
 
+    return new_frontier
+
+
+def wind_sector(wind_dir):
+    """
+    Finds the neighbouring cell in the direction of the wind
+    :param wind_dir: wind direction (degrees)
+    :return: ip, jp - row and column offset of the neighbour
+    """
     if wind_dir > 330 or wind_dir < 30:
-        ip, jp = 0, 1
+        return 0, 1
     elif 30 <= wind_dir < 60:
-        ip, jp = -1, 1
+        return -1, 1
     elif 60 <= wind_dir < 120:
-        ip, jp = -1, 0
+        return -1, 0
     elif 120 <= wind_dir < 150:
-        ip, jp = -1, -1
+        return -1, -1
     elif 150 <= wind_dir < 210:
-        ip, jp = 0, -1
+        return 0, -1
     elif 210 <= wind_dir < 240:
-        ip, jp = 1, -1
+        return 1, -1
     elif 240 <= wind_dir < 300:
-        ip, jp = 1, 0
+        return 1, 0
     else:
-        ip, jp = 1, 1
+        return 1, 1
 
-    # wind_dir degrees -> radians
-    wind_dir *= np.pi / 180
 
-    INPUT = data[0]
+def wind_sectors(WIND_DIR):
+    """
+    wind_sector for a whole raster of wind directions
+    :param WIND_DIR: wind directions (degrees)
+    :return: ip, jp - int8 arrays of the row and column offsets of each cell's neighbour
+    """
+    WIND_DIR = np.asarray(WIND_DIR)
+    sector = np.select([(WIND_DIR > 330) | (WIND_DIR < 30), WIND_DIR < 60, WIND_DIR < 120, WIND_DIR < 150,
+                        WIND_DIR < 210, WIND_DIR < 240, WIND_DIR < 300], np.arange(7), 7)
+    return (np.array([0, -1, -1, -1, 0, 1, 1, 1], dtype=np.int8)[sector],
+            np.array([1, 1, 0, -1, -1, -1, 0, 1], dtype=np.int8)[sector])
 
-    #
-    # Loops below compute (or estimate) tan_phi for each cell
 
-    for i in range(1, INPUT.shape[0] - 1):
-        for j in range(1, INPUT.shape[1] - 1):
-            INPUT[i, j, 5] = (INPUT[i + ip, j + jp, 5] - INPUT[i, j, 5]) / 30
+def slope_components(ELEV):
+    """
+    Computes the elevation gradient, which gives tan_phi for any wind direction (see project_slope)
+    :param ELEV: (rows, cols) elevation in meters, on a 30m grid
+    :return: (rows, cols) float32 rise per meter along the rows and along the columns
+    """
+    d_row, d_col = np.gradient(np.asarray(ELEV, dtype=np.float64), 30)
+    return d_row.astype(np.float32), d_col.astype(np.float32)
 
-    # edges don't have adjacent cells yet, so lets just guess
-    for i in range(INPUT.shape[0]):
-        INPUT[i, 0, 5] = INPUT[i, 1, 5]  # left col
-        INPUT[0, i, 5] = INPUT[1, i, 5]  # top row
 
-        # right col
-        INPUT[i, INPUT.shape[1] - 1, 5] = INPUT[i, INPUT.shape[1] - 2, 5]
+def project_slope(D_ROW, D_COL, wind_dir):
+    """
+    Projects the elevation gradient onto the wind direction
+    :param D_ROW: rise per meter along the rows, see slope_components
+    :param D_COL: rise per meter along the columns
+    :param wind_dir: wind direction (degrees)
+    :return: (rows, cols) float32 array of tan_phi
+    """
+    # same orientation as wind_sector: rows run against the y axis, columns along the x axis
+    theta = wind_dir * np.pi / 180
+    return (-D_ROW * np.float32(np.sin(theta)) + D_COL * np.float32(np.cos(theta))).astype(np.float32)
 
-        # bottom row
-        INPUT[INPUT.shape[0] - 1, i, 5] = INPUT[INPUT.shape[0] - 2, i, 5]
 
-    pre_burn_data = INPUT, data[1], data[2], data[3], i_start, j_start, wind_speed, wind_dir
-    fname = path_pickle[:-len(".pickle")] + "_pre_burn.pickle"
-    with open(fname, mode="wb") as f:
-        pickle.dump(pre_burn_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-    return pre_burn_data
+def compute_slope(ELEV, wind_dir, method="sector"):
+    """
+    Computes tan_phi, the slope in the direction of the wind, for every cell
+    :param ELEV: (rows, cols) elevation in meters, on a 30m grid
+    :param wind_dir: wind direction (degrees), a scalar or a (rows, cols) raster
+    :param method: "sector" for the rise to the neighbouring cell in the wind's 45 degree sector (see wind_sector),
+                   "gradient" for the elevation gradient projected onto the exact wind direction
+    :return: (rows, cols) float32 array of tan_phi, computed out of place
+    """
+    if method == "sector":
+        ELEV = np.asarray(ELEV, dtype=np.float64)
+        rows, cols = ELEV.shape
+        if np.ndim(wind_dir) == 0:
+            ip, jp = wind_sector(wind_dir)
+            tan_phi = (ELEV[1 + ip:rows - 1 + ip, 1 + jp:cols - 1 + jp] - ELEV[1:-1, 1:-1]) / 30
+        else:
+            # every cell looks to the neighbour in its own wind's sector
+            ip, jp = wind_sectors(np.asarray(wind_dir)[1:-1, 1:-1])
+            i, j = np.ogrid[1:rows - 1, 1:cols - 1]
+            tan_phi = (ELEV[i + ip, j + jp] - ELEV[1:-1, 1:-1]) / 30
+
+        # edges don't have adjacent cells, so lets just copy the nearest interior cell
+        return np.pad(tan_phi, 1, mode="edge").astype(np.float32)
+
+    elif method == "gradient":
+        return project_slope(*slope_components(ELEV), wind_dir)
+
+    raise ValueError(f"Unknown slope method {method}; expected 'sector' or 'gradient'")
 
 
-def burn(lat, lon, path_landfire=None, path_fueldict=None, path_pickle=None, mins=50):
+# slope rasters computed or loaded by this process: (landscape checksum, key) -> raster
+_SLOPES = {}
+
+
+def cached_slope(ELEV, wind_dir, landscape_checksum, method="sector", path_cache=None, window=None):
     """
-    Burning down the house
-    :param lat: latitude of ignition
-    :param lon: longitude of ignition
-    :param path_landfire: path to `landfire.nc`
-    :param path_fueldict: path to `FUEL_DIC.csv`
-    :param path_pickle: path to preprocessed pickle data
+    compute_slope, cached per landscape so every ignition on it shares the same rasters
+    Sector slopes are keyed by wind sector, gradient slopes by nothing but the landscape since
+    only the cheap projection onto the wind depends on its direction
+    :param ELEV: (rows, cols) elevation in meters, on a 30m grid
+    :param wind_dir: wind direction (degrees)
+    :param landscape_checksum: checksum of the landscape ELEV belongs to
+    :param method: see compute_slope
+    :param path_cache: directory to keep the rasters in across processes, memory only if None
+    :param window: (first row, last row + 1, first column, last column + 1) to return tan_phi over, see fire_window;
+                   the whole landscape if None
+    :return: (rows, cols) float32 array of tan_phi
+    """
+    if method == "sector":
+        ip, jp = wind_sector(wind_dir)
+        keys = [f"sector_{ip}_{jp}"]
+    elif method == "gradient":
+        keys = ["gradient_row", "gradient_col"]
+    else:
+        raise ValueError(f"Unknown slope method {method}; expected 'sector' or 'gradient'")
+
+    if any((landscape_checksum, key) not in _SLOPES for key in keys):
+        fnames = [path_cache and os.path.join(path_cache, f"{landscape_checksum}_{key}.npy") for key in keys]
+        if path_cache is not None and all(os.path.exists(fname) for fname in fnames):
+            rasters = [np.load(fname, mmap_mode="r") for fname in fnames]
+        else:
+            rasters = [compute_slope(ELEV, wind_dir)] if method == "sector" else slope_components(ELEV)
+            if path_cache is not None:
+                os.makedirs(path_cache, exist_ok=True)
+                for fname, raster in zip(fnames, rasters):
+                    # written aside then moved, so concurrent requests never read half a raster
+                    np.save(fname + ".tmp.npy", raster)
+                    os.replace(fname + ".tmp.npy", fname)
+        for key, raster in zip(keys, rasters):
+            # shared by every request from here on
+            raster.flags.writeable = False
+            _SLOPES[(landscape_checksum, key)] = raster
+
+    rasters = [_SLOPES[(landscape_checksum, key)] for key in keys]
+    if window is not None:
+        # slopes of the whole landscape are cached, so a window only slices them
+        i0, i1, j0, j1 = window
+        rasters = [raster[i0:i1, j0:j1] for raster in rasters]
+    return rasters[0] if method == "sector" else project_slope(*rasters, wind_dir)
+
+
+# the fuel dictionary landscapes are built from, see create_pickle.prepare_data
+PATH_FUELDICT = os.path.join(os.path.dirname(__file__), "data", "csv", "FUEL_DIC.csv")
+
+# fuel constants tables loaded by this process: path -> (modification time, (FUEL_INDEX, CONSTANTS))
+_FUEL_CONSTANTS = {}
+
+
+def cached_fuel_constants(path_fueldict=None):
+    """
+    rothermel.build_fuel_constants, loaded once per process as the landscape is, and shared by every burn on it
+    :param path_fueldict: path to FUEL_DIC.csv, PATH_FUELDICT if None
+    :return: read-only FUEL_INDEX and CONSTANTS, see build_fuel_constants
+    """
+    path_fueldict = PATH_FUELDICT if path_fueldict is None else path_fueldict
+    key = os.path.abspath(path_fueldict)
+    mtime = os.path.getmtime(path_fueldict)
+
+    if key not in _FUEL_CONSTANTS or _FUEL_CONSTANTS[key][0] != mtime:
+        table = build_fuel_constants(path_fueldict)
+        for array in table:
+            array.flags.writeable = False
+        _FUEL_CONSTANTS[key] = mtime, table
+
+    return _FUEL_CONSTANTS[key][1]
+
+
+# wind fields built by this process: (landscape checksum, hour, slope method) -> (WIND_SPEED, WIND_DIR, TAN_PHI)
+_WIND_FIELDS = {}
+
+# degrees around the landscape that stations are interpolated from
+WIND_FIELD_MARGIN = 0.5
+
+
+def cached_wind_field(X, Y, ELEV, landscape_checksum, method="sector", clock=time.time):
+    """
+    Interpolated wind over the whole landscape (see wind.wind_field) from every station reporting around it,
+    with tan_phi along each cell's own wind. Built once per hour of METARs and shared by every ignition in that hour
+    :param X: (rows,) longitudes of the landscape
+    :param Y: (cols,) latitudes of the landscape
+    :param ELEV: (rows, cols) elevation in meters, on a 30m grid
+    :param landscape_checksum: checksum of the landscape ELEV belongs to
+    :param method: see compute_slope
+    :param clock: time source, in seconds since the epoch
+    :return: read-only float32 rasters of wind speed (ft/min), wind direction (radians) and tan_phi
+    """
+    hour = int(clock() // 3600)
+    key = (landscape_checksum, hour, method)
+    if key not in _WIND_FIELDS:
+        stations = CurrentWeather.covering(float(np.min(Y)) - WIND_FIELD_MARGIN, float(np.min(X)) - WIND_FIELD_MARGIN,
+                                           float(np.max(Y)) + WIND_FIELD_MARGIN, float(np.max(X)) + WIND_FIELD_MARGIN,
+                                           lean=True).data
+        WIND_SPEED, WIND_DIR = wind_field(X, Y, stations["longitude"], stations["latitude"],
+                                          stations["wind_speed_kt"], stations["wind_dir_degrees"])
+        TAN_PHI = compute_slope(ELEV, WIND_DIR, method=method)
+
+        # kt -> ft/min and degrees -> radians, in place
+        WIND_SPEED *= np.float32(101.269)
+        WIND_DIR *= np.float32(np.pi / 180)
+        for raster in (WIND_SPEED, WIND_DIR, TAN_PHI):
+            raster.flags.writeable = False
+
+        # last hour's fields are stale, only the current one is kept
+        for stale in [stale for stale in _WIND_FIELDS if stale[1] != hour]:
+            del _WIND_FIELDS[stale]
+        _WIND_FIELDS[key] = WIND_SPEED, WIND_DIR, TAN_PHI
+
+    return _WIND_FIELDS[key]
+
+
+def nearest_wind(lat, lon):
+    """
+    :param lat: latitude
+    :param lon: longitude
+    :return: (wind speed (kt), wind direction (degrees)) last observed at the nearest station
+    """
+    weather = CurrentWeather(20, lat, lon, lean=True)
+    weather = weather.weather_by_station(weather.getNearestStation())
+    return weather.loc['wind_speed_kt'], weather.loc['wind_dir_degrees']
+
+
+def spread_reach(INPUT, FUEL, wind_speed, moisture=1., table=None):
+    """
+    Bounds how far a fire point moves in a minute anywhere in INPUT, from the fastest fuel there under the strongest
+    wind, on the steepest slope there in any direction
+    :param INPUT: (rows, cols, 6) input array, elevation in dim 5
+    :param FUEL: (rows, cols) fuel array
+    :param wind_speed: strongest wind speed (ft/min)
+    :param moisture: factor on the fuel moisture, see propagation.propagate
+    :param table: fuel constants table the burn takes spread rates from, see propagation.weather_segments
+    :return: cells a point can cross in a minute, at least 1
+    """
+    ELEV = np.asarray(INPUT[..., 5], dtype=np.float64)
+    rise = max(np.abs(ELEV[1:] - ELEV[:-1]).max(initial=0), np.abs(ELEV[:, 1:] - ELEV[:, :-1]).max(initial=0),
+               np.abs(ELEV[1:, 1:] - ELEV[:-1, :-1]).max(initial=0),
+               np.abs(ELEV[1:, :-1] - ELEV[:-1, 1:]).max(initial=0))
+    # a sector slope is one of these rises over 30m, a gradient projected onto the wind at most sqrt(2) times one,
+    # and spread only grows with the steepness of a slope, up or down
+    tan_phi = 2 ** .5 * rise / 30
+
+    # every distinct fuel in the window with its code, laid out as a one column FUEL and INPUT for the grid kernels
+    burnable = ~np.isin(FUEL, NON_BURNABLE)
+    FUELS = np.unique(np.column_stack([np.asarray(FUEL)[burnable], np.asarray(INPUT)[burnable][:, :5]]),
+                      axis=0).astype(np.float64)
+    CODES, FUELS = FUELS[:, :1], np.concatenate([FUELS[:, 1:], np.full((len(FUELS), 1), tan_phi)], axis=1)
+    if moisture != 1.:
+        FUELS[:, 4] = np.minimum(FUELS[:, 4] * moisture, MOISTURE_CEILING * FUELS[:, 3])
+    if table is None:
+        R = compute_surface_spread_grid(FUELS[:, None, :], wind_speed, dtype=np.float64)
+    else:
+        R = compute_surface_spread_fuel_grid(CODES, FUELS[:, None, :], wind_speed, *table, dtype=np.float64)
+    R = float(R.max(initial=0)) * .3048
+    if R <= 0:
+        return 1
+
+    # as afc_entry grids a cell: the downwind child moves R grid steps, a cell being grid_dimension - 1 steps wide
+    grid_dimension = max(np.ceil(30 / (((2 ** .5) / 5) * R)), 2)
+    return int(np.floor((R * grid_dimension / 30 + .5) / (grid_dimension - 1))) + 1
+
+
+def fire_window(INPUT, FUEL, i_start, j_start, mins, wind_speed, moisture=1., table=None):
+    """
+    Finds a window of the landscape a fire cannot leave within mins minutes: the bounding box of its ignitions grown
+    by the reach of the fastest spread found in the window itself (see spread_reach)
+    :param INPUT: the input array, elevation in dim 5
+    :param FUEL: fuel array
+    :param i_start: row of the ignition cell, or (n,) rows
+    :param j_start: column of the ignition cell, or (n,) columns
     :param mins: number of one minute iterations to burn for
-    :return: A set of cells burned after all iterations
+    :param wind_speed: strongest wind speed of the burn (ft/min)
+    :param moisture: see spread_reach
+    :param table: see spread_reach
+    :return: (first row, last row + 1, first column, last column + 1) of the window
+    """
+    rows, cols = FUEL.shape
+    I, J = np.atleast_1d(i_start), np.atleast_1d(j_start)
+    radius = mins + 1
+    while True:
+        window = (max(int(I.min()) - radius, 0), min(int(I.max()) + radius + 1, rows),
+                  max(int(J.min()) - radius, 0), min(int(J.max()) + radius + 1, cols))
+        if window == (0, rows, 0, cols):
+            return window
+        i0, i1, j0, j1 = window
+        reach = (mins + 1) * spread_reach(INPUT[i0:i1, j0:j1], FUEL[i0:i1, j0:j1], wind_speed, moisture, table)
+        if reach <= radius:
+            return window
+        radius = reach
+
+
+def grow_window(window, shape, ESCAPED):
+    """
+    Grows a window across the sides a fire escaped it by, doubling it towards each of them
+    :param window: (first row, last row + 1, first column, last column + 1), see fire_window
+    :param shape: (rows, cols) of the landscape
+    :param ESCAPED: sides crossed, see propagation.ESCAPED_FIRST_ROW
+    :return: the grown window, None if the fire only left it across edges of the landscape
+    """
+    i0, i1, j0, j1 = window
+    grown = (max(i0 - (i1 - i0), 0) if ESCAPED[ESCAPED_FIRST_ROW] else i0,
+             min(i1 + (i1 - i0), shape[0]) if ESCAPED[ESCAPED_LAST_ROW] else i1,
+             max(j0 - (j1 - j0), 0) if ESCAPED[ESCAPED_FIRST_COL] else j0,
+             min(j1 + (j1 - j0), shape[1]) if ESCAPED[ESCAPED_LAST_COL] else j1)
+    return None if grown == tuple(window) else grown
+
+
+def pre_burn(lat, lon, path_pickle=None, slope_method="sector", path_landscape=None, wind=None, gridded_wind=False,
+             timeline=None, mins=None, moisture=1., window=None, table=None):
+    """
+    Processes a provided data pickle or landscape, as well as lat/lon to get info for burn
+    Landscape data and slopes are cached per process, the ignition cell and weather are fresh every call
+    :param lat: latitudinal coordinate of ignition, or (n,) latitudes of several ignitions
+    :param lon: longitudinal coordiante of ignition, or (n,) longitudes
+    :param path_pickle: path to the preprocessed pickle data
+    :param slope_method: how tan_phi is computed from elevation, see compute_slope
+    :param path_landscape: path to a landscape directory (see landscape.py), used instead of path_pickle if given
+    :param wind: (wind speed (kt), wind direction (degrees)) to use instead of the nearest station's observation
+    :param gridded_wind: if wind is None, interpolate every station around the landscape rather than take
+                         the nearest one, see cached_wind_field; wind speed and direction are then rasters
+    :param timeline: (minute, (wind speed (kt), wind direction (degrees))) observations or forecasts, each holding
+                     from its minute on. The last one at or before minute 0 is used instead of wind
+    :param mins: minutes the fire will burn for; if given, the arrays returned cover only a window of the landscape
+                 it cannot leave in that time (see fire_window), so a small fire costs as much as its window
+    :param moisture: factor on the fuel moisture the fire will burn with, see fire_window
+    :param window: (first row, last row + 1, first column, last column + 1) of the landscape to crop to instead
+    :param table: fuel constants table the fire will burn with, see fire_window
+    :return: INPUT, FUEL, X, Y, istart, jstart (arrays for several ignitions), wind speed, wind direction, tan_phi,
+             the later changes of weather as (minute, wind speed, wind direction, tan_phi) (see
+             propagation.weather_segments), and the window. X and Y are those of the whole landscape, every raster
+             and the ignition cells are relative to the window
     """
-    cached_pickle = path_pickle[:-len(".pickle")] + "_pre_burn.pickle"
-    if os.path.exists(cached_pickle):
-        with open(cached_pickle, "rb") as f:
-            pre_burn_data = pickle.load(f)
+    # INPUT (landfire stuff), FUEL (raw fuel type), X (longitudes), Y (latitudes)
+    # a landscape is memory-mapped, so INPUT and FUEL are only read where the fire goes
+    if path_landscape is not None:
+        header, data = open_landscape(path_landscape)
+        path_cache = os.path.join(path_landscape, "slope")
+    else:
+        header, data = open_pickle(path_pickle)
+        path_cache = path_pickle[:-len(".pickle")] + "_slope"
+    ELEV = data[0][..., 5]
+
+    # get starting cell, or cells
+    if np.ndim(lat) == 0:
+        i_start, j_start = np.argmin(np.abs(data[2] - lon)), np.argmin(np.abs(data[3] - lat))
     else:
-        pre_burn_data = pre_burn(lat, lon, path_pickle)
+        i_start = np.abs(data[2][None, :] - np.asarray(lon)[:, None]).argmin(axis=1)
+        j_start = np.abs(data[3][None, :] - np.asarray(lat)[:, None]).argmin(axis=1)
+
+    ######
+    ## get weather info
 
-    # load preprocessed data
-    INPUT, FUEL, X, Y, i_start, j_start, wind_speed, wind_dir = pre_burn_data
+    timeline = sorted(timeline or [], key=lambda change: change[0])
+    if timeline and timeline[0][0] <= 0:
+        wind = [weather for minute, weather in timeline if minute <= 0][-1]
+    timeline = [(minute, weather) for minute, weather in timeline if minute > 0]
+
+    if wind is None and gridded_wind:
+        wind_speed, wind_dir, TAN_PHI = cached_wind_field(data[2], data[3], ELEV, header["checksum"],
+                                                          method=slope_method)
+    else:
+        if wind is None:
+            wind = nearest_wind(np.ravel(lat)[0], np.ravel(lon)[0])
+        wind_speed, wind_dir = wind
+        TAN_PHI = None
+
+        # convert kt -> ft/min
+        wind_speed *= 101.269
+
+    ######
+    ## crop to the window the fire can reach, rasters of the whole landscape are cached and sliced
+
+    rows, cols = data[1].shape
+    if window is None:
+        strongest = max([float(np.max(wind_speed))] + [speed * 101.269 for _, (speed, _) in timeline])
+        window = (0, rows, 0, cols) if mins is None else \
+            fire_window(data[0], data[1], i_start, j_start, mins, strongest, moisture, table)
+    i0, i1, j0, j1 = window
+    if window == (0, rows, 0, cols):
+        INPUT, FUEL = data[0], data[1]
+    else:
+        # copied, so the engines compile for one layout of array whatever the window
+        INPUT, FUEL = np.ascontiguousarray(data[0][i0:i1, j0:j1]), np.ascontiguousarray(data[1][i0:i1, j0:j1])
+
+    # slopes of every wind in the timeline come from the same cache, so a change of weather costs little
+    changes = [(minute, speed * 101.269, direction * np.pi / 180,
+                cached_slope(ELEV, direction, header["checksum"], slope_method, path_cache, window=window))
+               for minute, (speed, direction) in timeline]
+
+    if TAN_PHI is not None:
+        wind_speed, wind_dir, TAN_PHI = (raster[i0:i1, j0:j1] for raster in (wind_speed, wind_dir, TAN_PHI))
+    else:
+        ######
+        ## Get slope in direction of wind, kept apart from INPUT so the landscape stays read-only
+
+        TAN_PHI = cached_slope(ELEV, wind_dir, header["checksum"], method=slope_method, path_cache=path_cache,
+                               window=window)
+
+        # wind_dir degrees -> radians
+        wind_dir *= np.pi / 180
+
+    return (INPUT, FUEL, data[2], data[3], i_start - i0, j_start - j0, wind_speed, wind_dir, TAN_PHI, changes,
+            window)
+
+
+def spread(INPUT, FUEL, i_start, j_start, wind_speed, wind_dir, mins, TAN_PHI=None, PROGRESS=None, timeline=None,
+           ARRIVAL=None, moisture=1., starts=None, ESCAPED=None, table=None):
+    """
+    Reference pure-Python implementation of the minute loop, see propagation.propagate for the compiled one
+    :param INPUT: the input array
+    :param FUEL: fuel array
+    :param i_start: row of the ignition cell, or (n,) rows of several ignitions
+    :param j_start: column of the ignition cell, or (n,) columns
+    :param wind_speed: wind speed (ft/min), a scalar or a (rows, cols) raster
+    :param wind_dir: wind direction (radians), a scalar or a (rows, cols) raster
+    :param mins: number of one minute iterations to burn for
+    :param TAN_PHI: (rows, cols) slope in the direction of the wind (see pre_burn), dim 5 of INPUT if None
+    :param PROGRESS: array updated every minute, see propagation.PROGRESS_MINUTE ..., which cancels the burn as in
+                     propagation.propagate
+    :param timeline: later changes of weather, see propagation.weather_segments
+    :param ARRIVAL: raster overwritten with the minute fire first reached each cell, see propagation.propagate
+    :param moisture: factor on the fuel moisture of every cell, see propagation.propagate
+    :param starts: (n,) minutes each ignition is lit at, see propagation.propagate
+    :param ESCAPED: bool array set where fire crossed a side of the arrays, see propagation.propagate
+    :param table: fuel constants table to take spread rates from, see propagation.weather_segments
+    :return: (rows, cols) boolean array of cells which have had fire at any point
+    """
+    if TAN_PHI is None:
+        TAN_PHI = INPUT[..., 5]
+    segments = weather_segments(INPUT, wind_speed, wind_dir, TAN_PHI, timeline, moisture, FUEL, table)
+    _, RATE, WIND_DIR = segments[0]
+    changes = {minute: segment for minute, *segment in segments[1:]}
 
     # Quick check for which fuel types will not burn, we have to be careful to skip these
-    NB = set([91., 92., 93., 98., 99., 0.])
+    NB = set(NON_BURNABLE)
 
     # if FUEL[i_start, j_start] in NB:
     #     result = pd.DataFrame({(X[i_start], Y[j_start])})
@@ -227,88 +671,198 @@ def burn(lat, lon, path_landfire=None, path_fueldict=None, path_pickle=None, min
     AFC = dict()
 
     # (P.I.F.C. - Past Intracellular Fire Cache)
-    # Refreshed after TBD iterations, stores intracellular points which have had fire
+    # Pruned every minute (see propagation.PIFC_RETAIN), stores intracellular points which have had fire
     # two dimensional map: cell -> set of points which have had fire
     PIFC = dict()
 
-    # Compute info for initial fire
-    inputs = INPUT[i_start, j_start, :]
-    R = compute_surface_spread(inputs, wind_speed) * .3048
-    wind_orthogonal_spread = ((2 ** .5) / 5) * R
-    grid_dimension = int(np.ceil(30 / wind_orthogonal_spread))
-    R *= (grid_dimension / 30)
-    wind_orthogonal_spread *= (grid_dimension / 30)
-    x_inc = int(np.rint(R * np.cos(wind_dir)))
-    y_inc = int(np.rint(R * np.sin(wind_dir)))
-    initial_fire = (int(np.floor(grid_dimension / 2)), int(np.floor(grid_dimension / 2)))
+    # cells whose AFC entries were computed under earlier weather, see change_weather
+    stale = set()
+
+    # cells closed for good (see propagation.close_cells), and the last minute each cell received a new fire, PIFC
+    # entries of either closed cells or cells untouched for PIFC_RETAIN minutes being pruned
+    REACH = cell_reach(FUEL, segments)
+    CLOSED = np.zeros(FUEL.shape, dtype=bool)
+    burning, DISTANCE = [], np.empty(FUEL.shape, dtype=np.int64)  # burned cells not closed yet, see close_cells
+    touched = dict()
 
-    # place initial fire in AFC and PIFC
-    AFC[(i_start, j_start)] = np.array([x_inc, y_inc, wind_orthogonal_spread, grid_dimension, R])
-    PIFC[(i_start, j_start)] = set([initial_fire])
+    # initial fires are lit at the centers of their cells, each at its own minute
+    ignitions = [((int(i), int(j)), int(start)) for i, j, start in zip(*ignition_schedule(i_start, j_start, starts))
+                 if 0 <= i < FUEL.shape[0] and 0 <= j < FUEL.shape[1] and FUEL[i, j] not in NB]
+    ignitions.reverse()
 
-    frontier = dict([((i_start, j_start), set([initial_fire]))])  # Fires which will be iterated on this iteration
-    FIRES = set([(i_start, j_start)])  # Final output: cells which have had fire at any point
+    frontier = dict()  # Fires which will be iterated on this iteration
+    FIRES = set()  # Final output: cells which have had fire at any point
+    arrival = dict()  # minute fire first reached each cell in FIRES
+
+    # kept up to date minute by minute, as the compiled engine does, so a burn can be read while it runs, and cells
+    # closed from it
+    ARRIVAL = arrival_raster(FUEL.shape, mins) if ARRIVAL is None else ARRIVAL
+    ARRIVAL[...] = -1
+    ESCAPED = np.zeros(ESCAPED_SIZE, dtype=bool) if ESCAPED is None else ESCAPED
 
     for t in range(mins):
 
-        # quit if there are no fires to update
-        if not frontier:
+        # stop where we are if the burn was cancelled
+        if PROGRESS is not None and PROGRESS[PROGRESS_CANCEL]:
+            raise BurnCancelled(f"Burn cancelled after {PROGRESS[PROGRESS_MINUTE]} minutes")
+
+        # switch to the next weather at its change point
+        if t in changes:
+            RATE, WIND_DIR = changes[t]
+            frontier = change_weather(AFC, PIFC, stale, frontier, RATE, WIND_DIR)
+
+        # light the ignitions starting this minute, into the same frontier
+        while ignitions and ignitions[-1][1] == t:
+            cell, _ = ignitions.pop()
+            ignite(frontier, FIRES, AFC, PIFC, stale, RATE, WIND_DIR, cell)
+            if cell not in arrival:
+                arrival[cell] = t
+                ARRIVAL[cell] = t
+                burning.append(cell)
+            touched[cell] = t
+
+        # quit if there are no fires to update, nor any still to be lit
+        if not frontier and not ignitions:
             break
 
+        # retire the fires of cells fire has closed in on, so the frontier follows the perimeter, not the area
+        if t % CLOSE_EVERY == 0:
+            close_cells(FUEL, ARRIVAL, REACH, CLOSED, ESCAPED, mins - t, burning, DISTANCE)
+        frontier = {cell: fires for cell, fires in frontier.items() if not CLOSED[cell]}
+
         new_frontier = {}
 
         for cell in frontier:
 
-            inputs = INPUT[cell[0], cell[1]]
+            info = AFC[cell]
+            steps = info[AFC_GRID] - 1
+            offsets = ((info[AFC_X_INC], info[AFC_Y_INC]), (info[AFC_X1_INC], info[AFC_Y1_INC]),
+                       (info[AFC_X2_INC], info[AFC_Y2_INC]))
 
             for fire in frontier[cell]:
                 #####
                 # Triangular Geometry
                 #####
 
-                info = AFC[cell]
-                x_inc, y_inc, wind_orthogonal_spread, grid_dimension, R = info[0], info[1], info[2], info[3], info[4]
-
-                new_x = fire[0] + x_inc
-                new_y = fire[1] + y_inc
-                new_i = int(cell[0] + new_y // (grid_dimension - 1))
-                new_j = int(cell[1] + new_x // (grid_dimension - 1))
-                new_x %= (grid_dimension - 1)
-                new_y %= (grid_dimension - 1)
-
-                x1_orth_inc = int(np.rint(wind_orthogonal_spread * np.cos(wind_dir + np.pi / 2)))
-                y1_orth_inc = int(np.rint(wind_orthogonal_spread * np.sin(wind_dir + np.pi / 2)))
-                new_x_orth1 = fire[0] + x1_orth_inc
-                new_y_orth1 = fire[1] + y1_orth_inc
-                new_i_orth1 = int(cell[0] + new_y_orth1 // (grid_dimension - 1))
-                new_j_orth1 = int(cell[1] + new_x_orth1 // (grid_dimension - 1))
-                new_x_orth1 %= (grid_dimension - 1)
-                new_y_orth1 %= (grid_dimension - 1)
-
-                x2_orth_inc = int(np.rint(wind_orthogonal_spread * np.cos(wind_dir - np.pi / 2)))
-                y2_orth_inc = int(np.rint(wind_orthogonal_spread * np.sin(wind_dir - np.pi / 2)))
-                new_x_orth2 = fire[0] + x2_orth_inc
-                new_y_orth2 = fire[1] + y2_orth_inc
-                new_i_orth2 = int(cell[0] + new_y_orth2 // (grid_dimension - 1))
-                new_j_orth2 = int(cell[1] + new_x_orth2 // (grid_dimension - 1))
-                new_x_orth2 %= (grid_dimension - 1)
-                new_y_orth2 %= (grid_dimension - 1)
-
-                handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_speed,
-                                      wind_dir, cell, new_i, new_j, new_x, new_y)
-                handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_speed,
-                                      wind_dir, cell, new_i_orth1, new_j_orth1, new_x_orth1, new_y_orth1)
-                handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, INPUT, FUEL, wind_speed,
-                                      wind_dir, cell, new_i_orth2, new_j_orth2, new_x_orth2, new_y_orth2)
-
-        if not t % 50: PIFC = {cell: PIFC[cell] for cell in PIFC if cell in new_frontier}
+                # one child downwind, and one to each side orthogonal to the wind
+                for x_inc, y_inc in offsets:
+                    di, new_y = divmod(fire[1] + y_inc, steps)
+                    dj, new_x = divmod(fire[0] + x_inc, steps)
+
+                    handle_new_fire_point(new_frontier, FIRES, NB, AFC, PIFC, FUEL, RATE, WIND_DIR, cell,
+                                          int(cell[0] + di), int(cell[1] + dj), new_x, new_y, stale, ESCAPED, CLOSED)
+
+        for cell in new_frontier:
+            touched[cell] = t
+        PIFC = {cell: PIFC[cell] for cell in PIFC if not CLOSED[cell] and touched[cell] >= t - PIFC_RETAIN}
 
         frontier = new_frontier
 
-    # map fire indices to lat/lon coords
-    FIRES_LATLON = pd.DataFrame({(X[pair[0]], Y[pair[1]]) for pair in FIRES})
-    FIRES_LATLON.columns = ["x", "y"]
-    return FIRES_LATLON
+        # every cell which caught fire this minute has a fire in the new frontier
+        for cell in frontier:
+            if cell not in arrival:
+                arrival[cell] = t + 1
+                ARRIVAL[cell] = t + 1
+                burning.append(cell)
+
+        if PROGRESS is not None:
+            PROGRESS[PROGRESS_MINUTE] = t + 1
+            PROGRESS[PROGRESS_FRONTIER] = sum(len(fires) for fires in frontier.values())
+            PROGRESS[PROGRESS_BURNED] = len(FIRES)
+
+    # ignitions lit as the burn ends have had no time to spread
+    for cell, start in reversed(ignitions):
+        if start <= mins:
+            FIRES.add(cell)
+            arrival.setdefault(cell, start)
+    if PROGRESS is not None:
+        PROGRESS[PROGRESS_BURNED] = len(FIRES)
+
+    burned = np.zeros(FUEL.shape, dtype=bool)
+    burned[tuple(np.array(list(FIRES), dtype=np.int64).reshape(-1, 2).T)] = True
+    ARRIVAL[tuple(np.array(list(arrival), dtype=np.int64).reshape(-1, 2).T)] = list(arrival.values())
+    return burned
+
+
+def burn(lat, lon, path_landfire=None, path_fueldict=None, path_pickle=None, mins=50, engine="numba",
+         slope_method="sector", path_landscape=None, wind=None, progress=None, gridded_wind=False, timeline=None,
+         output="latlon", moisture=1., starts=None, snapshot=None):
+    """
+    Burning down the house
+    :param lat: latitude of ignition, or (n,) latitudes of several ignitions burning as one fire
+    :param lon: longitude of ignition, or (n,) longitudes
+    :param path_landfire: path to `landfire.nc`
+    :param path_fueldict: path to `FUEL_DIC.csv` whose fuel constants spread rates come from (see
+                          cached_fuel_constants), PATH_FUELDICT if None
+    :param path_pickle: path to preprocessed pickle data
+    :param mins: number of one minute iterations to burn for
+    :param engine: "numba" for the compiled propagation engine, "python" for the reference loop in spread()
+    :param slope_method: how tan_phi is computed from elevation, see compute_slope
+    :param path_landscape: path to a landscape directory, opened once per process and read lazily
+    :param wind: (wind speed (kt), wind direction (degrees)), fetched from the nearest station if None
+    :param progress: int64 array the engine keeps up to date while it burns, see propagation.PROGRESS_MINUTE ...
+    :param gridded_wind: spread each cell with the wind interpolated from all nearby stations, see pre_burn
+    :param timeline: (minute, (wind speed (kt), wind direction (degrees))) changes of weather during the burn,
+                     see pre_burn; only cells burning at a change have their spread recomputed
+    :param output: "latlon" for a DataFrame of the x (longitude), y (latitude) of every burned cell,
+                   "mask" for a (rows, cols) boolean array of burned cells, "arrival" for a (rows, cols) raster
+                   of the minute fire first reached each cell (see propagation.propagate), or "cells" for a compact
+                   results.BurnedCells with arrival minutes, which converts to the others and to the
+                   serializations in results.py
+    :param moisture: factor on the fuel moisture of every cell, see propagation.propagate
+    :param starts: (n,) minutes each of several ignitions is lit at, all at minute 0 if None; ignitions in
+                   unburnable fuel never light, see propagation.propagate
+    :param snapshot: shared buffer to burn the arrival raster in while it fits, so other processes can read the
+                     cells burned so far, see results.snapshot_arrival
+    :return: the cells burned after all iterations, as chosen by output
+    """
+    if output not in ("latlon", "mask", "arrival", "cells"):
+        raise ValueError(f"Unknown output {output}; expected 'latlon', 'mask', 'arrival' or 'cells'")
+    if engine not in ("numba", "python"):
+        raise ValueError(f"Unknown engine {engine}; expected 'numba' or 'python'")
+
+    # load preprocessed data, only the ignition cell and weather are new on a warm process; the arrays cover a window
+    # of the landscape the fire cannot leave in mins minutes
+    table = cached_fuel_constants(path_fueldict)
+    INPUT, FUEL, X, Y, i_start, j_start, wind_speed, wind_dir, TAN_PHI, changes, window = \
+        pre_burn(lat, lon, path_pickle, slope_method=slope_method, path_landscape=path_landscape, wind=wind,
+                 gridded_wind=gridded_wind, timeline=timeline, mins=mins, moisture=moisture, table=table)
+
+    # a grown window burns in the wind of the first, not whatever the nearest station has reported since
+    if np.ndim(wind_speed) == 0:
+        wind = (wind_speed / 101.269, wind_dir * 180 / np.pi)
+
+    while True:
+        ARRIVAL, ESCAPED = arrival_raster(FUEL.shape, mins), np.zeros(ESCAPED_SIZE, dtype=bool)
+        if snapshot is not None:
+            PUBLISHED = snapshot_arrival(snapshot, window, ARRIVAL.dtype)
+            ARRIVAL = ARRIVAL if PUBLISHED is None else PUBLISHED
+        if engine == "numba":
+            propagate(INPUT, FUEL, i_start, j_start, wind_speed, wind_dir, mins, TAN_PHI=TAN_PHI, PROGRESS=progress,
+                      timeline=changes, ARRIVAL=ARRIVAL, moisture=moisture, starts=starts, ESCAPED=ESCAPED,
+                      table=table)
+        elif engine == "python":
+            spread(INPUT, FUEL, i_start, j_start, wind_speed, wind_dir, mins, TAN_PHI=TAN_PHI, PROGRESS=progress,
+                   timeline=changes, ARRIVAL=ARRIVAL, moisture=moisture, starts=starts, ESCAPED=ESCAPED,
+                   table=table)
+
+        # the window is a bound, not a guarantee: a fire which left it burns again on a window grown past it
+        grown = grow_window(window, (len(X), len(Y)), ESCAPED)
+        if grown is None:
+            break
+        INPUT, FUEL, _, _, i_start, j_start, wind_speed, wind_dir, TAN_PHI, changes, window = \
+            pre_burn(lat, lon, path_pickle, slope_method=slope_method, path_landscape=path_landscape, wind=wind,
+                     gridded_wind=gridded_wind, timeline=timeline, window=grown)
+
+    i0, i1, j0, j1 = window
+    if output in ("mask", "arrival"):
+        FULL = np.full((len(X), len(Y)), -1, dtype=ARRIVAL.dtype)
+        FULL[i0:i1, j0:j1] = ARRIVAL
+        return FULL if output == "arrival" else FULL >= 0
+
+    # map fire indices to lat/lon coords, only when asked for
+    cells = BurnedCells.from_arrival(ARRIVAL, X, Y, origin=(i0, j0))
+    return cells if output == "cells" else cells.latlon()
 
 # fires = burn(37.2, -121.592092, 'capstone/CapstoneExploration/data/farsite.nc', 'capstone/CapstoneExploration/FUEL_DIC.csv', 500)
 # plt.scatter([item[1] for item in fires], [item[0] for item in fires])
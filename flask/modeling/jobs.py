@@ -0,0 +1,161 @@
+#################################################
+#################################################
+#################################################
+##### Simulation Jobs
+#####
+##### Asynchronous simulations on a Simulator: submit returns a job id straight away, status reports the minute
+##### and frontier size while the fire burns, and its perimeter so far if asked, and results stay available until
+##### they expire.
+
+from collections import OrderedDict
+import itertools
+import threading
+import time
+import uuid
+
+from modeling.models.propagation import PROGRESS_BURNED, PROGRESS_FRONTIER, PROGRESS_MINUTE
+from modeling.results import to_perimeter
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = "queued", "running", "done", "failed"
+
+
+class JobStoreFull(Exception):
+    """
+    Raised when a job is submitted to a store holding only unfinished jobs
+    """
+
+
+class JobNotDone(Exception):
+    """
+    Raised when the result of an unfinished job is requested
+    """
+
+
+class Job:
+    """
+    One simulation, as held by a JobStore
+    """
+
+    def __init__(self, number, lat, lon, mins, future, submitted):
+        self.number = number
+        self.lat, self.lon, self.mins = lat, lon, mins
+        self.future = future
+        self.submitted = submitted
+        self.finished = None
+        self.last_progress = None
+
+
+class JobStore:
+    """
+    Bounded store of simulation jobs. Finished jobs are evicted once they are older than the TTL,
+    or oldest first when the store is full
+    """
+
+    def __init__(self, simulator, max_jobs=100, ttl=600, clock=time.monotonic):
+        """
+        :param simulator: Simulator which runs the jobs
+        :param max_jobs: most jobs held at once, finished or not
+        :param ttl: seconds a finished job is kept for
+        :param clock: time source, in seconds
+        """
+        self.simulator = simulator
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.clock = clock
+        self.jobs = OrderedDict()
+        self.numbers = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, lat, lon, mins=50, **kwargs):
+        """
+        Queues a simulation
+        :param lat: latitude of ignition
+        :param lon: longitude of ignition
+        :param mins: number of one minute iterations to burn for
+        :param kwargs: any other arguments of burn(), such as wind
+        :return: id of the new job
+        """
+        with self.lock:
+            self._evict(make_room=True)
+            if len(self.jobs) >= self.max_jobs:
+                raise JobStoreFull(f"{len(self.jobs)} simulations are already queued or running")
+
+            job_id = uuid.uuid4().hex
+            number = next(self.numbers)
+            future = self.simulator.submit(lat, lon, job=number, mins=mins, **kwargs)
+            job = Job(number, lat, lon, mins, future, self.clock())
+            future.add_done_callback(lambda _: setattr(job, "finished", self.clock()))
+            self.jobs[job_id] = job
+        return job_id
+
+    def status(self, job_id, perimeter=False, tolerance=1.):
+        """
+        :param job_id: id returned by submit
+        :param perimeter: also give the perimeter of the cells burned so far while the job runs, as a GeoJSON
+                          "perimeter" (see results.to_perimeter), once its worker has published them
+        :param tolerance: see results.perimeter
+        :return: dict of the job's state, minutes burned so far, frontier size and number of burned cells
+        """
+        job = self._get(job_id)
+        status = {"id": job_id, "lat": job.lat, "lon": job.lon, "mins": job.mins}
+
+        if job.future.done():
+            error = job.future.exception() if not job.future.cancelled() else "cancelled"
+            status["state"] = JOB_FAILED if error else JOB_DONE
+            if error:
+                status["error"] = str(error)
+            else:
+                status.update(job.last_progress or {})
+                status["burned"] = len(job.future.result())
+            return status
+
+        progress = self.simulator.progress(job.number)
+        if progress is None:
+            status["state"] = JOB_QUEUED
+            return status
+
+        job.last_progress = {"minute": int(progress[PROGRESS_MINUTE]),
+                             "frontier": int(progress[PROGRESS_FRONTIER]),
+                             "burned": int(progress[PROGRESS_BURNED])}
+        status["state"] = JOB_RUNNING
+        status.update(job.last_progress)
+        if perimeter:
+            cells = self.simulator.snapshot(job.number)
+            if cells is not None:
+                status["perimeter"] = to_perimeter(cells, tolerance=tolerance)
+        return status
+
+    def result(self, job_id):
+        """
+        :param job_id: id returned by submit
+        :return: burn()'s result; the job's exception is raised if it failed, JobNotDone if it is still going
+        """
+        job = self._get(job_id)
+        if not job.future.done():
+            raise JobNotDone(f"Job {job_id} has not finished")
+        return job.future.result()
+
+    def _get(self, job_id):
+        """
+        :param job_id: id returned by submit
+        :return: the job, KeyError if it is unknown or has expired
+        """
+        with self.lock:
+            self._evict()
+            return self.jobs[job_id]
+
+    def _evict(self, make_room=False):
+        """
+        Drops expired jobs. Callers hold the lock
+        :param make_room: also drop the oldest finished jobs while the store is full
+        """
+        now = self.clock()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished is not None and now - job.finished > self.ttl]:
+            del self.jobs[job_id]
+
+        if not make_room:
+            return
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished is not None]
+        while len(self.jobs) >= self.max_jobs and finished:
+            del self.jobs[finished.pop(0)]
@@ -0,0 +1,805 @@
+####################################
+####################################
+####################################
+##### Compiled Frontier Propagation
+#####
+##### A numba implementation of the minute loop in farsite.spread, producing the same burned cells.
+##### The frontier is kept as an array with one (i, j, x, y) row per fire point, the AFC as a table
+##### indexed through a (rows, cols) map, and the PIFC as per-cell bitmaps of intracellular points.
+#####
+
+import numpy as np
+from numba import jit
+from numba.typed import List
+
+from modeling.models.rothermel import compute_surface_spread_fuel_grid, compute_surface_spread_grid, fuel_constants
+
+# Fuel types which will not burn, we have to be careful to skip these
+NON_BURNABLE = np.array([91., 92., 93., 98., 99., 0.])
+
+# The PIFC of a cell is a grid_dimension x grid_dimension bitmap in a shared pool, for grids up to
+# BITMAP_DIMENSION. Finer grids belong to cells which hardly spread at all, their points fall back to a set
+BITMAP_DIMENSION = 512
+
+# Columns of an AFC row: the (x, y) offsets of the downwind child and of the two children orthogonal to the wind,
+# all precomputed when the cell is admitted, then wind_orthogonal_spread, grid_dimension and R
+AFC_X_INC, AFC_Y_INC, AFC_X1_INC, AFC_Y1_INC, AFC_X2_INC, AFC_Y2_INC, AFC_ORTH, AFC_GRID, AFC_R = range(9)
+AFC_SIZE = 9
+
+# Entries of the progress array an engine keeps up to date while it burns: minutes burned so far,
+# fire points in the frontier and cells burned. The last is set by whoever wants the burn stopped: the engine checks
+# it at the start of every minute and raises BurnCancelled
+PROGRESS_MINUTE, PROGRESS_FRONTIER, PROGRESS_BURNED, PROGRESS_CANCEL = range(4)
+PROGRESS_SIZE = 4
+
+# Entries of the escape array an engine sets when a fire point crosses the first row, last row, first column or
+# last column of its arrays, leaving them. Burns on a window of the landscape grow it across those sides
+ESCAPED_FIRST_ROW, ESCAPED_LAST_ROW, ESCAPED_FIRST_COL, ESCAPED_LAST_COL = range(4)
+ESCAPED_SIZE = 4
+
+# Minutes a cell keeps its PIFC after it last received a new fire point. Older PIFCs are pruned every minute, as are
+# those of closed cells (see close_cells), so the PIFC covers the band the fire front crossed lately, not the burn
+PIFC_RETAIN = 50
+
+# Minutes between the sweeps closing cells (see close_cells) the engines make, at minutes 0, CLOSE_EVERY, ...
+CLOSE_EVERY = 10
+
+# A fuel moisture scaled by a moisture factor is held below this fraction of the extinction moisture,
+# where the moisture damping, and with it the spread rate, reaches zero
+MOISTURE_CEILING = .99
+
+
+class BurnCancelled(Exception):
+    """
+    Raised by an engine whose burn was cancelled through PROGRESS_CANCEL
+    """
+
+
+@jit(nopython=True)
+def _burnable(FUEL, NB, i, j):
+    """
+    :param FUEL: fuel array
+    :param NB: array of non burnable fuel types
+    :param i: row index
+    :param j: column index
+    :return: True if (i, j) lies in the landscape and its fuel burns
+    """
+    if i < 0 or i >= FUEL.shape[0] or j < 0 or j >= FUEL.shape[1]:
+        return False
+    for fuel in NB:
+        if FUEL[i, j] == fuel:
+            return False
+    return True
+
+
+@jit(nopython=True)
+def _divmod(coord, steps):
+    """
+    Floor division and modulo of an intracellular coordinate by the steps of its cell, as Python floats would
+    :param coord: intracellular coordinate, integral but possibly beyond any integer type
+    :param steps: grid_dimension - 1 of the cell
+    :return: number of cells moved, intracellular coordinate in the new cell
+    """
+    # integer arithmetic is exact and a lot faster whenever both fit
+    if steps < 2. ** 31 and -2. ** 31 < coord < 2. ** 31:
+        c, s = int(coord), int(steps)
+        return c // s, float(c % s)
+    return int(coord // steps), coord % steps
+
+
+def as_raster(values):
+    """
+    The form the engines take wind speed, wind direction and tan_phi in, so uniform and gridded winds, and slopes
+    from any source, share compiled code
+    :param values: a scalar, or a (rows, cols) raster
+    :return: read-only C-contiguous float32 raster, 1x1 for a scalar
+    """
+    RASTER = np.asarray(values, dtype=np.float32)
+    RASTER = RASTER.reshape(1, 1) if RASTER.ndim == 0 else np.ascontiguousarray(RASTER).view()
+    RASTER.flags.writeable = False
+    return RASTER
+
+
+@jit(nopython=True)
+def wind_at(WIND, i, j):
+    """
+    :param WIND: wind raster, see as_raster
+    :param i: row index
+    :param j: column index
+    :return: the wind of cell (i, j), a 1x1 raster being the same everywhere
+    """
+    if WIND.shape[0] == 1 and WIND.shape[1] == 1:
+        return WIND[0, 0]
+    return WIND[i, j]
+
+
+@jit(nopython=True)
+def _afc_entry(RATE, WIND_DIR, i, j):
+    """
+    Computes the AFC row of a cell, exactly as farsite.afc_entry does
+    :param RATE: spread rate raster (ft/min) of the current weather, see weather_segments
+    :param WIND_DIR: wind direction raster (radians)
+    :param i: row index
+    :param j: column index
+    :return: AFC row, laid out as AFC_X_INC ... AFC_R
+    """
+    wind_dir = float(wind_at(WIND_DIR, i, j))
+    R = float(RATE[i, j]) * .3048
+
+    orthogonal_spread = ((2 ** .5) / 5) * R
+    grid_dimension = np.ceil(30 / orthogonal_spread)
+
+    # convert m/min -> grid steps per min
+    R *= (grid_dimension / 30)
+    orthogonal_spread *= (grid_dimension / 30)
+
+    entry = np.empty(AFC_SIZE)
+    entry[AFC_X_INC] = np.rint(R * np.cos(wind_dir))
+    entry[AFC_Y_INC] = np.rint(R * np.sin(wind_dir))
+    entry[AFC_X1_INC] = np.rint(orthogonal_spread * np.cos(wind_dir + np.pi / 2))
+    entry[AFC_Y1_INC] = np.rint(orthogonal_spread * np.sin(wind_dir + np.pi / 2))
+    entry[AFC_X2_INC] = np.rint(orthogonal_spread * np.cos(wind_dir - np.pi / 2))
+    entry[AFC_Y2_INC] = np.rint(orthogonal_spread * np.sin(wind_dir - np.pi / 2))
+    entry[AFC_ORTH] = orthogonal_spread
+    entry[AFC_GRID] = grid_dimension
+    entry[AFC_R] = R
+    return entry
+
+
+@jit(nopython=True)
+def _reach(entry):
+    """
+    :param entry: AFC row of a cell
+    :return: number of cells a child of a fire point in the cell can move away from it in a minute
+    """
+    increment = 0.
+    for column in range(AFC_X_INC, AFC_Y2_INC + 1):
+        increment = max(increment, abs(entry[column]))
+    # a point lies anywhere from 0 to steps in its cell
+    return 1 + int(increment // (entry[AFC_GRID] - 1))
+
+
+@jit(nopython=True)
+def _cell_reach(FUEL, NB, RATES, WIND_DIRS):
+    """
+    :param FUEL: fuel array
+    :param NB: array of non burnable fuel types
+    :param RATES: spread rate raster of each weather segment, see weather_segments
+    :param WIND_DIRS: wind direction raster of each weather segment
+    :return: (rows, cols) int64 raster of the cells a child moves at most from each burnable cell under any of the
+             weather segments, see _reach
+    """
+    REACH = np.zeros(FUEL.shape, dtype=np.int64)
+    for segment in range(len(RATES)):
+        for i in range(FUEL.shape[0]):
+            for j in range(FUEL.shape[1]):
+                if _burnable(FUEL, NB, i, j) and RATES[segment][i, j] > 0:
+                    REACH[i, j] = max(REACH[i, j], _reach(_afc_entry(RATES[segment], WIND_DIRS[segment], i, j)))
+    return REACH
+
+
+@jit(nopython=True)
+def _close(FUEL, NB, ARRIVAL, REACH, CLOSED, ESCAPED, horizon, CELLS, n_cells, DISTANCE, queue):
+    """
+    Closes the burned cells fire can spread nowhere new from within the horizon: those from which no chain of at
+    most horizon moves, each of up to REACH of the cell it leaves and onto a burnable cell, gets to a cell which
+    has not had fire, or across a side of the arrays fire has not crossed yet.
+    Whatever the fire points of a closed cell would lead to stays on burned ground, as does any change in which
+    other points they would keep out through the PIFC, so retiring them, dropping the children landing in closed
+    cells and pruning their PIFC change neither ARRIVAL nor ESCAPED. Cells stay closed, horizons only shrinking,
+    and no chain short enough passes through a closed cell, so a sweep only visits the burned cells not closed
+    yet: it costs O(n_cells * (2 * reach + 1) ** 2), reach being the largest REACH among them. n_cells is the
+    whole burn while the horizon is longer than the fire is deep, and shrinks to the band within horizon moves of
+    unburned ground as the horizon does
+    :param FUEL: fuel array
+    :param NB: array of non burnable fuel types
+    :param ARRIVAL: arrival raster, see propagate, holding every arrival up to the current minute
+    :param REACH: raster of cell_reach
+    :param CLOSED: bool raster of closed cells, updated in place
+    :param ESCAPED: escape array, see propagate
+    :param horizon: minutes left to burn
+    :param CELLS: (i, j) rows of every burned cell not closed yet, compacted in place to those left open
+    :param n_cells: number of rows of CELLS in use
+    :param DISTANCE: (rows, cols) int64 raster, kept across sweeps, only read where CELLS points
+    :param queue: (i, j) rows of scratch space, kept across sweeps
+    :return: number of rows of CELLS left open, and the (possibly grown) queue
+    """
+    rows, cols = FUEL.shape[0], FUEL.shape[1]
+    if queue.shape[0] < n_cells:
+        queue = np.empty((CELLS.shape[0], 2), dtype=np.int64)
+
+    # moves from each cell to the nearest way out, found breadth first back from the cells one move from one
+    margin, n_queued = 0, 0
+    for k in range(n_cells):
+        i, j = CELLS[k, 0], CELLS[k, 1]
+        reach = REACH[i, j]
+        margin = max(margin, reach)
+        DISTANCE[i, j] = horizon + 1
+        if ((i - reach < 0 and not ESCAPED[ESCAPED_FIRST_ROW]) or
+                (i + reach >= rows and not ESCAPED[ESCAPED_LAST_ROW]) or
+                (j - reach < 0 and not ESCAPED[ESCAPED_FIRST_COL]) or
+                (j + reach >= cols and not ESCAPED[ESCAPED_LAST_COL])):
+            DISTANCE[i, j] = 1
+        else:
+            for a in range(max(i - reach, 0), min(i + reach, rows - 1) + 1):
+                for b in range(max(j - reach, 0), min(j + reach, cols - 1) + 1):
+                    if ARRIVAL[a, b] < 0 and _burnable(FUEL, NB, a, b):
+                        DISTANCE[i, j] = 1
+        if DISTANCE[i, j] == 1:
+            queue[n_queued, 0], queue[n_queued, 1] = i, j
+            n_queued += 1
+
+    head = 0
+    while head < n_queued:
+        a, b = queue[head, 0], queue[head, 1]
+        head += 1
+        distance = DISTANCE[a, b]
+        if distance >= horizon:
+            continue
+        for i in range(max(a - margin, 0), min(a + margin, rows - 1) + 1):
+            for j in range(max(b - margin, 0), min(b + margin, cols - 1) + 1):
+                if ARRIVAL[i, j] >= 0 and not CLOSED[i, j] and max(abs(i - a), abs(j - b)) <= REACH[i, j] and \
+                        DISTANCE[i, j] > distance + 1:
+                    DISTANCE[i, j] = distance + 1
+                    queue[n_queued, 0], queue[n_queued, 1] = i, j
+                    n_queued += 1
+
+    n_open = 0
+    for k in range(n_cells):
+        i, j = CELLS[k, 0], CELLS[k, 1]
+        if DISTANCE[i, j] > horizon:
+            CLOSED[i, j] = True
+        else:
+            CELLS[n_open, 0], CELLS[n_open, 1] = i, j
+            n_open += 1
+    return n_open, queue
+
+
+@jit(nopython=True)
+def _touch(stamp, KEPT, PIFC_CELLS, n_kept, i, j, t):
+    """
+    Stamps cell (i, j) with the minute it received a new fire point, listing it among the cells whose PIFC is kept
+    :return: the (possibly grown) PIFC_CELLS and the number of rows in use
+    """
+    stamp[i, j] = t
+    if not KEPT[i, j]:
+        KEPT[i, j] = True
+        if n_kept == PIFC_CELLS.shape[0]:
+            PIFC_CELLS = _grow(PIFC_CELLS, n_kept)
+        PIFC_CELLS[n_kept, 0], PIFC_CELLS[n_kept, 1] = i, j
+        n_kept += 1
+    return PIFC_CELLS, n_kept
+
+
+@jit(nopython=True)
+def _grow(table, n):
+    """
+    :param table: a full 2D table
+    :param n: number of rows in use
+    :return: a copy of the table with twice the rows
+    """
+    grown = np.empty((2 * table.shape[0], table.shape[1]), dtype=table.dtype)
+    grown[:n] = table[:n]
+    return grown
+
+
+@jit(nopython=True)
+def _pifc_allocate(POOL, n_pool, PIFC_OFFSET, i, j, grid_dimension):
+    """
+    Allocates an empty PIFC bitmap for cell (i, j) at the end of the pool
+    :return: the (possibly grown) pool and the number of pool entries in use
+    """
+    size = grid_dimension * grid_dimension
+    if n_pool + size > POOL.shape[0]:
+        grown = np.zeros(max(2 * POOL.shape[0], n_pool + size), dtype=np.bool_)
+        grown[:n_pool] = POOL[:n_pool]
+        POOL = grown
+    POOL[n_pool:n_pool + size] = False
+    PIFC_OFFSET[i, j] = n_pool
+    return POOL, n_pool + size
+
+
+@jit(nopython=True)
+def _afc_admit(AFC, AFC_SEGMENT, AFC_INDEX, n_afc, RATE, WIND_DIR, segment, i, j):
+    """
+    Appends the AFC row of cell (i, j), tagged with the weather segment it was computed under
+    :return: the (possibly grown) AFC and AFC_SEGMENT tables and the number of rows in use
+    """
+    if n_afc == AFC.shape[0]:
+        AFC, AFC_SEGMENT = _grow(AFC, n_afc), _grow(AFC_SEGMENT.reshape(-1, 1), n_afc).reshape(-1)
+    AFC[n_afc] = _afc_entry(RATE, WIND_DIR, i, j)
+    AFC_SEGMENT[n_afc] = segment
+    AFC_INDEX[i, j] = n_afc
+    return AFC, AFC_SEGMENT, n_afc + 1
+
+
+@jit(nopython=True)
+def _afc_refresh(AFC, AFC_SEGMENT, AFC_INDEX, RATE, WIND_DIR, segment, PIFC_OFFSET, PIFC_FINE, i, j):
+    """
+    Recomputes the AFC row of cell (i, j) under the current weather if it was computed under earlier weather,
+    as farsite.refresh_afc does. A cell whose grid dimension changed loses its PIFC, the space of a bitmap
+    is reclaimed at the next pruning
+    """
+    row = AFC_INDEX[i, j]
+    if AFC_SEGMENT[row] == segment:
+        return
+    old_grid_dimension = AFC[row, AFC_GRID]
+    AFC[row] = _afc_entry(RATE, WIND_DIR, i, j)
+    AFC_SEGMENT[row] = segment
+    if AFC[row, AFC_GRID] == old_grid_dimension:
+        return
+
+    if old_grid_dimension <= BITMAP_DIMENSION:
+        PIFC_OFFSET[i, j] = -1
+    else:
+        for key in [key for key in PIFC_FINE if key[0] == i and key[1] == j]:
+            PIFC_FINE.discard(key)
+
+
+@jit(nopython=True)
+def _change_weather(RATE, WIND_DIR, segment, AFC, AFC_SEGMENT, AFC_INDEX, POOL, n_pool, PIFC_OFFSET, PIFC_FINE,
+                    frontier, n_frontier):
+    """
+    Switches a burning fire to new weather, exactly as farsite.change_weather does. Only the AFC rows of cells in
+    the frontier are recomputed, every other row goes stale and is recomputed if fire comes back (see _afc_refresh),
+    so a change costs as much as the frontier, not the burned area
+    :return: POOL, n_pool and n_frontier under the new weather, the frontier being compacted in place
+    """
+    # grid dimension of every point under the old weather, before any row is refreshed
+    OLD_GRID = np.empty(n_frontier)
+    for k in range(n_frontier):
+        OLD_GRID[k] = AFC[AFC_INDEX[int(frontier[k, 0]), int(frontier[k, 1])], AFC_GRID]
+    for k in range(n_frontier):
+        _afc_refresh(AFC, AFC_SEGMENT, AFC_INDEX, RATE, WIND_DIR, segment, PIFC_OFFSET, PIFC_FINE,
+                     int(frontier[k, 0]), int(frontier[k, 1]))
+
+    # points in a cell whose grid changed are regridded as when they switch cells, and deduplicated
+    n_kept = 0
+    for k in range(n_frontier):
+        i, j, x, y = int(frontier[k, 0]), int(frontier[k, 1]), frontier[k, 2], frontier[k, 3]
+        grid_dimension = AFC[AFC_INDEX[i, j], AFC_GRID]
+        if grid_dimension != OLD_GRID[k]:
+            x = min(np.floor((x / (OLD_GRID[k] - 1)) * grid_dimension), grid_dimension - 1)
+            y = min(np.floor((y / (OLD_GRID[k] - 1)) * grid_dimension), grid_dimension - 1)
+            if grid_dimension <= BITMAP_DIMENSION:
+                if PIFC_OFFSET[i, j] < 0:
+                    POOL, n_pool = _pifc_allocate(POOL, n_pool, PIFC_OFFSET, i, j, int(grid_dimension))
+                index = PIFC_OFFSET[i, j] + int(x) * int(grid_dimension) + int(y)
+                if POOL[index]:
+                    continue
+                POOL[index] = True
+            else:
+                key = (np.int64(i), np.int64(j), x, y)
+                if key in PIFC_FINE:
+                    continue
+                PIFC_FINE.add(key)
+
+        frontier[n_kept, 0], frontier[n_kept, 1], frontier[n_kept, 2], frontier[n_kept, 3] = i, j, x, y
+        n_kept += 1
+
+    return POOL, n_pool, n_kept
+
+
+@jit(nopython=True)
+def _ignite(RATE, WIND_DIR, segment, AFC, AFC_SEGMENT, AFC_INDEX, n_afc, POOL, n_pool, PIFC_OFFSET, PIFC_FINE,
+            frontier, n_frontier, i, j):
+    """
+    Seeds a fire at the center of burnable cell (i, j), as farsite.ignite does, unless the center already had fire
+    :return: the (possibly grown) AFC, AFC_SEGMENT, POOL and frontier, and the number of entries of each in use
+    """
+    if AFC_INDEX[i, j] < 0:
+        AFC, AFC_SEGMENT, n_afc = _afc_admit(AFC, AFC_SEGMENT, AFC_INDEX, n_afc, RATE, WIND_DIR, segment, i, j)
+    else:
+        _afc_refresh(AFC, AFC_SEGMENT, AFC_INDEX, RATE, WIND_DIR, segment, PIFC_OFFSET, PIFC_FINE, i, j)
+
+    grid_dimension = AFC[AFC_INDEX[i, j], AFC_GRID]
+    center = np.floor(grid_dimension / 2)
+    if grid_dimension <= BITMAP_DIMENSION:
+        if PIFC_OFFSET[i, j] < 0:
+            POOL, n_pool = _pifc_allocate(POOL, n_pool, PIFC_OFFSET, i, j, int(grid_dimension))
+        index = PIFC_OFFSET[i, j] + int(center) * int(grid_dimension) + int(center)
+        if POOL[index]:
+            return AFC, AFC_SEGMENT, n_afc, POOL, n_pool, frontier, n_frontier
+        POOL[index] = True
+    else:
+        key = (np.int64(i), np.int64(j), center, center)
+        if key in PIFC_FINE:
+            return AFC, AFC_SEGMENT, n_afc, POOL, n_pool, frontier, n_frontier
+        PIFC_FINE.add(key)
+
+    if n_frontier == frontier.shape[0]:
+        frontier = _grow(frontier, n_frontier)
+    frontier[n_frontier, 0], frontier[n_frontier, 1], frontier[n_frontier, 2], frontier[n_frontier, 3] = \
+        i, j, center, center
+    return AFC, AFC_SEGMENT, n_afc, POOL, n_pool, frontier, n_frontier + 1
+
+
+@jit(nopython=True)
+def _propagate(FUEL, NB, I_STARTS, J_STARTS, STARTS, RATES, WIND_DIRS, CHANGES, REACH, mins, PROGRESS, ARRIVAL,
+               ESCAPED):
+    """
+    Compiled body of propagate, see there. The weather of segment k holds from minute CHANGES[k],
+    ignition k is lit at minute STARTS[k], in order, and REACH is the raster of cell_reach
+    """
+    rows, cols = FUEL.shape[0], FUEL.shape[1]
+    segment = 0
+    RATE, WIND_DIR = RATES[0], WIND_DIRS[0]
+
+    # (A.F.C. - Active Fire Cache) rows of AFC_SIZE, AFC_INDEX maps each cell to its row,
+    # AFC_SEGMENT holds the weather segment each row was computed under
+    AFC_INDEX = np.full((rows, cols), -1, dtype=np.int64)
+    AFC, AFC_SEGMENT, n_afc = np.empty((64, AFC_SIZE)), np.empty(64, dtype=np.int64), 0
+
+    # (P.I.F.C. - Past Intracellular Fire Cache) per-cell bitmaps in POOL, PIFC_OFFSET maps each cell to its bitmap
+    PIFC_OFFSET = np.full((rows, cols), -1, dtype=np.int64)
+    POOL, n_pool = np.zeros(2 ** 16, dtype=np.bool_), 0
+
+    # intracellular coordinates are kept as floats, as in farsite.spread, since the grid dimension of
+    # a cell with a negligible spread rate can exceed any integer type
+    PIFC_FINE = {(np.int64(0), np.int64(0), 0., 0.)}
+    PIFC_FINE.clear()
+
+    # Fires which will be iterated on this iteration, one (i, j, x, y) row each, seeded by the ignitions
+    frontier = np.empty((64, 4))
+    n_frontier = 0
+    new_frontier = np.empty((64, 4))
+    n_ignited = 0
+
+    # Final output: the minute fire first reached each cell, -1 where it never did
+    ARRIVAL[:, :] = -1
+    n_fires = 0
+
+    # last minute each cell received a new fire, used for pruning the PIFC. The cells in PIFC_CELLS, flagged in
+    # KEPT, are those which may still have a PIFC
+    stamp = np.full((rows, cols), -1, dtype=np.int64)
+    KEPT = np.zeros((rows, cols), dtype=np.bool_)
+    PIFC_CELLS, n_kept = np.empty((64, 2), dtype=np.int64), 0
+
+    # cells closed for good, their fire points retired, and the burned cells not closed yet, see _close
+    CLOSED = np.zeros((rows, cols), dtype=np.bool_)
+    BURNING, n_burning = np.empty((64, 2), dtype=np.int64), 0
+    DISTANCE, queue = np.empty((rows, cols), dtype=np.int64), np.empty((64, 2), dtype=np.int64)
+
+    for t in range(mins):
+
+        # stop where we are if the burn was cancelled, propagate raises
+        if PROGRESS[PROGRESS_CANCEL]:
+            return
+
+        # switch to the next weather at its change point
+        if segment + 1 < CHANGES.shape[0] and CHANGES[segment + 1] == t:
+            segment += 1
+            RATE, WIND_DIR = RATES[segment], WIND_DIRS[segment]
+            POOL, n_pool, n_frontier = _change_weather(RATE, WIND_DIR, segment, AFC, AFC_SEGMENT, AFC_INDEX, POOL,
+                                                       n_pool, PIFC_OFFSET, PIFC_FINE, frontier, n_frontier)
+
+        # light the ignitions starting this minute, into the same frontier, so merging fires share their points
+        while n_ignited < STARTS.shape[0] and STARTS[n_ignited] == t:
+            i, j = I_STARTS[n_ignited], J_STARTS[n_ignited]
+            n_ignited += 1
+            if not _burnable(FUEL, NB, i, j):
+                continue
+            AFC, AFC_SEGMENT, n_afc, POOL, n_pool, frontier, n_frontier = \
+                _ignite(RATE, WIND_DIR, segment, AFC, AFC_SEGMENT, AFC_INDEX, n_afc, POOL, n_pool, PIFC_OFFSET,
+                        PIFC_FINE, frontier, n_frontier, i, j)
+            PIFC_CELLS, n_kept = _touch(stamp, KEPT, PIFC_CELLS, n_kept, i, j, t)
+            if ARRIVAL[i, j] < 0:
+                ARRIVAL[i, j] = t
+                n_fires += 1
+                if n_burning == BURNING.shape[0]:
+                    BURNING = _grow(BURNING, n_burning)
+                BURNING[n_burning, 0], BURNING[n_burning, 1] = i, j
+                n_burning += 1
+
+        # quit if there are no fires to update, nor any still to be lit
+        if n_frontier == 0 and n_ignited == STARTS.shape[0]:
+            break
+
+        # retire the points of cells fire has closed in on, so the frontier follows the perimeter, not the area
+        if t % CLOSE_EVERY == 0:
+            n_burning, queue = _close(FUEL, NB, ARRIVAL, REACH, CLOSED, ESCAPED, mins - t, BURNING, n_burning,
+                                      DISTANCE, queue)
+        n_open = 0
+        for k in range(n_frontier):
+            i, j = int(frontier[k, 0]), int(frontier[k, 1])
+            if not CLOSED[i, j]:
+                frontier[n_open] = frontier[k]
+                n_open += 1
+        n_frontier = n_open
+
+        n_new = 0
+        for k in range(n_frontier):
+            i, j, x, y = int(frontier[k, 0]), int(frontier[k, 1]), frontier[k, 2], frontier[k, 3]
+            row = AFC_INDEX[i, j]
+            steps = AFC[row, AFC_GRID] - 1
+
+            # one child downwind, and one to each side orthogonal to the wind
+            for child in range(3):
+                new_x = x + AFC[row, AFC_X_INC + 2 * child]
+                new_y = y + AFC[row, AFC_Y_INC + 2 * child]
+
+                di, new_y = _divmod(new_y, steps)
+                dj, new_x = _divmod(new_x, steps)
+                new_i, new_j = i + di, j + dj
+
+                if new_i < 0 or new_i >= rows or new_j < 0 or new_j >= cols:
+                    ESCAPED[ESCAPED_FIRST_ROW] |= new_i < 0
+                    ESCAPED[ESCAPED_LAST_ROW] |= new_i >= rows
+                    ESCAPED[ESCAPED_FIRST_COL] |= new_j < 0
+                    ESCAPED[ESCAPED_LAST_COL] |= new_j >= cols
+                    continue
+                if not _burnable(FUEL, NB, new_i, new_j) or CLOSED[new_i, new_j]:
+                    continue
+
+                # regrid fires which switch cells to the resolution of their new cell
+                new_row = row
+                if new_i != i or new_j != j:
+                    if AFC_INDEX[new_i, new_j] < 0:
+                        AFC, AFC_SEGMENT, n_afc = _afc_admit(AFC, AFC_SEGMENT, AFC_INDEX, n_afc, RATE, WIND_DIR,
+                                                             segment, new_i, new_j)
+                    else:
+                        _afc_refresh(AFC, AFC_SEGMENT, AFC_INDEX, RATE, WIND_DIR, segment, PIFC_OFFSET, PIFC_FINE,
+                                     new_i, new_j)
+                    new_row = AFC_INDEX[new_i, new_j]
+                    new_x = np.floor((new_x / steps) * AFC[new_row, AFC_GRID])
+                    new_y = np.floor((new_y / steps) * AFC[new_row, AFC_GRID])
+
+                # skip points which have already had fire, update PIFC otherwise
+                grid_dimension = AFC[new_row, AFC_GRID]
+                if grid_dimension <= BITMAP_DIMENSION:
+                    if PIFC_OFFSET[new_i, new_j] < 0:
+                        POOL, n_pool = _pifc_allocate(POOL, n_pool, PIFC_OFFSET, new_i, new_j, int(grid_dimension))
+                    index = PIFC_OFFSET[new_i, new_j] + int(new_x) * int(grid_dimension) + int(new_y)
+                    if POOL[index]:
+                        continue
+                    POOL[index] = True
+                else:
+                    key = (np.int64(new_i), np.int64(new_j), new_x, new_y)
+                    if key in PIFC_FINE:
+                        continue
+                    PIFC_FINE.add(key)
+
+                # Update frontier
+                if n_new == new_frontier.shape[0]:
+                    new_frontier = _grow(new_frontier, n_new)
+                new_frontier[n_new, 0], new_frontier[n_new, 1] = new_i, new_j
+                new_frontier[n_new, 2], new_frontier[n_new, 3] = new_x, new_y
+                n_new += 1
+
+                PIFC_CELLS, n_kept = _touch(stamp, KEPT, PIFC_CELLS, n_kept, new_i, new_j, t)
+                if ARRIVAL[new_i, new_j] < 0:
+                    ARRIVAL[new_i, new_j] = t + 1
+                    n_fires += 1
+                    if n_burning == BURNING.shape[0]:
+                        BURNING = _grow(BURNING, n_burning)
+                    BURNING[n_burning, 0], BURNING[n_burning, 1] = new_i, new_j
+                    n_burning += 1
+
+        # prune the PIFC of closed cells and of cells untouched for PIFC_RETAIN minutes
+        n_live, live, prune_fine = 0, 0, False
+        for k in range(n_kept):
+            i, j = PIFC_CELLS[k, 0], PIFC_CELLS[k, 1]
+            if CLOSED[i, j] or stamp[i, j] < t - PIFC_RETAIN:
+                KEPT[i, j] = False
+                PIFC_OFFSET[i, j] = -1
+                prune_fine |= AFC[AFC_INDEX[i, j], AFC_GRID] > BITMAP_DIMENSION
+                continue
+            PIFC_CELLS[n_live, 0], PIFC_CELLS[n_live, 1] = i, j
+            n_live += 1
+            if PIFC_OFFSET[i, j] >= 0:
+                live += int(AFC[AFC_INDEX[i, j], AFC_GRID]) ** 2
+        n_kept = n_live
+
+        # the pool is compacted once it is mostly space pruned bitmaps held, so it stays within twice the PIFC
+        if n_pool - live > max(live, 2 ** 16):
+            pruned, n_pruned = np.zeros(max(2 * live, 2 ** 16), dtype=np.bool_), 0
+            for k in range(n_kept):
+                i, j = PIFC_CELLS[k, 0], PIFC_CELLS[k, 1]
+                if PIFC_OFFSET[i, j] < 0:
+                    continue
+                size = int(AFC[AFC_INDEX[i, j], AFC_GRID]) ** 2
+                pruned[n_pruned:n_pruned + size] = POOL[PIFC_OFFSET[i, j]:PIFC_OFFSET[i, j] + size]
+                PIFC_OFFSET[i, j] = n_pruned
+                n_pruned += size
+            POOL, n_pool = pruned, n_pruned
+
+        if prune_fine:
+            pruned_fine = set()
+            for key in PIFC_FINE:
+                if KEPT[key[0], key[1]]:
+                    pruned_fine.add(key)
+            PIFC_FINE = pruned_fine
+
+        frontier, new_frontier = new_frontier, frontier
+        n_frontier = n_new
+        PROGRESS[PROGRESS_MINUTE], PROGRESS[PROGRESS_FRONTIER], PROGRESS[PROGRESS_BURNED] = t + 1, n_new, n_fires
+
+    # ignitions lit as the burn ends have had no time to spread
+    while n_ignited < STARTS.shape[0] and STARTS[n_ignited] <= mins:
+        i, j = I_STARTS[n_ignited], J_STARTS[n_ignited]
+        n_ignited += 1
+        if _burnable(FUEL, NB, i, j) and ARRIVAL[i, j] < 0:
+            ARRIVAL[i, j] = STARTS[n_ignited - 1]
+            n_fires += 1
+    PROGRESS[PROGRESS_BURNED] = n_fires
+
+
+def weather_segments(INPUT, wind_speed, wind_dir, TAN_PHI, timeline=None, moisture=1., FUEL=None, table=None):
+    """
+    Orders the weather of a burn into the segments the engines switch between, and computes the spread rate of
+    every cell under each in one compiled call, so the engines only look rates up
+    :param INPUT: the input array
+    :param wind_speed: wind speed (ft/min) at ignition, a scalar or a (rows, cols) raster
+    :param wind_dir: wind direction (radians) at ignition, a scalar or a (rows, cols) raster
+    :param TAN_PHI: (rows, cols) slope in the direction of the wind at ignition, used in place of dim 5 of INPUT
+    :param timeline: (minute, wind_speed, wind_dir, TAN_PHI) changes of weather, in any order, each holding from
+                     its minute on. Changes at or before minute 0 replace the weather at ignition, and of several
+                     changes at one minute the last one holds
+    :param moisture: factor on the fuel moisture of every cell (dim 4 of INPUT), held below MOISTURE_CEILING of
+                     the extinction moisture
+    :param FUEL: fuel array, needed with table
+    :param table: (FUEL_INDEX, CONSTANTS) fuel constants table of rothermel.build_fuel_constants, so rates come from
+                  compute_surface_spread_fuel_grid and only the moisture of INPUT is read; the full equations of
+                  compute_surface_spread_grid on dims 0 to 3 of INPUT if None
+    :return: list of (minute, RATE, WIND_DIR) read-only rasters, the first at minute 0, RATE being the float64
+             spread rate (ft/min) of every cell and WIND_DIR as in as_raster
+    """
+    segments = {0: (wind_speed, wind_dir, TAN_PHI)}
+    for minute, *weather in sorted(timeline or [], key=lambda change: change[0]):
+        segments[max(int(minute), 0)] = weather
+
+    # one double precision copy of the landscape, rewetted once, takes the slope of each segment in turn
+    SEGMENT = np.array(INPUT, dtype=np.float64)
+    if moisture != 1.:
+        SEGMENT[..., 4] = np.minimum(SEGMENT[..., 4] * moisture, MOISTURE_CEILING * SEGMENT[..., 3])
+    rasters = []
+    for minute in sorted(segments):
+        WIND_SPEED, WIND_DIR, SLOPE = (as_raster(weather) for weather in segments[minute])
+        SEGMENT[..., 5] = SLOPE
+        # in double precision, the slowest fuels spreading on grids finer than float32 resolves
+        if table is None:
+            RATE = compute_surface_spread_grid(SEGMENT, WIND_SPEED, dtype=np.float64)
+        else:
+            RATE = compute_surface_spread_fuel_grid(FUEL, SEGMENT, WIND_SPEED, *table, dtype=np.float64)
+        RATE.flags.writeable = False
+        rasters.append((minute, RATE, WIND_DIR))
+    return rasters
+
+
+def ignition_schedule(i_start, j_start, starts=None):
+    """
+    Orders the ignitions of a burn into the sequence the engines light them in
+    :param i_start: row of the ignition cell, or (n,) rows of several
+    :param j_start: column of the ignition cell, or (n,) columns
+    :param starts: (n,) minutes each ignition is lit at, all at minute 0 if None
+    :return: (n,) int64 arrays of the rows, columns and start minutes, by start minute
+    """
+    I_STARTS, J_STARTS = np.atleast_1d(i_start).astype(np.int64), np.atleast_1d(j_start).astype(np.int64)
+    STARTS = np.zeros(len(I_STARTS), dtype=np.int64) if starts is None else np.atleast_1d(starts).astype(np.int64)
+    if not (I_STARTS.shape == J_STARTS.shape == STARTS.shape) or I_STARTS.ndim != 1:
+        raise ValueError(f"Ignitions need as many rows, columns and start minutes, got {I_STARTS.shape}, "
+                         f"{J_STARTS.shape} and {STARTS.shape}")
+    if np.any(STARTS < 0):
+        raise ValueError("Ignitions cannot start before minute 0")
+    order = np.argsort(STARTS, kind="stable")
+    return I_STARTS[order], J_STARTS[order], STARTS[order]
+
+
+def arrival_raster(shape, mins):
+    """
+    Allocates a raster for the engines to record arrival minutes in
+    :param shape: (rows, cols) of the landscape
+    :param mins: number of one minute iterations to be burned
+    :return: int16 raster, or int32 if mins does not fit in int16
+    """
+    return np.empty(shape, dtype=np.int16 if mins <= np.iinfo(np.int16).max else np.int32)
+
+
+def cell_reach(FUEL, segments):
+    """
+    :param FUEL: fuel array
+    :param segments: weather segments of a burn, see weather_segments
+    :return: (rows, cols) int64 raster of the cells a child of a fire point moves at most in a minute from each
+             burnable cell, under any weather of the burn
+    """
+    RATES, WIND_DIRS = List(), List()
+    for _, RATE, WIND_DIR in segments:
+        RATES.append(RATE)
+        WIND_DIRS.append(WIND_DIR)
+    return _cell_reach(np.asarray(FUEL), NON_BURNABLE, RATES, WIND_DIRS)
+
+
+def close_cells(FUEL, ARRIVAL, REACH, CLOSED, ESCAPED, horizon, cells, DISTANCE):
+    """
+    Closes the burned cells fire can spread nowhere new from within the horizon, whose fire points the engines
+    retire without changing the burn, see _close
+    :param FUEL: fuel array
+    :param ARRIVAL: arrival raster, see propagate, holding every arrival up to the current minute
+    :param REACH: raster of cell_reach
+    :param CLOSED: bool raster of closed cells, updated in place
+    :param ESCAPED: escape array, see propagate
+    :param horizon: minutes left to burn
+    :param cells: list of the (i, j) of every burned cell not closed yet, updated in place to those left open
+    :param DISTANCE: (rows, cols) int64 raster, kept by the caller across sweeps
+    """
+    CELLS = np.array(cells, dtype=np.int64).reshape(-1, 2)
+    n_open, _ = _close(np.asarray(FUEL), NON_BURNABLE, ARRIVAL, REACH, CLOSED, ESCAPED, int(horizon), CELLS,
+                       len(CELLS), DISTANCE, np.empty((len(CELLS), 2), dtype=np.int64))
+    cells[:] = [(i, j) for i, j in CELLS[:n_open].tolist()]
+
+
+def propagate(INPUT, FUEL, i_start, j_start, wind_speed, wind_dir, mins, TAN_PHI=None, PROGRESS=None, timeline=None,
+              ARRIVAL=None, moisture=1., starts=None, ESCAPED=None, table=None):
+    """
+    Runs the whole minute loop of farsite.spread in compiled code
+    :param INPUT: the input array
+    :param FUEL: fuel array
+    :param i_start: row of the ignition cell, or (n,) rows of several ignitions burning as one fire
+    :param j_start: column of the ignition cell, or (n,) columns
+    :param wind_speed: wind speed (ft/min), a scalar or a (rows, cols) raster
+    :param wind_dir: wind direction (radians), a scalar or a (rows, cols) raster
+    :param mins: number of one minute iterations to burn for
+    :param TAN_PHI: (rows, cols) slope in the direction of the wind (see farsite.pre_burn), dim 5 of INPUT if None
+    :param PROGRESS: int64 array of PROGRESS_SIZE, updated every minute (e.g. in shared memory, for polling);
+                     setting its PROGRESS_CANCEL entry stops the burn, raising BurnCancelled
+    :param timeline: later changes of weather, see weather_segments
+    :param ARRIVAL: (rows, cols) int16 or int32 raster, overwritten with the minute fire first reached each cell
+                    (an ignition's start minute in its cell, -1 where it never did); one from arrival_raster
+                    is used if None.
+                    The cells burned after any t minutes follow from one run as (ARRIVAL >= 0) & (ARRIVAL <= t)
+    :param moisture: factor on the fuel moisture of every cell (dim 4 of INPUT), see weather_segments
+    :param starts: (n,) minutes each ignition is lit at, see ignition_schedule; every ignition is lit into the
+                   same frontier, so fires merging from several run as cheaply as one. Ignitions in unburnable
+                   fuel, or starting after mins, are never lit
+    :param ESCAPED: bool array of ESCAPED_SIZE, set where fire crossed a side of the arrays (see ESCAPED_FIRST_ROW);
+                    fires stop at the sides, as at the edges of the landscape
+    :param table: fuel constants table to take spread rates from, see weather_segments
+    :return: (rows, cols) boolean array of cells which have had fire at any point
+    """
+    INPUT = np.asarray(INPUT)
+    TAN_PHI = INPUT[..., 5] if TAN_PHI is None else TAN_PHI
+    PROGRESS = np.zeros(PROGRESS_SIZE, dtype=np.int64) if PROGRESS is None else PROGRESS
+
+    FUEL = np.asarray(FUEL)
+    segments = weather_segments(INPUT, wind_speed, wind_dir, TAN_PHI, timeline, moisture, FUEL, table)
+    RATES, WIND_DIRS = List(), List()
+    for _, RATE, WIND_DIR in segments:
+        RATES.append(RATE)
+        WIND_DIRS.append(WIND_DIR)
+    CHANGES = np.array([minute for minute, *_ in segments], dtype=np.int64)
+
+    ARRIVAL = arrival_raster(FUEL.shape, mins) if ARRIVAL is None else ARRIVAL
+    ESCAPED = np.zeros(ESCAPED_SIZE, dtype=np.bool_) if ESCAPED is None else ESCAPED
+    I_STARTS, J_STARTS, STARTS = ignition_schedule(i_start, j_start, starts)
+    REACH = _cell_reach(FUEL, NON_BURNABLE, RATES, WIND_DIRS)
+    _propagate(FUEL, NON_BURNABLE, I_STARTS, J_STARTS, STARTS, RATES, WIND_DIRS, CHANGES, REACH, int(mins), PROGRESS,
+               ARRIVAL, ESCAPED)
+    if PROGRESS[PROGRESS_CANCEL]:
+        raise BurnCancelled(f"Burn cancelled after {PROGRESS[PROGRESS_MINUTE]} minutes")
+    return ARRIVAL >= 0
+
+
+def warm_up(INPUT, FUEL):
+    """
+    Compiles propagate ahead of time for arrays of the types of INPUT and FUEL, taking spread rates from a fuel
+    constants table as farsite.burn does, so the first real burn doesn't pay for it. Read-only arrays
+    (memory-mapped landscapes) compile separately, so both kinds are warmed
+    :param INPUT: an input array, or anything with its dtype
+    :param FUEL: a fuel array, or anything with its dtype
+    """
+    # a 3x3 patch of grass, burned for a single minute
+    TINY_INPUT = np.zeros((3, 3, 6), dtype=INPUT.dtype)
+    TINY_INPUT[...] = [1., 2000., .1, .15, .14, 0.]
+    TINY_FUEL = np.full((3, 3), 102, dtype=FUEL.dtype)
+    FUEL_INDEX = np.full(103, -1, dtype=np.int64)
+    FUEL_INDEX[102] = 0
+    table = FUEL_INDEX, fuel_constants(1., 2000., .1, .15)[None, :]
+    for array in table:
+        # as farsite.cached_fuel_constants shares it
+        array.flags.writeable = False
+
+    # slopes and winds are always made read-only rasters, see as_raster
+    for readonly in (False, True):
+        tiny_input, tiny_fuel = TINY_INPUT.copy(), TINY_FUEL.copy()
+        tiny_input.flags.writeable = tiny_fuel.flags.writeable = not readonly
+        propagate(tiny_input, tiny_fuel, 1, 1, 0., 0., 1, TAN_PHI=np.zeros((3, 3)), table=table)
@@ -8,7 +8,8 @@
 #####
 
 import numpy as np
-from numba import jit
+import pandas as pd
+from numba import jit, prange
 
 ################################################
 ############ Rothermel Surface Spread EQs
@@ -239,3 +240,203 @@ def compute_surface_spread(inputs, wind_speed):
     R = eq_52(IR, xi, rho_b, epsilon, Q_ig, Phi_w, Phi_s)  # Rate of Fire Spread in Wind Dir (ft/min)
 
     return R
+
+
+
+################################################
+############ Grid-wide Surface Spread
+################################################
+
+
+@jit(nopython=True, fastmath=True)
+def _burnable(inputs):
+    """
+    :param inputs: input array, as in compute_surface_spread
+    :return: True if the cell carries fuel the Rothermel equations are defined for
+    """
+    return inputs[0] > 0 and inputs[1] > 0 and inputs[2] > 0 and inputs[3] > 0
+
+
+@jit(nopython=True, parallel=True, fastmath=True)
+def _surface_spread_grid(INPUT, wind_speed, R):
+    """
+    :param INPUT: (rows, cols, 6) input cube
+    :param wind_speed: (rows, cols) wind speed (ft/min)
+    :param R: (rows, cols) zeroed raster, filled with the spread rate (ft/min), left zero where nothing burns
+    :return: R
+    """
+    for i in prange(INPUT.shape[0]):
+        for j in range(INPUT.shape[1]):
+            if _burnable(INPUT[i, j]):
+                R[i, j] = compute_surface_spread(INPUT[i, j], wind_speed[i, j])
+    return R
+
+
+@jit(nopython=True, parallel=True, fastmath=True)
+def _surface_spread_cells(INPUT, wind_speed, rows, cols, R):
+    """
+    :param INPUT: (rows, cols, 6) input cube
+    :param wind_speed: (rows, cols) wind speed (ft/min)
+    :param rows: row index of each requested cell
+    :param cols: column index of each requested cell
+    :param R: (n,) zeroed array, filled with the spread rates (ft/min), left zero where nothing burns
+    :return: R
+    """
+    for k in prange(rows.shape[0]):
+        i, j = rows[k], cols[k]
+        if _burnable(INPUT[i, j]):
+            R[k] = compute_surface_spread(INPUT[i, j], wind_speed[i, j])
+    return R
+
+
+def compute_surface_spread_grid(INPUT, wind_speed, cells=None, dtype=np.float32):
+    """
+    Batched compute_surface_spread over a whole INPUT cube, in one compiled call
+    :param INPUT: (rows, cols, 6) input cube, each cell laid out as in compute_surface_spread
+    :param wind_speed: wind speed (ft/min), either a scalar or a (rows, cols) field
+    :param cells: optional subset of cells to evaluate, either a (rows, cols) boolean mask
+                  or an (n, 2) array of (row, col) indices
+    :param dtype: dtype of the rates, float64 keeping the rates of the slowest fuels which float32 rounds to 0
+    :return: spread rates (ft/min); a (rows, cols) raster unless cells is an index list,
+             in which case an (n,) array. Non-burnable cells get 0, unselected mask cells get NaN.
+    """
+    wind_speed = np.broadcast_to(np.asarray(wind_speed, dtype=np.float64), INPUT.shape[:2])
+
+    if cells is None:
+        return _surface_spread_grid(INPUT, wind_speed, np.zeros(INPUT.shape[:2], dtype=dtype))
+
+    cells = np.asarray(cells)
+    if cells.dtype == bool:
+        rows, cols = np.nonzero(cells)
+        R = np.full(INPUT.shape[:2], np.nan, dtype=dtype)
+        R[rows, cols] = _surface_spread_cells(INPUT, wind_speed, rows, cols, np.zeros(len(rows), dtype=dtype))
+        return R
+
+    cells = cells.reshape(-1, 2).astype(np.int64)
+    return _surface_spread_cells(INPUT, wind_speed, cells[:, 0], cells[:, 1], np.zeros(len(cells), dtype=dtype))
+
+
+
+################################################
+############ Per-Fuel-Model Constants
+################################################
+
+# Columns of the fuel constants table built by build_fuel_constants. Every term of compute_surface_spread
+# which depends on the fuel model alone (sigma, w_0, delta, Mx) is folded into one of these, so that
+#
+#     R = REACTION * eta_M * (1 + WIND * U^B + SLOPE * tan_phi^2) / Q_ig
+#
+FC_MX, FC_B, FC_WIND, FC_SLOPE, FC_REACTION = range(5)
+N_FUEL_CONSTANTS = 5
+
+
+def fuel_constants(delta, sigma, w_0, Mx):
+    """
+    Evaluates the fuel-model-only terms of compute_surface_spread
+    :param delta: Fuel bed depth (ft)
+    :param sigma: Surface-area-to-volume ratio (ft2/ft3)
+    :param w_0: Oven-dry fuel load (lb/ft2)
+    :param Mx: Extinction Moisture (portion of 1)
+    :return: one row of the fuel constants table, laid out as FC_MX ... FC_REACTION
+    """
+    row = np.zeros(N_FUEL_CONSTANTS)
+    row[FC_MX] = Mx
+
+    # non-burnable fuel models keep a zero row, and spread at zero
+    if delta <= 0 or sigma <= 0 or w_0 <= 0 or Mx <= 0:
+        return row
+
+    C, B, E = eq_48(sigma), eq_49(sigma), eq_50(sigma)
+    epsilon = eq_14(sigma)
+    eta_s = eq_30()
+    w_n = eq_24(w_0)
+    A = eq_A(sigma)
+    beta_op = eq_37(sigma)
+    rho_b = eq_40(w_0, delta)
+    beta = eq_31(rho_b)
+    xi = eq_42(sigma, beta)
+    Gamma_prime = eq_38(eq_36(sigma), beta, beta_op, A)
+
+    row[FC_B] = B
+    row[FC_WIND] = eq_47(C, 1., 0., beta, beta_op, E)  # Phi_w / U^B
+    row[FC_SLOPE] = eq_51(beta, 1.)  # Phi_s / tan_phi^2
+    row[FC_REACTION] = eq_27(Gamma_prime, w_n, 1., eta_s) * xi / (rho_b * epsilon)  # IR * xi / (rho_b * epsilon * eta_M)
+    return row
+
+
+def build_fuel_constants(path_fueldict):
+    """
+    Builds the compiled lookup table of per-fuel-model Rothermel constants from FUEL_DIC.csv
+    :param path_fueldict: path to the file FUEL_DIC.csv, containing translation info for fuel types
+    :return: FUEL_INDEX, an int array mapping FBFM40 codes (the values of FUEL) to table rows, -1 if unknown,
+             and CONSTANTS, an (n_models, N_FUEL_CONSTANTS) float array
+    """
+    # NoData (-9999) stays out of the table, and so does not spread
+    fuels = pd.read_csv(path_fueldict, header='infer')
+    fuels = fuels[fuels['VALUE'] >= 0]
+    codes = fuels['VALUE'].to_numpy(dtype=np.int64)
+
+    FUEL_INDEX = np.full(codes.max() + 1, -1, dtype=np.int64)
+    FUEL_INDEX[codes] = np.arange(len(codes))
+
+    # (dim 2): ton/acre -> lb/ft^2, as in create_pickle.prepare_data
+    CONSTANTS = np.array([fuel_constants(delta, sigma, w_0 * .0459137, Mx / 100)
+                          for delta, sigma, w_0, Mx in zip(fuels['FuelBedDepth'], fuels['SAV'],
+                                                           fuels['OvenDryLoad'], fuels['Mx'])])
+    return FUEL_INDEX, CONSTANTS
+
+
+@jit(nopython=True, fastmath=True)
+def compute_surface_spread_constants(constants, Mf, wind_speed, tan_phi):
+    """
+    Same as compute_surface_spread, with the fuel model terms taken from the fuel constants table
+    :param constants: one row of the fuel constants table
+    :param Mf: Fuel Moisture (portion of 1)
+    :param wind_speed: wind speed (ft/min)
+    :param tan_phi: Slope steepness, maximum (fraction) Vertical rise / horizontal distance
+    :return: R, fire spreadrate (ft/min)
+    """
+    if constants[FC_REACTION] == 0:
+        return 0.
+
+    eta_M = eq_29(eq_r_M(Mf, constants[FC_MX]))  # Moisture Damping Constant
+    Phi_w = constants[FC_WIND] * wind_speed ** constants[FC_B]  # coefficient for midflame wind speed
+    Phi_s = constants[FC_SLOPE] * tan_phi ** 2  # Slope Steepness
+    return constants[FC_REACTION] * eta_M * (1 + Phi_w + Phi_s) / eq_12(Mf)
+
+
+@jit(nopython=True, parallel=True, fastmath=True)
+def _surface_spread_fuel_grid(FUEL, INPUT, wind_speed, FUEL_INDEX, CONSTANTS, R):
+    """
+    :param FUEL: (rows, cols) FBFM40 codes
+    :param INPUT: (rows, cols, 6) input cube
+    :param wind_speed: (rows, cols) wind speed (ft/min)
+    :param FUEL_INDEX: code -> table row map
+    :param CONSTANTS: fuel constants table
+    :param R: (rows, cols) zeroed raster, filled with the spread rate (ft/min), left zero for unknown or
+              non-burnable fuels
+    :return: R
+    """
+    for i in prange(FUEL.shape[0]):
+        for j in range(FUEL.shape[1]):
+            code = int(FUEL[i, j])
+            if 0 <= code < FUEL_INDEX.shape[0] and FUEL_INDEX[code] >= 0:
+                R[i, j] = compute_surface_spread_constants(CONSTANTS[FUEL_INDEX[code]], INPUT[i, j, 4],
+                                                           wind_speed[i, j], INPUT[i, j, 5])
+    return R
+
+
+def compute_surface_spread_fuel_grid(FUEL, INPUT, wind_speed, FUEL_INDEX, CONSTANTS, dtype=np.float32):
+    """
+    Grid-wide spread rate from the fuel constants table, with moisture and slope read from INPUT
+    :param FUEL: (rows, cols) FBFM40 codes
+    :param INPUT: (rows, cols, 6) input cube, only dims 4 (Mf) and 5 (tan_phi) are used
+    :param wind_speed: wind speed (ft/min), either a scalar or a (rows, cols) field
+    :param FUEL_INDEX: code -> table row map from build_fuel_constants
+    :param CONSTANTS: fuel constants table from build_fuel_constants
+    :param dtype: dtype of the rates, see compute_surface_spread_grid
+    :return: (rows, cols) spread rate raster (ft/min), zero for unknown or non-burnable fuels
+    """
+    wind_speed = np.broadcast_to(np.asarray(wind_speed, dtype=np.float64), FUEL.shape)
+    return _surface_spread_fuel_grid(FUEL, INPUT, wind_speed, FUEL_INDEX, CONSTANTS,
+                                     np.zeros(FUEL.shape, dtype=dtype))
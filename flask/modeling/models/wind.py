@@ -0,0 +1,71 @@
+####################################
+####################################
+####################################
+##### Gridded Wind Field
+#####
+##### Interpolates the winds observed at a handful of stations onto the landscape grid, by inverse distance
+##### weighting of their u/v components, so each cell spreads with its own wind speed and direction.
+#####
+
+import numpy as np
+from numba import jit, prange
+
+
+@jit(nopython=True, parallel=True, fastmath=True)
+def _idw(DX2, DY2, U, V, power):
+    """
+    :param DX2: (rows, n) squared distances along the first axis from each row of the grid to each station
+    :param DY2: (cols, n) squared distances along the second axis from each column of the grid to each station
+    :param U: (n,) station wind components along the first axis of the wind's angle
+    :param V: (n,) station wind components along the second axis
+    :param power: inverse distance weighting power
+    :return: (rows, cols) float32 rasters of the interpolated wind speed and direction (degrees, [0, 360))
+    """
+    rows, cols, n = DX2.shape[0], DY2.shape[0], DX2.shape[1]
+    SPEED = np.empty((rows, cols), dtype=np.float32)
+    DIR = np.empty((rows, cols), dtype=np.float32)
+    for i in prange(rows):
+        for j in range(cols):
+            weights, u, v = 0., 0., 0.
+            for s in range(n):
+                # a cell on top of a station gets a weight so large it takes the station's wind
+                d2 = max(DX2[i, s] + DY2[j, s], 1e-20)
+                weight = 1 / d2 if power == 2 else d2 ** (-power / 2)
+                weights += weight
+                u += weight * U[s]
+                v += weight * V[s]
+
+            u, v = u / weights, v / weights
+            SPEED[i, j] = np.sqrt(u * u + v * v)
+            direction = np.degrees(np.arctan2(v, u))
+            DIR[i, j] = direction + 360 if direction < 0 else direction
+    return SPEED, DIR
+
+
+def wind_field(X, Y, lons, lats, speeds, dirs, power=2):
+    """
+    Interpolates station winds onto a grid by inverse distance weighting of their u/v components,
+    so opposing winds cancel rather than averaging to a crosswind
+    :param X: (rows,) longitudes of the grid, the first axis as in FUEL
+    :param Y: (cols,) latitudes of the grid
+    :param lons: (n,) station longitudes
+    :param lats: (n,) station latitudes
+    :param speeds: (n,) station wind speeds, in any unit
+    :param dirs: (n,) station wind directions (degrees)
+    :param power: inverse distance weighting power
+    :return: (rows, cols) float32 rasters of wind speed, in the unit of speeds, and direction (degrees, [0, 360))
+    """
+    lons, lats = np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+    speeds, dirs = np.asarray(speeds, dtype=np.float64), np.asarray(dirs, dtype=np.float64)
+    observed = ~(np.isnan(lons) | np.isnan(lats) | np.isnan(speeds) | np.isnan(dirs))
+    if not observed.any():
+        raise ValueError("No station reported a wind to interpolate")
+    lons, lats, speeds, dirs = lons[observed], lats[observed], speeds[observed], dirs[observed]
+
+    # distances in degrees of latitude, longitudes scaled to the grid's mean latitude
+    X, Y = np.asarray(X, dtype=np.float64), np.asarray(Y, dtype=np.float64)
+    DX2 = ((X[:, None] - lons[None, :]) * np.cos(np.radians(Y.mean()))) ** 2
+    DY2 = (Y[:, None] - lats[None, :]) ** 2
+
+    theta = np.radians(dirs)
+    return _idw(DX2, DY2, speeds * np.cos(theta), speeds * np.sin(theta), float(power))
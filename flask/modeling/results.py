@@ -0,0 +1,418 @@
+#################################################
+#################################################
+#################################################
+##### Simulation Results
+#####
+##### Serializations of the burned cells returned by burn(), for clients of the web API.
+##### burn(output="cells") returns BurnedCells, a few bytes per cell, which converts to every format here on demand:
+##### lon/lat points, bit-packed or run-length encoded rasters, a simplified perimeter, or isochrones.
+
+import struct
+
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+
+# header of the raster serializations: rows, cols, then the longitude and latitude of the first cell center and
+# the spacing of the grid along each axis
+RASTER_HEADER = struct.Struct("<IIdddd")
+
+# A snapshot is a shared buffer a burn keeps its arrival raster in while it runs, so other processes can read the
+# cells burned so far: a header of SNAPSHOT_HEADER int64, the window burned (first row, last row + 1, first column,
+# last column + 1) and the itemsize of the raster, all -1 while nothing is published, then the raster itself
+SNAPSHOT_HEADER = 5
+
+
+class BurnedCells:
+    """
+    Burned cells of a simulation, packed as sorted flat indices into the (rows, cols) landscape grid,
+    with the minute fire first reached each of them
+    """
+
+    def __init__(self, CELLS, X, Y, MINUTES=None):
+        """
+        :param CELLS: sorted flat indices of the burned cells, row-major as in FUEL
+        :param X: (rows,) longitudes of the grid
+        :param Y: (cols,) latitudes of the grid
+        :param MINUTES: minute fire first reached each cell of CELLS, None if unknown
+        """
+        self.CELLS, self.MINUTES = CELLS, MINUTES
+        self.X, self.Y = np.asarray(X), np.asarray(Y)
+
+    @classmethod
+    def from_mask(cls, FIRES, X, Y):
+        """
+        :param FIRES: (rows, cols) boolean array of burned cells, as returned by the engines
+        :param X: (rows,) longitudes of the grid
+        :param Y: (cols,) latitudes of the grid
+        :return: BurnedCells of the mask, indices held as uint32 whenever the grid allows
+        """
+        dtype = np.uint32 if FIRES.size < 2 ** 32 else np.uint64
+        return cls(np.flatnonzero(FIRES).astype(dtype), X, Y)
+
+    @classmethod
+    def from_arrival(cls, ARRIVAL, X, Y, origin=(0, 0)):
+        """
+        :param ARRIVAL: (rows, cols) raster of the minute fire first reached each cell, -1 where it never did,
+                        see propagation.propagate; or the raster of a window of the grid
+        :param X: (rows,) longitudes of the grid
+        :param Y: (cols,) latitudes of the grid
+        :param origin: (row, column) of the grid ARRIVAL starts at, when it covers a window of the grid
+        :return: BurnedCells of the raster, with its minutes
+        """
+        i, j = np.nonzero(ARRIVAL >= 0)
+        # row-major in the window is row-major in the grid too, so the cells stay sorted
+        dtype = np.uint32 if len(X) * len(Y) < 2 ** 32 else np.uint64
+        CELLS = np.ravel_multi_index((i + origin[0], j + origin[1]), (len(X), len(Y))).astype(dtype)
+        return cls(CELLS, X, Y, ARRIVAL[i, j])
+
+    @property
+    def shape(self):
+        return len(self.X), len(self.Y)
+
+    def __len__(self):
+        return len(self.CELLS)
+
+    def mask(self):
+        """
+        :return: (rows, cols) boolean array of burned cells
+        """
+        FIRES = np.zeros(self.shape, dtype=bool)
+        FIRES.ravel()[self.CELLS] = True
+        return FIRES
+
+    def arrival(self):
+        """
+        :return: (rows, cols) raster of the minute fire first reached each cell, -1 where it never did
+        """
+        ARRIVAL = np.full(self.shape, -1, dtype=self.MINUTES.dtype)
+        ARRIVAL.ravel()[self.CELLS] = self.MINUTES
+        return ARRIVAL
+
+    def by(self, minute):
+        """
+        :param minute: minutes since ignition
+        :return: BurnedCells of the cells burned after that many minutes, as a shorter burn would have returned
+        """
+        burned = self.MINUTES <= minute
+        return BurnedCells(self.CELLS[burned], self.X, self.Y, self.MINUTES[burned])
+
+    def latlon(self):
+        """
+        :return: DataFrame of burn()'s default output, one x (longitude), y (latitude) row per burned cell
+        """
+        i, j = np.divmod(self.CELLS, len(self.Y))
+        return pd.DataFrame({"x": self.X[i], "y": self.Y[j]})
+
+
+def snapshot_arrival(SNAPSHOT, window, dtype):
+    """
+    Publishes an arrival raster in a snapshot buffer, see SNAPSHOT_HEADER
+    :param SNAPSHOT: writable buffer, e.g. a multiprocessing.RawArray
+    :param window: (first row, last row + 1, first column, last column + 1) of the grid the raster covers
+    :param dtype: dtype of the raster, see propagation.arrival_raster
+    :return: (rows, cols) raster of -1 in the buffer, for an engine to record arrival minutes in; None if it does
+             not fit, nothing being published then
+    """
+    HEADER = np.frombuffer(SNAPSHOT, dtype=np.int64, count=SNAPSHOT_HEADER)
+    HEADER[:] = -1
+    i0, i1, j0, j1 = window
+    dtype = np.dtype(dtype)
+    if HEADER.nbytes + (i1 - i0) * (j1 - j0) * dtype.itemsize > len(memoryview(SNAPSHOT).cast("B")):
+        return None
+
+    ARRIVAL = np.frombuffer(SNAPSHOT, dtype=dtype, count=(i1 - i0) * (j1 - j0), offset=HEADER.nbytes)
+    ARRIVAL[:] = -1
+    # the header goes last, readers never see a raster of another window
+    HEADER[:] = i0, i1, j0, j1, dtype.itemsize
+    return ARRIVAL.reshape(i1 - i0, j1 - j0)
+
+
+def read_snapshot(SNAPSHOT, X, Y):
+    """
+    Reads the cells burned so far from a snapshot buffer, see snapshot_arrival
+    :param SNAPSHOT: buffer a burn publishes its arrival raster in
+    :param X: (rows,) longitudes of the grid
+    :param Y: (cols,) latitudes of the grid
+    :return: BurnedCells, None if nothing is published or the burn started on another window meanwhile
+    """
+    HEADER = np.frombuffer(SNAPSHOT, dtype=np.int64, count=SNAPSHOT_HEADER)
+    i0, i1, j0, j1, itemsize = (int(value) for value in HEADER)
+    if itemsize <= 0:
+        return None
+    ARRIVAL = np.frombuffer(SNAPSHOT, dtype=f"i{itemsize}", count=(i1 - i0) * (j1 - j0), offset=HEADER.nbytes)
+    ARRIVAL = ARRIVAL.reshape(i1 - i0, j1 - j0).copy()
+    if tuple(HEADER) != (i0, i1, j0, j1, itemsize):
+        return None
+    return BurnedCells.from_arrival(ARRIVAL, X, Y, origin=(i0, j0))
+
+
+def to_geojson(FIRES_LATLON):
+    """
+    Converts burned cells to GeoJSON
+    :param FIRES_LATLON: burn()'s result, one x (longitude), y (latitude) row per burned cell
+    :return: dict of a GeoJSON FeatureCollection holding one MultiPoint of the burned cell centers
+    """
+    coordinates = np.stack([FIRES_LATLON["x"].to_numpy(dtype=np.float64),
+                            FIRES_LATLON["y"].to_numpy(dtype=np.float64)], axis=1)
+    return {"type": "FeatureCollection",
+            "features": [{"type": "Feature",
+                          "geometry": {"type": "MultiPoint", "coordinates": coordinates.tolist()},
+                          "properties": {"cells": len(coordinates)}}]}
+
+
+def to_binary(FIRES_LATLON):
+    """
+    Converts burned cells to a compact binary, 8 bytes per cell
+    :param FIRES_LATLON: burn()'s result, one x (longitude), y (latitude) row per burned cell
+    :return: bytes of little-endian float32 (longitude, latitude) pairs
+    """
+    coordinates = np.stack([FIRES_LATLON["x"].to_numpy(), FIRES_LATLON["y"].to_numpy()], axis=1)
+    return coordinates.astype("<f4").tobytes()
+
+
+def from_binary(buffer):
+    """
+    Reads the output of to_binary
+    :param buffer: bytes written by to_binary
+    :return: (n, 2) float32 array of (longitude, latitude) pairs
+    """
+    return np.frombuffer(buffer, dtype="<f4").reshape(-1, 2)
+
+
+def _grid(X, Y):
+    """
+    :return: longitude and latitude of the first cell center, and the spacing of the grid along each axis
+    """
+    dx = (X[-1] - X[0]) / (len(X) - 1) if len(X) > 1 else 0.
+    dy = (Y[-1] - Y[0]) / (len(Y) - 1) if len(Y) > 1 else 0.
+    return float(X[0]), float(Y[0]), float(dx), float(dy)
+
+
+def _read_header(buffer):
+    """
+    :param buffer: bytes written by to_bitmask or to_rle
+    :return: the (rows, cols) shape of the grid, its longitudes and latitudes, and the rest of the buffer
+    """
+    rows, cols, x0, y0, dx, dy = RASTER_HEADER.unpack_from(buffer)
+    return (rows, cols), x0 + dx * np.arange(rows), y0 + dy * np.arange(cols), memoryview(buffer)[RASTER_HEADER.size:]
+
+
+def to_bitmask(cells):
+    """
+    Converts burned cells to a bit-packed raster, one bit per cell of the landscape grid
+    :param cells: BurnedCells
+    :return: bytes of RASTER_HEADER, then the row-major mask packed eight cells to a byte, most significant bit first
+    """
+    return RASTER_HEADER.pack(*cells.shape, *_grid(cells.X, cells.Y)) + np.packbits(cells.mask()).tobytes()
+
+
+def from_bitmask(buffer):
+    """
+    Reads the output of to_bitmask
+    :param buffer: bytes written by to_bitmask
+    :return: (rows, cols) boolean array of burned cells, longitudes and latitudes of the grid
+    """
+    shape, X, Y, bits = _read_header(buffer)
+    FIRES = np.unpackbits(np.frombuffer(bits, dtype=np.uint8), count=shape[0] * shape[1]).astype(bool)
+    return FIRES.reshape(shape), X, Y
+
+
+def to_rle(cells):
+    """
+    Converts burned cells to a run-length encoded raster, compact for fires much smaller than the landscape
+    :param cells: BurnedCells
+    :return: bytes of RASTER_HEADER, then little-endian uint32 lengths of alternating unburned and burned runs
+             of the row-major mask, starting with unburned
+    """
+    CELLS = cells.CELLS.astype(np.int64)
+    starts, ends = CELLS[:0], CELLS[:0]
+    if len(CELLS):
+        # burned runs break wherever the next burned cell is not the next cell
+        breaks = np.flatnonzero(np.diff(CELLS) != 1) + 1
+        starts, ends = CELLS[np.r_[0, breaks]], CELLS[np.r_[breaks - 1, -1]] + 1
+    RUNS = np.empty(2 * len(starts), dtype=np.int64)
+    RUNS[0::2] = starts - np.r_[0, ends[:-1]]
+    RUNS[1::2] = ends - starts
+    return RASTER_HEADER.pack(*cells.shape, *_grid(cells.X, cells.Y)) + RUNS.astype("<u4").tobytes()
+
+
+def from_rle(buffer):
+    """
+    Reads the output of to_rle
+    :param buffer: bytes written by to_rle
+    :return: (rows, cols) boolean array of burned cells, longitudes and latitudes of the grid
+    """
+    shape, X, Y, runs = _read_header(buffer)
+    RUNS = np.frombuffer(runs, dtype="<u4").astype(np.int64)
+    ends = np.cumsum(RUNS)
+    FIRES = np.zeros(shape[0] * shape[1], dtype=bool)
+    for start, end in zip(ends[0::2], ends[1::2]):
+        FIRES[start:end] = True
+    return FIRES.reshape(shape), X, Y
+
+
+def _trace(FIRES):
+    """
+    Traces the boundaries of burned regions along the edges of their cells
+    :param FIRES: (rows, cols) boolean array of burned cells
+    :return: list of rings of grid vertices (a, b), vertex (a, b) being the corner between cells a - 1 and a
+             along the rows and b - 1 and b along the columns, with the signed area of each ring and a burned cell
+             on it. Rings keep burned cells on their left, so outer boundaries run counterclockwise with positive
+             areas and holes clockwise with negative ones, and only hold the vertices where they turn
+    """
+    B = np.pad(FIRES, 1)
+    inner = B[1:-1, 1:-1]
+    outgoing = {}
+    # a boundary edge on each side of a burned cell whose neighbour on that side is not burned
+    for neighbour, (start_a, start_b), direction in [(B[1:-1, :-2], (0, 0), (1, 0)), (B[2:, 1:-1], (1, 0), (0, 1)),
+                                                     (B[1:-1, 2:], (1, 1), (-1, 0)), (B[:-2, 1:-1], (0, 1), (0, -1))]:
+        for i, j in zip(*np.nonzero(inner & ~neighbour)):
+            outgoing.setdefault((int(i) + start_a, int(j) + start_b), []).append(direction)
+
+    # the burned cell on the left of an edge leaving a vertex, by direction
+    left = {(1, 0): (0, 0), (0, 1): (-1, 0), (-1, 0): (-1, -1), (0, -1): (0, -1)}
+
+    rings, areas, cells = [], [], []
+    for start in list(outgoing):
+        # a vertex where two regions touch starts two rings
+        while start in outgoing:
+            directions = outgoing[start]
+            start_direction = directions.pop()
+            if not directions:
+                del outgoing[start]
+
+            ring, vertex, direction = [start], start, start_direction
+            while True:
+                vertex = (vertex[0] + direction[0], vertex[1] + direction[1])
+                candidates = outgoing.get(vertex, [])
+                if vertex == start:
+                    candidates = candidates + [start_direction]
+                # turning left first keeps regions which only touch at a corner apart
+                for turn in ((-direction[1], direction[0]), direction, (direction[1], -direction[0])):
+                    if turn in candidates:
+                        break
+                if vertex == start and turn == start_direction:
+                    break
+
+                outgoing[vertex].remove(turn)
+                if not outgoing[vertex]:
+                    del outgoing[vertex]
+                if turn != direction:
+                    ring.append(vertex)
+                direction = turn
+            rings.append(np.array(ring, dtype=np.float64))
+            areas.append(sum(a * next_b - b * next_a
+                             for (a, b), (next_a, next_b) in zip(ring, ring[1:] + ring[:1])) / 2)
+            cells.append((start[0] + left[start_direction][0], start[1] + left[start_direction][1]))
+    return rings, areas, cells
+
+
+def _simplify(POINTS, tolerance):
+    """
+    Douglas-Peucker simplification of a polyline, keeping its first and last points
+    :param POINTS: (n, 2) array of points
+    :param tolerance: largest distance of a dropped point from the simplified line
+    :return: (m, 2) array of the points kept
+    """
+    keep = np.zeros(len(POINTS), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(POINTS) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment, offsets = POINTS[last] - POINTS[first], POINTS[first + 1:last] - POINTS[first]
+        length = np.hypot(*segment)
+        if length:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = first + 1 + int(np.argmax(distances))
+        if distances[farthest - first - 1] > tolerance:
+            keep[farthest] = True
+            stack += [(first, farthest), (farthest, last)]
+    return POINTS[keep]
+
+
+def _simplify_ring(RING, tolerance):
+    """
+    _simplify for a closed ring, split at its farthest vertex from the first
+    :return: the simplified ring, or RING itself if simplifying would leave less than a triangle
+    """
+    farthest = int(np.argmax(np.hypot(*(RING - RING[0]).T)))
+    closed = np.vstack([RING, RING[:1]])
+    simplified = np.vstack([_simplify(closed[:farthest + 1], tolerance)[:-1],
+                            _simplify(closed[farthest:], tolerance)[:-1]])
+    return simplified if len(simplified) >= 3 else RING
+
+
+def perimeter(cells, tolerance=1.):
+    """
+    Simplified perimeter of the burned cells
+    :param cells: BurnedCells
+    :param tolerance: largest distance, in cells, the simplified perimeter strays from the cell boundaries.
+                      Unburned holes of at most tolerance ** 2 cells are left out
+    :return: list of polygons, each a list of (n, 2) arrays of (longitude, latitude) rings: the outer boundary
+             counterclockwise, then any unburned holes clockwise. Rings are not closed, their last point is not
+             the first repeated
+    """
+    if not len(cells):
+        return []
+
+    # traced within the bounding box of the fire, so the cost follows the fire rather than the landscape
+    i, j = np.divmod(cells.CELLS.astype(np.int64), len(cells.Y))
+    i0, j0 = int(i.min()), int(j.min())
+    FIRES = np.zeros((int(i.max()) - i0 + 1, int(j.max()) - j0 + 1), dtype=bool)
+    FIRES[i - i0, j - j0] = True
+    rings, areas, ring_cells = _trace(FIRES)
+
+    # every ring bounds one region of burned cells connected along their sides: its outer boundary,
+    # or one of its holes
+    REGIONS, _ = ndimage.label(FIRES)
+    polygons = {}
+    for ring, area, cell in zip(rings, areas, ring_cells):
+        polygon = polygons.setdefault(REGIONS[cell], [])
+        if area > 0:
+            polygon.insert(0, ring)
+        elif -area > tolerance ** 2 or not tolerance:
+            polygon.append(ring)
+
+    x0, y0, dx, dy = _grid(cells.X, cells.Y)
+    # a grid running west or south mirrors the rings, reversing them keeps outer boundaries counterclockwise
+    step = 1 if dx * dy >= 0 else -1
+    return [[np.stack([x0 + (i0 + ring[:, 0] - .5) * dx, y0 + (j0 + ring[:, 1] - .5) * dy], axis=1)[::step]
+             for ring in (_simplify_ring(ring, tolerance) for ring in polygon)]
+            for polygon in polygons.values()]
+
+
+def to_perimeter(cells, tolerance=1.):
+    """
+    Converts burned cells to their simplified perimeter, in GeoJSON
+    :param cells: BurnedCells
+    :param tolerance: see perimeter
+    :return: dict of a GeoJSON FeatureCollection holding one MultiPolygon of the burned area
+    """
+    coordinates = [[np.vstack([ring, ring[:1]]).tolist() for ring in polygon]
+                   for polygon in perimeter(cells, tolerance)]
+    return {"type": "FeatureCollection",
+            "features": [{"type": "Feature",
+                          "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+                          "properties": {"cells": len(cells)}}]}
+
+
+def to_isochrones(cells, minutes, tolerance=1.):
+    """
+    Converts burned cells to the simplified perimeter of the fire at several minutes, in GeoJSON,
+    for animations and time-based reports from a single burn
+    :param cells: BurnedCells with arrival minutes
+    :param minutes: minutes since ignition to draw the perimeter at
+    :param tolerance: see perimeter
+    :return: dict of a GeoJSON FeatureCollection holding one MultiPolygon per minute, in the order given
+    """
+    features = []
+    for minute in minutes:
+        feature = to_perimeter(cells.by(minute), tolerance)["features"][0]
+        feature["properties"]["minute"] = minute
+        features.append(feature)
+    return {"type": "FeatureCollection", "features": features}
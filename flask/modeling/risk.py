@@ -0,0 +1,181 @@
+#################################################
+#################################################
+#################################################
+##### Risk Mapping
+#####
+##### Burns from ignitions seeded all over the landscape, on a regular or stratified grid, and accumulates how often
+##### each cell burns and how large the fires that reach it grow. Every ignition shares the landscape and compiled
+##### kernels of the process (or Simulator workers) it runs in. Partial maps are checkpointed to disk, so a batch
+##### which stops part way resumes where it left off.
+
+from concurrent.futures import as_completed
+import json
+import os
+
+import numpy as np
+
+from modeling.data.landscape import open_landscape, open_pickle
+from modeling.farsite import burn, nearest_wind
+from modeling.models.propagation import NON_BURNABLE
+
+# hectares in a 30m cell
+CELL_HECTARES = .09
+
+
+def ignition_grid(FUEL, spacing, stratified=False, seed=None):
+    """
+    Seeds ignitions across a landscape, one per spacing x spacing block, skipping unburnable fuel
+    :param FUEL: (rows, cols) fuel array
+    :param spacing: side of a block, in cells
+    :param stratified: ignite a random burnable cell of every block rather than its center
+    :param seed: seed of the random generator of a stratified grid
+    :return: (n, 2) int64 array of the (row, column) of each ignition, in row-major order of the blocks
+    """
+    FUEL = np.asarray(FUEL)
+    BURNABLE = ~np.isin(FUEL, NON_BURNABLE)
+    rows, cols = FUEL.shape
+    rng = np.random.default_rng(seed)
+
+    ignitions = []
+    for i in range(0, rows, spacing):
+        for j in range(0, cols, spacing):
+            if stratified:
+                cells = np.argwhere(BURNABLE[i:i + spacing, j:j + spacing])
+                if len(cells):
+                    ignitions.append(cells[rng.integers(len(cells))] + (i, j))
+            else:
+                center = min(i + spacing // 2, rows - 1), min(j + spacing // 2, cols - 1)
+                if BURNABLE[center]:
+                    ignitions.append(center)
+    return np.array(ignitions, dtype=np.int64).reshape(-1, 2)
+
+
+def _save_checkpoint(path_checkpoint, key, WIND, IGNITIONS, DONE, COUNTS, AREA, X, Y):
+    """
+    Writes a risk map, complete or not, aside then moves it into place, so a batch stopped mid-write
+    leaves its last checkpoint intact
+    """
+    np.savez(path_checkpoint + ".tmp.npz", key=np.array(key), WIND=WIND, IGNITIONS=IGNITIONS, DONE=DONE,
+             COUNTS=COUNTS, AREA=AREA, X=X, Y=Y)
+    os.replace(path_checkpoint + ".tmp.npz", path_checkpoint)
+
+
+def risk_map(path_checkpoint, path_landscape=None, path_pickle=None, spacing=10, mins=120, wind=None,
+             stratified=False, seed=None, simulator=None, checkpoint_every=100, **kwargs):
+    """
+    Burns from every ignition of ignition_grid and accumulates per-cell burn counts and burned areas,
+    resuming from path_checkpoint if it holds a partial map of the same batch
+    :param path_checkpoint: .npz file the map is checkpointed to, and finally written to, see open_risk
+    :param path_landscape: path to a landscape directory
+    :param path_pickle: path to the preprocessed pickle data, used if path_landscape is None
+    :param spacing: see ignition_grid
+    :param mins: number of one minute iterations to burn every ignition for
+    :param wind: (wind speed (kt), wind direction (degrees)) of every burn, fetched once from the station nearest
+                 the landscape's center if None. A batch resumed with None keeps the wind it was started with
+    :param stratified: see ignition_grid
+    :param seed: see ignition_grid
+    :param simulator: Simulator on the same landscape to burn on, in parallel; in this process if None
+    :param checkpoint_every: number of burns between checkpoints
+    :param kwargs: any other arguments of burn(), such as slope_method
+    :return: number of ignitions burned by this call
+    """
+    if path_landscape is not None:
+        header, (_, FUEL, X, Y) = open_landscape(path_landscape)
+    else:
+        header, (_, FUEL, X, Y) = open_pickle(path_pickle)
+
+    # a checkpoint only resumes the batch it was written by. A fetched wind is no part of it, the station reports
+    # anew every hour: the checkpoint holds the wind its batch burns in instead
+    key = json.dumps({"checksum": header["checksum"], "spacing": spacing, "mins": mins,
+                      "wind": None if wind is None else [float(wind[0]), float(wind[1])], "stratified": stratified,
+                      "seed": seed, "kwargs": sorted((name, repr(value)) for name, value in kwargs.items())})
+    checkpoint = None
+    if os.path.exists(path_checkpoint):
+        with np.load(path_checkpoint) as saved:
+            if str(saved["key"]) == key and "WIND" in saved.files:
+                checkpoint = {name: saved[name] for name in ("WIND", "IGNITIONS", "DONE", "COUNTS", "AREA")}
+
+    if checkpoint is not None:
+        WIND, IGNITIONS, DONE, COUNTS, AREA = (checkpoint["WIND"], checkpoint["IGNITIONS"], checkpoint["DONE"],
+                                               checkpoint["COUNTS"], checkpoint["AREA"])
+    else:
+        if wind is None:
+            wind = nearest_wind(float(np.mean(Y)), float(np.mean(X)))
+        WIND = np.array([wind[0], wind[1]], dtype=np.float64)
+        IGNITIONS = ignition_grid(FUEL, spacing, stratified=stratified, seed=seed)
+        DONE = np.zeros(len(IGNITIONS), dtype=bool)
+        COUNTS, AREA = np.zeros(FUEL.shape, dtype=np.int32), np.zeros(FUEL.shape, dtype=np.float64)
+
+    kwargs = dict(kwargs, mins=mins, wind=(float(WIND[0]), float(WIND[1])), output="cells")
+    remaining = np.flatnonzero(~DONE)
+    if simulator is None:
+        paths = dict(path_landscape=path_landscape, path_pickle=path_pickle)
+        results = ((k, burn(Y[IGNITIONS[k, 1]], X[IGNITIONS[k, 0]], **paths, **kwargs)) for k in remaining)
+    else:
+        # each numbered as Simulator.burn numbers its simulations, so ignitions already burning can be cancelled
+        jobs = {k: next(simulator.numbers) for k in remaining}
+        futures = {simulator.submit(Y[IGNITIONS[k, 1]], X[IGNITIONS[k, 0]], job=jobs[k], **kwargs): k
+                   for k in remaining}
+        results = ((futures[future], future.result()) for future in as_completed(futures))
+
+    n_burned = 0
+    try:
+        for k, cells in results:
+            COUNTS.ravel()[cells.CELLS] += 1
+            AREA.ravel()[cells.CELLS] += len(cells) * CELL_HECTARES
+            DONE[k] = True
+            n_burned += 1
+            if not n_burned % checkpoint_every:
+                _save_checkpoint(path_checkpoint, key, WIND, IGNITIONS, DONE, COUNTS, AREA, X, Y)
+    finally:
+        # whatever burned before a failure is kept for the next call
+        if simulator is not None:
+            for future, k in futures.items():
+                if not future.cancel() and not future.done():
+                    simulator.cancel(jobs[k])
+        _save_checkpoint(path_checkpoint, key, WIND, IGNITIONS, DONE, COUNTS, AREA, X, Y)
+
+    return n_burned
+
+
+def open_risk(path_checkpoint):
+    """
+    Reads a risk map written by risk_map, complete or not
+    :param path_checkpoint: .npz file written by risk_map
+    :return: (rows, cols) float32 rasters of the fraction of burned ignitions which reached each cell, and of the
+             mean area (hectares) of the fires which reached it, 0 where none did; X, Y of the grid;
+             fraction of the ignitions burned so far
+    """
+    with np.load(path_checkpoint) as checkpoint:
+        DONE, COUNTS, AREA = checkpoint["DONE"], checkpoint["COUNTS"], checkpoint["AREA"]
+        X, Y = checkpoint["X"], checkpoint["Y"]
+
+    RISK = (COUNTS / max(DONE.sum(), 1)).astype(np.float32)
+    MEAN_AREA = np.divide(AREA, COUNTS, out=np.zeros_like(AREA), where=COUNTS > 0).astype(np.float32)
+    return RISK, MEAN_AREA, X, Y, float(DONE.mean()) if len(DONE) else 1.
+
+
+def sample_risk(RISK, X, Y, lons, lats):
+    """
+    Reads a risk raster at arbitrary points, from the cell nearest each of them
+    :param RISK: (rows, cols) raster on the regular grid X, Y, see open_risk
+    :param X: (rows,) longitudes of the grid
+    :param Y: (cols,) latitudes of the grid
+    :param lons: (n,) longitudes to read at
+    :param lats: (n,) latitudes to read at
+    :return: (n,) values of the nearest cells, points off the grid reading its edge
+    """
+    i = np.rint((np.asarray(lons, dtype=np.float64) - X[0]) / (X[1] - X[0])).astype(np.int64)
+    j = np.rint((np.asarray(lats, dtype=np.float64) - Y[0]) / (Y[1] - Y[0])).astype(np.int64)
+    return RISK[np.clip(i, 0, len(X) - 1), np.clip(j, 0, len(Y) - 1)]
+
+
+if __name__ == "__main__":
+    # run from flask/ once the landscape is built, see create_pickle.py; rerun to resume
+    from modeling.simulator import Simulator
+
+    simulator = Simulator(path_landscape="modeling/data/landscape", workers=os.cpu_count())
+    try:
+        risk_map("modeling/data/risk.npz", path_landscape="modeling/data/landscape", simulator=simulator)
+    finally:
+        simulator.shutdown()
@@ -0,0 +1,211 @@
+#################################################
+#################################################
+#################################################
+##### Resident Simulation Service
+#####
+##### A pool of worker processes which open the landscape and compile the propagation kernels once, at startup,
+##### then run burn() for whoever submits to them. Keeps simulations off the web server's request threads.
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import threading
+
+import numpy as np
+
+from modeling.data.landscape import open_landscape, open_pickle
+from modeling.farsite import burn, cached_fuel_constants
+from modeling.models.propagation import PROGRESS_CANCEL, PROGRESS_SIZE, warm_up
+from modeling.results import SNAPSHOT_HEADER, read_snapshot
+
+# every worker owns one row of the shared progress table: the job it is running, then the engine's progress
+PROGRESS_JOB = 0
+
+# bytes of the snapshot every worker publishes the arrival raster of its job in, see results.snapshot_arrival:
+# room for windows of 8 million cells, burns on larger ones are only published once they finish
+SNAPSHOT_BYTES = 2 ** 24
+
+# jobs cancelled lately, remembered in a shared ring so a job cancelled before it reached a worker stops as it starts
+CANCELLED_SIZE = 64
+
+# data sources of this worker process, set once by _start_worker
+_WORKER = {}
+
+
+def _start_worker(path_pickle, path_landscape, progress, snapshots, cancelled, n_started):
+    """
+    Runs once in every worker process: opens the landscape and the fuel constants table, and compiles the kernels
+    for its arrays
+    :param path_pickle: path to the preprocessed pickle data
+    :param path_landscape: path to a landscape directory, used instead of path_pickle if given
+    :param progress: shared progress table, see Simulator.progress
+    :param snapshots: shared snapshot buffers, one row per worker as in the progress table, see Simulator.snapshot
+    :param cancelled: shared ring of cancelled jobs, see Simulator.cancel
+    :param n_started: shared count of started workers, which hands out the rows of the progress table
+    """
+    with n_started.get_lock():
+        row = n_started.value
+        n_started.value += 1
+
+    _WORKER.update(path_pickle=path_pickle, path_landscape=path_landscape,
+                   progress=np.frombuffer(progress, dtype=np.int64).reshape(-1, 1 + PROGRESS_SIZE)[row],
+                   snapshot=np.frombuffer(snapshots, dtype=np.uint8).reshape(-1, SNAPSHOT_BYTES)[row],
+                   cancelled=np.frombuffer(cancelled, dtype=np.int64))
+    if path_landscape is not None:
+        _, data = open_landscape(path_landscape)
+    else:
+        _, data = open_pickle(path_pickle)
+    cached_fuel_constants()
+    warm_up(data[0], data[1])
+
+
+def _ready():
+    """
+    Nothing, once the worker has started
+    """
+    return True
+
+
+def _burn(lat, lon, kwargs, job=None):
+    """
+    Runs burn() in a worker process on its landscape, publishing its progress and the cells it has burned so far
+    if it is a numbered job
+    """
+    if job is not None:
+        progress = _WORKER["progress"]
+        # the last job's snapshot is withdrawn before the row is claimed, readers never take it for this one
+        np.frombuffer(_WORKER["snapshot"], dtype=np.int64, count=SNAPSHOT_HEADER)[:] = -1
+        progress[:] = 0
+        progress[PROGRESS_JOB] = job
+        # the row is claimed before the ring is read, so a cancel finds one or the other
+        if job in _WORKER["cancelled"]:
+            progress[1 + PROGRESS_CANCEL] = 1
+        kwargs = dict(kwargs, progress=progress[1:], snapshot=_WORKER["snapshot"])
+    return burn(lat, lon, path_pickle=_WORKER["path_pickle"], path_landscape=_WORKER["path_landscape"], **kwargs)
+
+
+class Simulator:
+    """
+    Pool of resident simulation workers, each burning one fire at a time on the same landscape
+    """
+
+    def __init__(self, path_pickle=None, path_landscape=None, workers=2):
+        """
+        Starts the workers, each loading the landscape and compiling the kernels before it accepts a job
+        :param path_pickle: path to the preprocessed pickle data
+        :param path_landscape: path to a landscape directory, used instead of path_pickle if given
+        :param workers: number of simulations which can run at once
+        """
+        if path_pickle is None and path_landscape is None:
+            raise ValueError("Simulator needs a path_pickle or a path_landscape")
+
+        # spawned rather than forked, numba's threading layers do not survive a fork
+        context = multiprocessing.get_context("spawn")
+        self.path_pickle, self.path_landscape = path_pickle, path_landscape
+        self.table = context.RawArray("q", workers * (1 + PROGRESS_SIZE))
+        self.snapshots = context.RawArray("B", workers * SNAPSHOT_BYTES)
+        self.cancelled = context.RawArray("q", CANCELLED_SIZE)
+        self.n_cancelled = 0
+        self.lock = threading.Lock()
+        # simulations submitted without a job number get one of their own, below zero, so they can be cancelled
+        self.numbers = itertools.count(-1, -1)
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_start_worker,
+                                            initargs=(path_pickle, path_landscape, self.table, self.snapshots,
+                                                      self.cancelled, context.Value("i", 0)))
+        self.started = [self.executor.submit(_ready) for _ in range(workers)]
+
+    def wait_ready(self, timeout=None):
+        """
+        Blocks until every worker has started
+        :param timeout: seconds to wait at most, None for no limit
+        """
+        for future in self.started:
+            future.result(timeout=timeout)
+
+    def submit(self, lat, lon, job=None, **kwargs):
+        """
+        Queues a simulation
+        :param lat: latitude of ignition
+        :param lon: longitude of ignition
+        :param job: positive number identifying the simulation in progress() and cancel(), if it should be tracked
+        :param kwargs: any other arguments of burn(), such as mins, engine or wind
+        :return: concurrent.futures.Future of burn()'s result
+        """
+        return self.executor.submit(_burn, lat, lon, kwargs, job)
+
+    def progress(self, job):
+        """
+        Reads the progress of a running simulation from the workers
+        :param job: number the simulation was submitted with
+        :return: int64 array of propagation.PROGRESS_SIZE, or None if no worker is running the job
+        """
+        table = np.frombuffer(self.table, dtype=np.int64).reshape(-1, 1 + PROGRESS_SIZE)
+        for row in table:
+            if row[PROGRESS_JOB] == job:
+                # copied, the worker keeps writing to the row
+                return row[1:].copy()
+        return None
+
+    def snapshot(self, job):
+        """
+        Reads the cells a running simulation has burned so far from its worker
+        :param job: number the simulation was submitted with
+        :return: results.BurnedCells, with arrival minutes, or None if no worker is running the job, or it has not
+                 started burning, or burns a window too large to publish (see SNAPSHOT_BYTES)
+        """
+        table = np.frombuffer(self.table, dtype=np.int64).reshape(-1, 1 + PROGRESS_SIZE)
+        snapshots = np.frombuffer(self.snapshots, dtype=np.uint8).reshape(-1, SNAPSHOT_BYTES)
+        for row, SNAPSHOT in zip(table, snapshots):
+            if row[PROGRESS_JOB] == job:
+                # the coordinates of the landscape, opened here too (memory-mapped, a landscape costs little)
+                if self.path_landscape is not None:
+                    _, (_, _, X, Y) = open_landscape(self.path_landscape)
+                else:
+                    _, (_, _, X, Y) = open_pickle(self.path_pickle)
+                cells = read_snapshot(SNAPSHOT, X, Y)
+                # the worker may have moved on to another job while the snapshot was read
+                return cells if row[PROGRESS_JOB] == job else None
+        return None
+
+    def cancel(self, job):
+        """
+        Stops a simulation: a running one at the start of its next minute, a queued one as soon as it starts.
+        Its future then raises propagation.BurnCancelled
+        :param job: number the simulation was submitted with
+        """
+        with self.lock:
+            cancelled = np.frombuffer(self.cancelled, dtype=np.int64)
+            cancelled[self.n_cancelled % CANCELLED_SIZE] = job
+            self.n_cancelled += 1
+
+        # the ring is written before the rows are read, so a worker claiming the job meanwhile finds it there
+        table = np.frombuffer(self.table, dtype=np.int64).reshape(-1, 1 + PROGRESS_SIZE)
+        for row in table:
+            if row[PROGRESS_JOB] == job:
+                row[1 + PROGRESS_CANCEL] = 1
+
+    def burn(self, lat, lon, timeout=None, **kwargs):
+        """
+        Runs a simulation and waits for it
+        :param lat: latitude of ignition
+        :param lon: longitude of ignition
+        :param timeout: seconds to wait at most, None for no limit; concurrent.futures.TimeoutError after that,
+                        the simulation being cancelled so its worker is free again within a minute of burning
+        :param kwargs: any other arguments of burn()
+        :return: burn()'s result
+        """
+        job = next(self.numbers)
+        future = self.submit(lat, lon, job=job, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            if not future.cancel():
+                self.cancel(job)
+            raise
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers, cancelling queued simulations
+        :param wait: whether to wait for running simulations to finish
+        """
+        self.executor.shutdown(wait=wait, cancel_futures=True)
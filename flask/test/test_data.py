@@ -0,0 +1,171 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from modeling.data.create_pickle import build_input
+from modeling.data.landscape import checksum, open_landscape, save_landscape
+from modeling.farsite import burn, compute_slope
+from modeling.models.propagation import arrival_raster, propagate
+from test.test_farsite import burnable_center, random_landscape
+from test.test_rothermel import PATH_FUELDICT
+
+
+class BuildInputTests(unittest.TestCase):
+
+    def test_matches_per_pixel_mapping(self):
+        """
+        GIVEN a raw fuel raster with every FBFM40 code and no data, and an elevation raster
+        WHEN INPUT is built with the table gather
+        THEN it matches the original per-pixel dictionary mapping exactly
+        """
+        codes = pd.read_csv(PATH_FUELDICT)["VALUE"].to_numpy(dtype=np.float32)
+        codes[codes == -9999] = 0
+        rng = np.random.default_rng(0)
+        FUEL = rng.choice(codes, size=(13, 17))
+        ELEV = rng.uniform(0, 1000, size=FUEL.shape).astype(np.float32)
+
+        FUEL_TYPE_MAP = pd.read_csv(PATH_FUELDICT, header='infer').set_index('VALUE')
+        FUEL_TYPE_MAP = {float(ind): np.array([FUEL_TYPE_MAP['FuelBedDepth'][ind],
+                                               FUEL_TYPE_MAP['SAV'][ind],
+                                               FUEL_TYPE_MAP['OvenDryLoad'][ind],
+                                               FUEL_TYPE_MAP['Mx'][ind] / 100,
+                                               (FUEL_TYPE_MAP['Mx'][ind] * .95) / 100, 0])
+                         for ind in FUEL_TYPE_MAP.index}
+        expected = np.zeros((FUEL.shape[0], FUEL.shape[1], 6), dtype=np.float32)
+        for i in range(FUEL.shape[0]):
+            for j in range(FUEL.shape[1]):
+                expected[i, j, :] = FUEL_TYPE_MAP[FUEL[i, j] if FUEL[i, j] else -9999.]
+                expected[i, j, 2] *= .0459137
+                expected[i, j, 5] = ELEV[i, j]
+
+        INPUT = build_input(FUEL, ELEV, PATH_FUELDICT)
+        self.assertEqual(np.float32, INPUT.dtype)
+        np.testing.assert_array_equal(expected, INPUT)
+
+    def test_unknown_fuel(self):
+        """
+        GIVEN a fuel raster with a code missing from the fuel dictionary
+        WHEN INPUT is built
+        THEN a KeyError names the code
+        """
+        FUEL = np.array([[101., 5.]])
+        with self.assertRaises(KeyError):
+            build_input(FUEL, np.zeros(FUEL.shape), PATH_FUELDICT)
+
+
+class LandscapeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "landscape")
+        self.INPUT, self.FUEL = random_landscape(30, 40, seed=4)
+        self.INPUT[..., 5] = np.random.default_rng(4).uniform(0, 20, self.FUEL.shape)
+        self.X, self.Y = np.linspace(-122, -121, 30), np.linspace(37, 38, 40)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """
+        GIVEN prepared landscape arrays
+        WHEN they are saved as a landscape and opened twice
+        THEN the same read-only memory maps come back, matching the arrays and the header checksum
+        """
+        header = save_landscape(self.path, self.INPUT, self.FUEL, self.X, self.Y)
+        opened, arrays = open_landscape(self.path)
+        self.assertEqual(header, opened)
+        self.assertIs(arrays, open_landscape(self.path)[1])
+
+        for expected, array in zip((self.INPUT, self.FUEL, self.X, self.Y), arrays):
+            self.assertIsInstance(array, np.memmap)
+            self.assertFalse(array.flags.writeable)
+            np.testing.assert_array_equal(expected, array)
+        self.assertEqual(header["checksum"], checksum(arrays))
+
+    def test_burn_from_landscape(self):
+        """
+        GIVEN a saved landscape holding elevation in dim 5 of INPUT
+        WHEN the engine burns the memory-mapped arrays with tan_phi passed separately
+        THEN it burns the same cells as with tan_phi written into an in-memory INPUT
+        """
+        save_landscape(self.path, self.INPUT, self.FUEL, self.X, self.Y)
+        _, (INPUT, FUEL, _, _) = open_landscape(self.path)
+        TAN_PHI = compute_slope(INPUT[..., 5], 40)
+        i_start, j_start = burnable_center(self.INPUT)
+
+        expected_input = self.INPUT.copy()
+        expected_input[..., 5] = TAN_PHI
+        expected = propagate(expected_input, self.FUEL, i_start, j_start, 500., 0.7, 40)
+        burned = propagate(INPUT, FUEL, i_start, j_start, 500., 0.7, 40, TAN_PHI=TAN_PHI)
+        self.assertGreater(expected.sum(), 1)
+        np.testing.assert_array_equal(expected, burned)
+
+    def test_burn_with_timeline(self):
+        """
+        GIVEN a saved landscape and a timeline of winds in kt and degrees, out of order, the first from ignition
+        WHEN burn() runs with it, from one ignition and from several
+        THEN it burns the cells the engine burns given the same winds in ft/min and radians, with their slopes
+        """
+        save_landscape(self.path, self.INPUT, self.FUEL, self.X, self.Y)
+        _, (INPUT, FUEL, X, Y) = open_landscape(self.path)
+        i_start, j_start = burnable_center(self.INPUT)
+
+        result = burn(Y[j_start], X[i_start], mins=40, path_landscape=self.path,
+                      timeline=[(20, (3., 200.)), (0, (5., 40.))])
+        expected = propagate(INPUT, FUEL, i_start, j_start, 5 * 101.269, 40 * np.pi / 180, 40,
+                             TAN_PHI=compute_slope(INPUT[..., 5], 40),
+                             timeline=[(20, 3 * 101.269, 200 * np.pi / 180, compute_slope(INPUT[..., 5], 200))])
+        self.assertEqual({(X[i], Y[j]) for i, j in zip(*np.nonzero(expected))}, set(zip(result["x"], result["y"])))
+
+        for output, mask in [("mask", lambda FIRES: FIRES), ("cells", lambda cells: cells.mask())]:
+            result = burn(Y[j_start], X[i_start], mins=40, path_landscape=self.path, output=output,
+                          timeline=[(20, (3., 200.)), (0, (5., 40.))])
+            np.testing.assert_array_equal(expected, mask(result))
+
+        # several ignitions, given by their coordinates
+        starts = [0, 10]
+        i_starts, j_starts = [i_start, i_start // 2], [j_start, j_start // 2]
+        result = burn(Y[j_starts], X[i_starts], mins=40, path_landscape=self.path, output="mask", starts=starts,
+                      timeline=[(20, (3., 200.)), (0, (5., 40.))])
+        expected = propagate(INPUT, FUEL, i_starts, j_starts, 5 * 101.269, 40 * np.pi / 180, 40, starts=starts,
+                             TAN_PHI=compute_slope(INPUT[..., 5], 40),
+                             timeline=[(20, 3 * 101.269, 200 * np.pi / 180, compute_slope(INPUT[..., 5], 200))])
+        np.testing.assert_array_equal(expected, result)
+
+    def test_burn_on_window(self):
+        """
+        GIVEN a saved landscape much larger than a short burn reaches, and a window cut too small for it
+        WHEN burn() runs on the window it bounds the burn by, and on the small one
+        THEN both burn the arrival minutes the engine records on the whole landscape, the small window having grown
+             in the wind of the first pass
+        """
+        INPUT, FUEL = random_landscape(150, 150, seed=6)
+        X, Y = np.linspace(-122, -121, 150), np.linspace(37, 38, 150)
+        save_landscape(self.path, INPUT, FUEL, X, Y)
+        i_start, j_start = burnable_center(INPUT)
+        expected = arrival_raster(FUEL.shape, 20)
+        propagate(INPUT, FUEL, i_start, j_start, 5 * 101.269, 40 * np.pi / 180, 20, ARRIVAL=expected,
+                  TAN_PHI=compute_slope(INPUT[..., 5], 40))
+        self.assertGreater((expected >= 0).sum(), 9)
+
+        arrival = burn(Y[j_start], X[i_start], mins=20, path_landscape=self.path, wind=(5., 40.), output="arrival")
+        np.testing.assert_array_equal(expected, arrival)
+
+        window = (i_start - 1, i_start + 2, j_start - 1, j_start + 2)
+        for engine in ("numba", "python"):
+            with mock.patch("modeling.farsite.fire_window", return_value=window) as fire_window:
+                cells = burn(Y[j_start], X[i_start], mins=20, path_landscape=self.path, wind=(5., 40.),
+                             output="cells", engine=engine)
+            fire_window.assert_called_once()
+            np.testing.assert_array_equal(expected, cells.arrival())
+
+        # the nearest station reporting anew while the window grows changes nothing, nor is it asked again
+        with mock.patch("modeling.farsite.fire_window", return_value=window), \
+                mock.patch("modeling.farsite.nearest_wind", side_effect=[(5., 40.), (12., 200.)]) as nearest_wind:
+            cells = burn(Y[j_start], X[i_start], mins=20, path_landscape=self.path, output="cells")
+        nearest_wind.assert_called_once()
+        np.testing.assert_array_equal(expected, cells.arrival())
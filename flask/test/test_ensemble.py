@@ -0,0 +1,90 @@
+import concurrent.futures
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from modeling.data.landscape import save_landscape
+from modeling.ensemble import burn_probability, sample_members
+from modeling.farsite import burn
+from modeling.simulator import Simulator
+from test.test_farsite import burnable_center, random_landscape
+
+
+class EnsembleTests(unittest.TestCase):
+
+    def test_sample_members(self):
+        """
+        GIVEN a seed
+        WHEN an ensemble is drawn from it twice
+        THEN both draws are the same, with winds held to valid speeds and directions around the given one
+        """
+        samples = sample_members(37.5, -121.5, (5., 350.), 200, seed=3)
+        self.assertEqual(samples, sample_members(37.5, -121.5, (5., 350.), 200, seed=3))
+        speeds, dirs = np.array([sample["wind"] for sample in samples]).T
+        self.assertTrue(np.all(speeds >= 0) and np.all((dirs >= 0) & (dirs < 360)))
+        self.assertAlmostEqual(5., np.mean(speeds), delta=.5)
+        self.assertAlmostEqual(1., np.median([sample["moisture"] for sample in samples]), delta=.05)
+        self.assertLess(np.max(np.abs([sample["lat"] - 37.5 for sample in samples])), 200 / 111320)
+
+    def test_burn_probability(self):
+        """
+        GIVEN a saved landscape and a seeded ensemble, two of whose ignitions fall in unburnable fuel
+        WHEN it runs in this process and on a simulator
+        THEN both give the fraction of members which burned each cell, as burning every member by hand does
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            INPUT, FUEL = random_landscape(30, 30, seed=5)
+            INPUT[..., 5] = 0
+            X, Y = np.linspace(-122, -121.9, 30), np.linspace(37, 37.1, 30)
+            save_landscape(path_landscape, INPUT, FUEL, X, Y)
+            i, j = burnable_center(INPUT)
+
+            expected = np.mean([burn(mins=20, path_landscape=path_landscape, output="mask", **sample)
+                                for sample in sample_members(Y[j], X[i], (5., 30.), 6, ignition_sd=300., seed=1)],
+                               axis=0)
+            self.assertGreater(len(np.unique(expected)), 2)
+
+            PROBABILITY, X_grid, Y_grid = burn_probability(Y[j], X[i], members=6, wind=(5., 30.), ignition_sd=300.,
+                                                           seed=1, mins=20, path_landscape=path_landscape)
+            self.assertEqual(np.float32, PROBABILITY.dtype)
+            np.testing.assert_allclose(expected, PROBABILITY, rtol=1e-6)
+            np.testing.assert_array_equal(X, X_grid)
+            np.testing.assert_array_equal(Y, Y_grid)
+
+            simulator = Simulator(path_landscape=path_landscape, workers=2)
+            try:
+                PROBABILITY, _, _ = burn_probability(Y[j], X[i], members=6, simulator=simulator, wind=(5., 30.),
+                                                     ignition_sd=300., seed=1, mins=20, timeout=300)
+            finally:
+                simulator.shutdown()
+            np.testing.assert_allclose(expected, PROBABILITY, rtol=1e-6)
+
+    def test_timeout(self):
+        """
+        GIVEN a simulator of two workers and an ensemble of fires far longer than anyone waits for
+        WHEN the ensemble times out
+        THEN its members, running or queued, are cancelled, freeing the workers for the next burn within minutes
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            INPUT, FUEL = random_landscape(200, 200, seed=5)
+            INPUT[..., 5] = 0
+            X, Y = np.linspace(-122, -121, 200), np.linspace(37, 38, 200)
+            save_landscape(path_landscape, INPUT, FUEL, X, Y)
+            i, j = burnable_center(INPUT)
+
+            simulator = Simulator(path_landscape=path_landscape, workers=2)
+            try:
+                simulator.wait_ready()
+                with self.assertRaises(concurrent.futures.TimeoutError):
+                    burn_probability(Y[j], X[i], members=6, simulator=simulator, wind=(2., 30.), ignition_sd=0.,
+                                     seed=1, mins=5000, engine="python", timeout=1)
+                start = time.monotonic()
+                self.assertGreater(len(simulator.burn(Y[j], X[i], timeout=60, mins=20, wind=(5., 30.))), 1)
+                self.assertLess(time.monotonic() - start, 60)
+            finally:
+                simulator.shutdown()
@@ -0,0 +1,473 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from modeling.farsite import (_FUEL_CONSTANTS, _SLOPES, _WIND_FIELDS, PATH_FUELDICT, cached_fuel_constants,
+                              cached_slope, cached_wind_field, compute_slope, fire_window, spread, wind_sector)
+from modeling.models.propagation import (CLOSE_EVERY, ESCAPED_SIZE, MOISTURE_CEILING, NON_BURNABLE, PROGRESS_BURNED,
+                                         PROGRESS_CANCEL, PROGRESS_FRONTIER, PROGRESS_MINUTE, PROGRESS_SIZE,
+                                         BurnCancelled, arrival_raster, propagate, weather_segments)
+from modeling.models.rothermel import compute_surface_spread
+from modeling.models.wind import wind_field
+from test.test_rothermel import random_input
+
+
+# grass and shrub models which spread quickly, and a non-burnable one
+FAST_FUELS = [91, 102, 104, 107, 122, 145, 147]
+
+
+def random_landscape(rows, cols, patch=5, seed=0):
+    """
+    Build a landscape of square patches of fast fuels, with random tan_phi in dim 5
+    """
+    INPUT, FUEL = random_input(-(-rows // patch), -(-cols // patch), seed, codes=FAST_FUELS)
+    INPUT = np.repeat(np.repeat(INPUT, patch, axis=0), patch, axis=1)[:rows, :cols].copy()
+    FUEL = np.repeat(np.repeat(FUEL, patch, axis=0), patch, axis=1)[:rows, :cols].copy()
+    INPUT[..., 5] = np.random.default_rng(seed).normal(scale=0.1, size=FUEL.shape)
+    return INPUT, FUEL
+
+
+def burnable_center(INPUT):
+    """
+    The burnable cell closest to the middle of the landscape
+    """
+    cells = np.argwhere(INPUT[..., 1] > 0)
+    return tuple(cells[np.argmin(np.abs(cells - np.array(INPUT.shape[:2]) / 2).sum(axis=1))])
+
+
+class PropagationTests(unittest.TestCase):
+
+    def test_engines_agree(self):
+        """
+        GIVEN random landscapes, winds and ignition cells
+        WHEN the compiled and pure-Python engines burn for the same number of minutes
+        THEN they burn exactly the same cells
+        """
+        for seed, wind_dir in enumerate([0.3, 2.0, 4.1]):
+            INPUT, FUEL = random_landscape(40, 40, seed=seed)
+            i_start, j_start = burnable_center(INPUT)
+            expected = spread(INPUT, FUEL, i_start, j_start, 500., wind_dir, 60)
+            burned = propagate(INPUT, FUEL, i_start, j_start, 500., wind_dir, 60)
+            self.assertGreater(expected.sum(), 1)
+            np.testing.assert_array_equal(expected, burned)
+
+    def test_progress(self):
+        """
+        GIVEN progress arrays handed to both engines
+        WHEN they burn until the fire dies out
+        THEN both report the same minutes, frontier size and burned cells
+        """
+        INPUT, FUEL = random_landscape(12, 12, patch=12, seed=0)
+        i_start, j_start = burnable_center(INPUT)
+        progress, expected = np.zeros(PROGRESS_SIZE, dtype=np.int64), np.zeros(PROGRESS_SIZE, dtype=np.int64)
+        burned = propagate(INPUT, FUEL, i_start, j_start, 500., 0.3, 500, PROGRESS=progress)
+        spread(INPUT, FUEL, i_start, j_start, 500., 0.3, 500, PROGRESS=expected)
+        np.testing.assert_array_equal(expected, progress)
+        self.assertEqual(burned.sum(), progress[PROGRESS_BURNED])
+        self.assertLess(progress[PROGRESS_MINUTE], 500)
+        self.assertEqual(0, progress[PROGRESS_FRONTIER])
+
+    def test_cancel(self):
+        """
+        GIVEN progress arrays with their cancel flag set, as a simulator does to a burn it gives up on
+        WHEN both engines burn with them
+        THEN both stop before burning a minute, raising BurnCancelled
+        """
+        INPUT, FUEL = random_landscape(12, 12, patch=12, seed=0)
+        i_start, j_start = burnable_center(INPUT)
+        for engine in (propagate, spread):
+            progress = np.zeros(PROGRESS_SIZE, dtype=np.int64)
+            progress[PROGRESS_CANCEL] = 1
+            with self.assertRaises(BurnCancelled):
+                engine(INPUT, FUEL, i_start, j_start, 500., 0.3, 500, PROGRESS=progress)
+            self.assertEqual(0, progress[PROGRESS_MINUTE])
+
+    def test_retirement(self):
+        """
+        GIVEN a fire lit along one side of a patch fenced in by unburnable fuel, which reaches every cell of the patch
+        WHEN both engines burn it for far longer
+        THEN they record the same minutes, and the fire goes out within a sweep of its last cell catching, the points
+             of cells fire closed in on being retired rather than spreading over burned ground until the end
+        """
+        INPUT, FUEL = random_landscape(30, 30, seed=2)
+        FUEL[:3], FUEL[-3:], FUEL[:, :3], FUEL[:, -3:] = 91, 91, 91, 91
+        i_starts, j_starts = np.arange(3, 27), np.full(24, 3)
+        ARRIVAL, expected = arrival_raster(FUEL.shape, 1000), arrival_raster(FUEL.shape, 1000)
+        progress = np.zeros(PROGRESS_SIZE, dtype=np.int64)
+        propagate(INPUT, FUEL, i_starts, j_starts, 500., 0.3, 1000, PROGRESS=progress, ARRIVAL=ARRIVAL)
+        spread(INPUT, FUEL, i_starts, j_starts, 500., 0.3, 1000, ARRIVAL=expected)
+        np.testing.assert_array_equal(expected, ARRIVAL)
+        self.assertFalse(np.any((ARRIVAL < 0) & ~np.isin(FUEL, NON_BURNABLE)))
+        self.assertEqual(0, progress[PROGRESS_FRONTIER])
+        self.assertLessEqual(progress[PROGRESS_MINUTE], ARRIVAL.max() + CLOSE_EVERY + 1)
+
+    def test_retirement_is_exact(self):
+        """
+        GIVEN fires whose spread was cut off by retiring the points of every cell surrounded by burned ground
+        WHEN both engines burn them, closing cells, and the pure-Python one burns them again closing none
+        THEN all record the same minutes and escapes, fewer points spreading where cells were closed
+        """
+        frontiers = []
+        for seed, wind_dir, mins in ((5, 2.0, 200), (4, 4.1, 200), (0, 2.0, 60)):
+            INPUT, FUEL = random_landscape(60, 60, seed=seed)
+            i_start, j_start = burnable_center(INPUT)
+            ARRIVAL, retired, expected = (arrival_raster(FUEL.shape, mins) for _ in range(3))
+            ESCAPED, escaped, expected_escaped = (np.zeros(ESCAPED_SIZE, dtype=bool) for _ in range(3))
+            progress, expected_progress = (np.zeros(PROGRESS_SIZE, dtype=np.int64) for _ in range(2))
+            propagate(INPUT, FUEL, i_start, j_start, 500., wind_dir, mins, PROGRESS=progress, ARRIVAL=ARRIVAL,
+                      ESCAPED=ESCAPED)
+            spread(INPUT, FUEL, i_start, j_start, 500., wind_dir, mins, ARRIVAL=retired, ESCAPED=escaped)
+            with mock.patch("modeling.farsite.close_cells"):
+                spread(INPUT, FUEL, i_start, j_start, 500., wind_dir, mins, PROGRESS=expected_progress,
+                       ARRIVAL=expected, ESCAPED=expected_escaped)
+            np.testing.assert_array_equal(expected, ARRIVAL)
+            np.testing.assert_array_equal(expected, retired)
+            np.testing.assert_array_equal(expected_escaped, ESCAPED)
+            np.testing.assert_array_equal(expected_escaped, escaped)
+            frontiers.append((progress[PROGRESS_FRONTIER], expected_progress[PROGRESS_FRONTIER]))
+        self.assertTrue(all(frontier <= expected for frontier, expected in frontiers))
+        self.assertTrue(any(frontier < expected for frontier, expected in frontiers))
+
+    def test_engines_agree_on_fine_grids(self):
+        """
+        GIVEN a landscape with GS3 fuel, whose spread rate is so small its grid dimension overflows any integer
+        WHEN the compiled and pure-Python engines burn through it
+        THEN they still burn exactly the same cells
+        """
+        INPUT, FUEL = random_input(8, 8, seed=2, codes=[102, 104, 123, 145])
+        INPUT = np.repeat(np.repeat(INPUT, 4, axis=0), 4, axis=1).copy()
+        FUEL = np.repeat(np.repeat(FUEL, 4, axis=0), 4, axis=1).copy()
+        i_start, j_start = burnable_center(INPUT)
+        expected = spread(INPUT, FUEL, i_start, j_start, 300., 3.1, 60)
+        burned = propagate(INPUT, FUEL, i_start, j_start, 300., 3.1, 60)
+        self.assertTrue(np.any(FUEL[expected] == 123))
+        np.testing.assert_array_equal(expected, burned)
+
+    def test_engines_agree_on_wind_rasters(self):
+        """
+        GIVEN a wind which turns and strengthens across the landscape
+        WHEN the compiled and pure-Python engines burn with it
+        THEN they burn exactly the same cells, which differ from a burn in the uniform wind at the ignition
+        """
+        INPUT, FUEL = random_landscape(40, 40, seed=1)
+        i_start, j_start = burnable_center(INPUT)
+        rows, cols = np.mgrid[0:40, 0:40]
+        WIND_SPEED = (200. + 20 * cols).astype(np.float32)
+        WIND_DIR = (0.1 * rows).astype(np.float32)
+        expected = spread(INPUT, FUEL, i_start, j_start, WIND_SPEED, WIND_DIR, 60)
+        burned = propagate(INPUT, FUEL, i_start, j_start, WIND_SPEED, WIND_DIR, 60)
+        np.testing.assert_array_equal(expected, burned)
+        uniform = propagate(INPUT, FUEL, i_start, j_start, float(WIND_SPEED[i_start, j_start]),
+                            float(WIND_DIR[i_start, j_start]), 60)
+        self.assertFalse(np.array_equal(uniform, burned))
+
+
+    def test_engines_agree_on_timelines(self):
+        """
+        GIVEN weather which changes several times during a burn, on landscapes of fast and of very slow fuels
+        WHEN the compiled and pure-Python engines burn through it
+        THEN they burn exactly the same cells, which differ from a burn in the first weather throughout
+        """
+        for seed, codes in enumerate([FAST_FUELS, [102, 104, 123, 145]]):
+            INPUT, FUEL = random_input(10, 10, seed=seed, codes=codes)
+            INPUT = np.repeat(np.repeat(INPUT, 4, axis=0), 4, axis=1).copy()
+            FUEL = np.repeat(np.repeat(FUEL, 4, axis=0), 4, axis=1).copy()
+            i_start, j_start = burnable_center(INPUT)
+            rng = np.random.default_rng(seed)
+            timeline = [(minute, rng.uniform(100, 900), rng.uniform(0, 2 * np.pi), rng.normal(0, .1, FUEL.shape))
+                        for minute in [50, 10, 25, 26]]
+            expected = spread(INPUT, FUEL, i_start, j_start, 500., 0.3, 80, timeline=timeline)
+            burned = propagate(INPUT, FUEL, i_start, j_start, 500., 0.3, 80, timeline=timeline)
+            np.testing.assert_array_equal(expected, burned)
+            self.assertFalse(np.array_equal(propagate(INPUT, FUEL, i_start, j_start, 500., 0.3, 80), burned))
+
+    def test_timeline_from_ignition(self):
+        """
+        GIVEN a timeline whose first weather holds from before the ignition
+        WHEN it is burned
+        THEN it burns as if that weather had been given as the wind
+        """
+        INPUT, FUEL = random_landscape(30, 30, seed=3)
+        i_start, j_start = burnable_center(INPUT)
+        expected = propagate(INPUT, FUEL, i_start, j_start, 700., 2.0, 40)
+        timeline = [(-30, 100., 5.0, INPUT[..., 5]), (0, 700., 2.0, INPUT[..., 5])]
+        np.testing.assert_array_equal(expected, propagate(INPUT, FUEL, i_start, j_start, 300., 0.3, 40,
+                                                          timeline=timeline))
+        np.testing.assert_array_equal(expected, spread(INPUT, FUEL, i_start, j_start, 300., 0.3, 40,
+                                                       timeline=timeline))
+
+    def test_weather_segments(self):
+        """
+        GIVEN a change of weather and wetter fuel, on a landscape of fast and of very slow fuels
+        WHEN the spread rates of its segments are precomputed
+        THEN every cell spreads as compute_surface_spread has it under that segment's wind and slope, the slow fuels
+             too, and the landscape is left untouched
+        """
+        INPUT, FUEL = random_input(6, 6, seed=2, codes=[91, 102, 123, 145])
+        INPUT.flags.writeable = False
+        SLOPE = np.random.default_rng(0).normal(0, .1, FUEL.shape)
+        segments = weather_segments(INPUT, 500., 0.3, INPUT[..., 5], [(20, 300., 2.0, SLOPE)], moisture=1.2)
+        self.assertEqual([0, 20], [minute for minute, *_ in segments])
+        for (_, RATE, WIND_DIR), wind_speed, TAN_PHI in zip(segments, [500., 300.], [INPUT[..., 5], SLOPE]):
+            self.assertEqual(np.float64, RATE.dtype)
+            self.assertFalse(RATE.flags.writeable)
+            EXPECTED = np.zeros(FUEL.shape)
+            for i, j in np.argwhere(FUEL != 91):
+                inputs = np.array(INPUT[i, j], dtype=np.float64)
+                inputs[4] = min(inputs[4] * 1.2, MOISTURE_CEILING * inputs[3])
+                inputs[5] = np.float32(TAN_PHI[i, j])
+                EXPECTED[i, j] = compute_surface_spread(inputs, wind_speed)
+            np.testing.assert_allclose(RATE, EXPECTED, rtol=1e-5, atol=0)
+        self.assertTrue(np.any((segments[0][1] > 0) & (segments[0][1] < 1e-40)))
+
+    def test_fuel_constants(self):
+        """
+        GIVEN the fuel constants table of FUEL_DIC.csv, loaded through the per process cache
+        WHEN the compiled and pure-Python engines take their spread rates from it through a change of weather
+        THEN they burn exactly the same cells as with the full Rothermel equations, and the table is loaded once
+        """
+        _FUEL_CONSTANTS.clear()
+        table = cached_fuel_constants()
+        self.assertIs(table, cached_fuel_constants(PATH_FUELDICT))
+        self.assertFalse(any(array.flags.writeable for array in table))
+
+        INPUT, FUEL = random_landscape(40, 40, seed=4)
+        i_start, j_start = burnable_center(INPUT)
+        timeline = [(20, 300., 4.0, INPUT[..., 5])]
+        tabled = weather_segments(INPUT, 500., 2.0, INPUT[..., 5], timeline, 1.1, FUEL, table)
+        full = weather_segments(INPUT, 500., 2.0, INPUT[..., 5], timeline, 1.1)
+        for (_, RATE, _), (_, EXPECTED, _) in zip(tabled, full):
+            np.testing.assert_allclose(RATE, EXPECTED, rtol=1e-4)
+        expected = propagate(INPUT, FUEL, i_start, j_start, 500., 2.0, 40, timeline=timeline, moisture=1.1)
+        for engine in (propagate, spread):
+            np.testing.assert_array_equal(expected, engine(INPUT, FUEL, i_start, j_start, 500., 2.0, 40,
+                                                           timeline=timeline, moisture=1.1, table=table))
+
+    def test_arrival(self):
+        """
+        GIVEN arrival rasters handed to both engines, burning through a change of weather
+        WHEN they burn for 60 minutes
+        THEN they record the same minutes, and the cells which arrived by any minute are those a burn
+             of that many minutes returns
+        """
+        INPUT, FUEL = random_landscape(40, 40, seed=5)
+        i_start, j_start = burnable_center(INPUT)
+        timeline = [(25, 800., 4.0, INPUT[..., 5])]
+        ARRIVAL, expected = arrival_raster(FUEL.shape, 60), arrival_raster(FUEL.shape, 60)
+        burned = propagate(INPUT, FUEL, i_start, j_start, 500., 0.3, 60, timeline=timeline, ARRIVAL=ARRIVAL)
+        spread(INPUT, FUEL, i_start, j_start, 500., 0.3, 60, timeline=timeline, ARRIVAL=expected)
+
+        self.assertEqual(np.int16, ARRIVAL.dtype)
+        self.assertEqual(np.int32, arrival_raster(FUEL.shape, 40000).dtype)
+        np.testing.assert_array_equal(expected, ARRIVAL)
+        np.testing.assert_array_equal(burned, ARRIVAL >= 0)
+        self.assertEqual(0, ARRIVAL[i_start, j_start])
+        for minute in [1, 10, 25, 26, 40]:
+            np.testing.assert_array_equal(propagate(INPUT, FUEL, i_start, j_start, 500., 0.3, minute,
+                                                    timeline=timeline), (ARRIVAL >= 0) & (ARRIVAL <= minute))
+
+
+    def test_ignitions(self):
+        """
+        GIVEN several ignitions lit at different minutes, one of them twice, one in unburnable fuel and one as the
+              burn ends
+        WHEN both engines burn them as one fire
+        THEN they record the same minutes, each cell's being the earliest any ignition alone would bring fire to it
+        """
+        INPUT, FUEL = random_landscape(40, 40, seed=3)
+        BURNABLE = np.argwhere(INPUT[..., 1] > 0)
+        (i1, j1), (i2, j2), (i3, j3) = BURNABLE[np.random.default_rng(3).choice(len(BURNABLE), 3, replace=False)]
+        i_nb, j_nb = np.argwhere(INPUT[..., 1] == 0)[0]
+        I, J = [i2, i1, i_nb, i2, i3], [j2, j1, j_nb, j2, j3]
+        starts = [12, 0, 0, 5, 40]
+
+        ARRIVAL, expected = arrival_raster(FUEL.shape, 40), arrival_raster(FUEL.shape, 40)
+        progress = np.zeros(PROGRESS_SIZE, dtype=np.int64)
+        propagate(INPUT, FUEL, I, J, 500., 2.0, 40, ARRIVAL=ARRIVAL, starts=starts, PROGRESS=progress)
+        spread(INPUT, FUEL, I, J, 500., 2.0, 40, ARRIVAL=expected, starts=starts)
+        np.testing.assert_array_equal(expected, ARRIVAL)
+        self.assertEqual((ARRIVAL >= 0).sum(), progress[PROGRESS_BURNED])
+
+        earliest = np.full(FUEL.shape, np.iinfo(np.int16).max)
+        for i, j, start in [(i1, j1, 0), (i2, j2, 5), (i3, j3, 40)]:
+            alone = arrival_raster(FUEL.shape, 40)
+            propagate(INPUT, FUEL, i, j, 500., 2.0, 40 - start, ARRIVAL=alone)
+            earliest = np.where(alone >= 0, np.minimum(earliest, alone + start), earliest)
+        np.testing.assert_array_equal(np.where(earliest < np.iinfo(np.int16).max, earliest, -1), ARRIVAL)
+        self.assertEqual(40, ARRIVAL[i3, j3])
+        self.assertEqual(-1, ARRIVAL[i_nb, j_nb])
+
+        with self.assertRaises(ValueError):
+            propagate(INPUT, FUEL, I, J, 500., 2.0, 40, starts=[0, 1])
+
+    def test_moisture(self):
+        """
+        GIVEN fuel moisture scaled down and up, far enough up to pass the extinction moisture if it were not held
+        WHEN the compiled and pure-Python engines burn with it
+        THEN they burn exactly the same cells, fewer the wetter the fuel, and the landscape is left untouched
+        """
+        INPUT, FUEL = random_landscape(40, 40, seed=1)
+        INPUT.flags.writeable = False
+        i_start, j_start = burnable_center(INPUT)
+        burned = []
+        for moisture in [.7, 1., 1.3, 5.]:
+            expected = spread(INPUT, FUEL, i_start, j_start, 500., 2.0, 60, moisture=moisture)
+            burned.append(propagate(INPUT, FUEL, i_start, j_start, 500., 2.0, 60, moisture=moisture))
+            np.testing.assert_array_equal(expected, burned[-1])
+        self.assertEqual(sorted(mask.sum() for mask in burned)[::-1], [mask.sum() for mask in burned])
+        self.assertGreater(burned[0].sum(), burned[1].sum())
+        self.assertGreater(burned[1].sum(), burned[2].sum())
+
+    def test_window(self):
+        """
+        GIVEN the window fire_window bounds a burn on a flat landscape by, and a window cut too small
+        WHEN both engines burn on each of them
+        THEN on the bound they burn what they burn on the whole landscape and nothing escapes; on the small window
+             both report the same sides escaped
+        """
+        INPUT, FUEL = random_landscape(80, 80, seed=2)
+        # flat, so dim 5 is both the elevation fire_window reads and the tan_phi the engines read
+        INPUT[..., 5] = 0
+        i_start, j_start = burnable_center(INPUT)
+        expected = propagate(INPUT, FUEL, i_start, j_start, 500., 2.0, 15)
+
+        i0, i1, j0, j1 = fire_window(INPUT, FUEL, i_start, j_start, 15, 500.)
+        self.assertLess((i1 - i0) * (j1 - j0), FUEL.size)
+        self.assertEqual(expected.sum(), expected[i0:i1, j0:j1].sum())
+        small = (i_start - 2, i_start + 3, j_start - 2, j_start + 3)
+        for (i0, i1, j0, j1), escapes in [((i0, i1, j0, j1), False), (small, True)]:
+            escaped = []
+            for engine in (propagate, spread):
+                ESCAPED = np.zeros(ESCAPED_SIZE, dtype=bool)
+                burned = engine(INPUT[i0:i1, j0:j1], FUEL[i0:i1, j0:j1], i_start - i0, j_start - j0, 500., 2.0, 15,
+                                ESCAPED=ESCAPED)
+                escaped.append(ESCAPED)
+            np.testing.assert_array_equal(escaped[0], escaped[1])
+            self.assertEqual(escapes, escaped[0].any())
+            if not escapes:
+                np.testing.assert_array_equal(expected[i0:i1, j0:j1], burned)
+
+
+class WindFieldTests(unittest.TestCase):
+
+    def setUp(self):
+        self.X, self.Y = np.linspace(-122, -121, 30), np.linspace(37, 38, 20)
+
+    def test_interpolation(self):
+        """
+        GIVEN stations on the grid
+        WHEN their winds are interpolated
+        THEN cells on a station take its wind, opposing winds cancel halfway between them, and a lone station
+             blows everywhere
+        """
+        SPEED, DIR = wind_field(self.X, self.Y, [self.X[0], self.X[-1]], [self.Y[10], self.Y[10]], [10, 10], [90, 270])
+        self.assertEqual((30, 20), SPEED.shape)
+        self.assertEqual(np.float32, SPEED.dtype)
+        self.assertAlmostEqual(10, SPEED[0, 10], places=4)
+        self.assertAlmostEqual(90, DIR[0, 10], places=3)
+        self.assertAlmostEqual(270, DIR[-1, 10], places=3)
+        self.assertLess(SPEED[14:16, 10].max(), SPEED[0, 10] / 5)
+
+        SPEED, DIR = wind_field(self.X, self.Y, [-121.5, np.nan], [37.5, 37.5], [7, 3], [350, 10])
+        np.testing.assert_allclose(7, SPEED, rtol=1e-5)
+        np.testing.assert_allclose(350, DIR, rtol=1e-5)
+        with self.assertRaises(ValueError):
+            wind_field(self.X, self.Y, [np.nan], [37.5], [7], [350])
+
+    def test_cache(self):
+        """
+        GIVEN stations around a landscape
+        WHEN its wind field is requested twice in an hour, then in the next hour
+        THEN the stations are fetched once an hour, and the field is read-only and in the engine's units
+        """
+        stations = pd.DataFrame({"longitude": [-122.5, -120.5], "latitude": [37., 38.], "wind_speed_kt": [10., 10.],
+                                 "wind_dir_degrees": [90., 90.]})
+        ELEV = np.random.default_rng(0).uniform(0, 100, (30, 20))
+        _WIND_FIELDS.clear()
+        with mock.patch("modeling.farsite.CurrentWeather.covering", return_value=mock.Mock(data=stations)) as covering:
+            WIND_SPEED, WIND_DIR, TAN_PHI = cached_wind_field(self.X, self.Y, ELEV, "abc", clock=lambda: 3600 * 5.5)
+            self.assertIs(WIND_SPEED, cached_wind_field(self.X, self.Y, ELEV, "abc", clock=lambda: 3600 * 5.9)[0])
+            self.assertEqual(1, covering.call_count)
+            cached_wind_field(self.X, self.Y, ELEV, "abc", clock=lambda: 3600 * 6.1)
+            self.assertEqual(2, covering.call_count)
+            self.assertEqual(1, len(_WIND_FIELDS))
+        _WIND_FIELDS.clear()
+
+        np.testing.assert_allclose(1012.69, WIND_SPEED, rtol=1e-4)
+        np.testing.assert_allclose(np.pi / 2, WIND_DIR, rtol=1e-4)
+        np.testing.assert_array_equal(compute_slope(ELEV, 90), TAN_PHI)
+        self.assertFalse(WIND_SPEED.flags.writeable or WIND_DIR.flags.writeable or TAN_PHI.flags.writeable)
+
+
+class SlopeTests(unittest.TestCase):
+
+    def setUp(self):
+        # non-square on purpose, the old edge fill assumed square rasters
+        self.ELEV = np.random.default_rng(0).uniform(0, 500, (7, 11))
+
+    def test_sector_stencil(self):
+        """
+        GIVEN a non-square elevation raster
+        WHEN tan_phi is computed for winds in every sector
+        THEN interior cells hold the rise to the downwind neighbour of the original elevation, edges copy the interior
+        """
+        for wind_dir in range(0, 360, 15):
+            ip, jp = wind_sector(wind_dir)
+            tan_phi = compute_slope(self.ELEV, wind_dir)
+            self.assertEqual(self.ELEV.shape, tan_phi.shape)
+            for i in range(1, self.ELEV.shape[0] - 1):
+                for j in range(1, self.ELEV.shape[1] - 1):
+                    self.assertAlmostEqual((self.ELEV[i + ip, j + jp] - self.ELEV[i, j]) / 30, tan_phi[i, j], places=4)
+            np.testing.assert_array_equal(tan_phi[0, 1:-1], tan_phi[1, 1:-1])
+            np.testing.assert_array_equal(tan_phi[:, -1], tan_phi[:, -2])
+
+    def test_sector_raster(self):
+        """
+        GIVEN wind direction rasters, uniform and varying
+        WHEN tan_phi is computed from them
+        THEN a uniform raster gives the scalar wind's slope, and every cell of a varying one follows its own wind
+        """
+        for wind_dir in [10, 100, 200, 300]:
+            np.testing.assert_array_equal(compute_slope(self.ELEV, wind_dir),
+                                          compute_slope(self.ELEV, np.full(self.ELEV.shape, wind_dir, np.float32)))
+
+        WIND_DIR = np.random.default_rng(1).uniform(0, 360, self.ELEV.shape)
+        tan_phi = compute_slope(self.ELEV, WIND_DIR)
+        for i in range(1, self.ELEV.shape[0] - 1):
+            for j in range(1, self.ELEV.shape[1] - 1):
+                self.assertEqual(compute_slope(self.ELEV, WIND_DIR[i, j])[i, j], tan_phi[i, j])
+
+    def test_gradient(self):
+        """
+        GIVEN a tilted plane rising towards the last column
+        WHEN tan_phi is computed from the gradient
+        THEN it is the full rise along the columns and none across them
+        """
+        ELEV = np.tile(np.arange(11) * 3., (7, 1))
+        np.testing.assert_allclose(0.1, compute_slope(ELEV, 0, method="gradient"), atol=1e-6)
+        np.testing.assert_allclose(0, compute_slope(ELEV, 90, method="gradient"), atol=1e-6)
+        np.testing.assert_allclose(-0.1, compute_slope(ELEV, 180, method="gradient"), atol=1e-6)
+
+    def test_cache(self):
+        """
+        GIVEN a slope cache directory
+        WHEN slopes are requested for several winds, then again from a fresh process
+        THEN winds in one sector share a raster, every result matches compute_slope, and rasters are reused from disk
+        """
+        with tempfile.TemporaryDirectory() as path_cache:
+            for method in ["sector", "gradient"]:
+                for wind_dir in [10, 340, 45, 200]:
+                    np.testing.assert_allclose(compute_slope(self.ELEV, wind_dir, method=method),
+                                               cached_slope(self.ELEV, wind_dir, "abc", method, path_cache), atol=1e-6)
+            self.assertIs(cached_slope(self.ELEV, 10, "abc"), cached_slope(self.ELEV, 340, "abc"))
+            self.assertEqual(5, len(os.listdir(path_cache)))
+
+            _SLOPES.clear()
+            tan_phi = cached_slope(np.zeros_like(self.ELEV), 45, "abc", path_cache=path_cache)
+            np.testing.assert_array_equal(compute_slope(self.ELEV, 45), tan_phi)
+            self.assertIsNot(tan_phi, cached_slope(self.ELEV, 45, "def"))
+            _SLOPES.clear()
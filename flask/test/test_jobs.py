@@ -0,0 +1,115 @@
+from concurrent.futures import Future
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from modeling.jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobNotDone, JobStore, JobStoreFull
+from modeling.results import BurnedCells, from_binary, to_binary, to_geojson
+
+
+class FakeSimulator:
+    """
+    Stands in for Simulator, jobs only finish when the test says so
+    """
+
+    def __init__(self):
+        self.futures, self.running, self.snapshots = {}, {}, {}
+
+    def submit(self, lat, lon, job=None, **kwargs):
+        self.futures[job] = Future()
+        return self.futures[job]
+
+    def progress(self, job):
+        return self.running.get(job)
+
+    def snapshot(self, job):
+        return self.snapshots.get(job)
+
+
+class JobStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.simulator = FakeSimulator()
+        self.jobs = JobStore(self.simulator, max_jobs=2, ttl=10, clock=lambda: self.now)
+        self.fires = pd.DataFrame({"x": [-121.5, -121.6], "y": [37.1, 37.2]})
+
+    def test_lifecycle(self):
+        """
+        GIVEN a submitted job
+        WHEN it is polled while queued, running and after it finishes
+        THEN its state, progress and result follow the simulation
+        """
+        job_id = self.jobs.submit(37.1, -121.5, mins=30)
+        self.assertEqual(JOB_QUEUED, self.jobs.status(job_id)["state"])
+        with self.assertRaises(JobNotDone):
+            self.jobs.result(job_id)
+
+        self.simulator.running[1] = np.array([12, 40, 7])
+        status = self.jobs.status(job_id)
+        self.assertEqual((JOB_RUNNING, 12, 40, 7),
+                         (status["state"], status["minute"], status["frontier"], status["burned"]))
+
+        self.simulator.futures[1].set_result(self.fires)
+        status = self.jobs.status(job_id)
+        self.assertEqual((JOB_DONE, 12, 2), (status["state"], status["minute"], status["burned"]))
+        self.assertIs(self.fires, self.jobs.result(job_id))
+
+        other = self.jobs.submit(37.1, -121.5)
+        self.simulator.futures[2].set_exception(ValueError("no fuel"))
+        self.assertEqual((JOB_FAILED, "no fuel"), (self.jobs.status(other)["state"], self.jobs.status(other)["error"]))
+        with self.assertRaises(ValueError):
+            self.jobs.result(other)
+
+    def test_perimeter(self):
+        """
+        GIVEN a running job whose worker has published the cells burned so far
+        WHEN its status is polled with and without its perimeter
+        THEN the perimeter of those cells is given only when asked for, and only once they are published
+        """
+        job_id = self.jobs.submit(37.1, -121.5, mins=30)
+        self.simulator.running[1] = np.array([12, 40, 4])
+        self.assertNotIn("perimeter", self.jobs.status(job_id, perimeter=True))
+
+        FIRES = np.zeros((5, 5), dtype=bool)
+        FIRES[1:3, 1:3] = True
+        self.simulator.snapshots[1] = BurnedCells.from_mask(FIRES, np.linspace(-122, -121.6, 5),
+                                                            np.linspace(37, 37.4, 5))
+        self.assertNotIn("perimeter", self.jobs.status(job_id))
+        perimeter = self.jobs.status(job_id, perimeter=True)["perimeter"]
+        self.assertEqual(4, perimeter["features"][0]["properties"]["cells"])
+        self.assertEqual("MultiPolygon", perimeter["features"][0]["geometry"]["type"])
+
+    def test_bounds_and_expiry(self):
+        """
+        GIVEN a store of two jobs with a ten second TTL
+        WHEN more jobs are submitted, and time passes
+        THEN unfinished jobs are never evicted, the oldest finished job makes room, and finished jobs expire
+        """
+        first, second = self.jobs.submit(37.1, -121.5), self.jobs.submit(37.1, -121.5)
+        with self.assertRaises(JobStoreFull):
+            self.jobs.submit(37.1, -121.5)
+
+        self.simulator.futures[1].set_result(self.fires)
+        third = self.jobs.submit(37.1, -121.5)
+        with self.assertRaises(KeyError):
+            self.jobs.status(first)
+
+        self.simulator.futures[2].set_result(self.fires)
+        self.now = 5.
+        self.assertEqual(JOB_DONE, self.jobs.status(second)["state"])
+        self.now = 11.
+        with self.assertRaises(KeyError):
+            self.jobs.status(second)
+        self.assertEqual(JOB_QUEUED, self.jobs.status(third)["state"])
+
+    def test_serialization(self):
+        """
+        GIVEN burned cells
+        WHEN they are serialized as GeoJSON or binary
+        THEN both hold every cell's longitude and latitude
+        """
+        geojson = to_geojson(self.fires)
+        self.assertEqual([[-121.5, 37.1], [-121.6, 37.2]], geojson["features"][0]["geometry"]["coordinates"])
+        np.testing.assert_allclose(self.fires[["x", "y"]].to_numpy(), from_binary(to_binary(self.fires)), rtol=1e-6)
@@ -0,0 +1,126 @@
+import multiprocessing
+import unittest
+
+import numpy as np
+
+from modeling.results import (BurnedCells, from_bitmask, from_rle, perimeter, read_snapshot, snapshot_arrival,
+                              to_bitmask, to_isochrones, to_perimeter, to_rle)
+
+
+def shoelace(ring):
+    """
+    Signed area of a ring, positive if it runs counterclockwise
+    """
+    return (np.dot(ring[:, 0], np.roll(ring[:, 1], -1)) - np.dot(ring[:, 1], np.roll(ring[:, 0], -1))) / 2
+
+
+class BurnedCellsTests(unittest.TestCase):
+
+    def setUp(self):
+        # a ring of burned cells around an unburned hole, and a cell touching it only at a corner
+        self.FIRES = np.zeros((7, 9), dtype=bool)
+        self.FIRES[1:5, 1:5] = True
+        self.FIRES[2:4, 2:4] = False
+        self.FIRES[5, 5] = True
+        # latitudes run south, as in most rasters
+        self.X, self.Y = np.linspace(-122, -121.4, 7), np.linspace(38, 37.2, 9)
+        self.cells = BurnedCells.from_mask(self.FIRES, self.X, self.Y)
+
+    def test_conversions(self):
+        """
+        GIVEN burned cells packed from a mask
+        WHEN they are converted back to a mask and to longitudes and latitudes
+        THEN the mask is the original and every burned cell's coordinates are listed once
+        """
+        self.assertEqual(np.uint32, self.cells.CELLS.dtype)
+        self.assertEqual(self.FIRES.sum(), len(self.cells))
+        np.testing.assert_array_equal(self.FIRES, self.cells.mask())
+
+        latlon = self.cells.latlon()
+        expected = {(self.X[i], self.Y[j]) for i, j in zip(*np.nonzero(self.FIRES))}
+        self.assertEqual(expected, set(zip(latlon["x"], latlon["y"])))
+
+    def test_rasters(self):
+        """
+        GIVEN burned cells, some and none
+        WHEN they are serialized bit-packed and run-length encoded
+        THEN both read back as the mask on the same grid, the encoding of a small fire being smaller
+        """
+        for FIRES in [self.FIRES, np.zeros_like(self.FIRES), np.ones_like(self.FIRES)]:
+            cells = BurnedCells.from_mask(FIRES, self.X, self.Y)
+            for to, read in [(to_bitmask, from_bitmask), (to_rle, from_rle)]:
+                mask, X, Y = read(to(cells))
+                np.testing.assert_array_equal(FIRES, mask)
+                np.testing.assert_allclose(self.X, X)
+                np.testing.assert_allclose(self.Y, Y)
+
+        large = np.zeros((200, 200), dtype=bool)
+        large[90:110, 90:110] = True
+        cells = BurnedCells.from_mask(large, np.arange(200.), np.arange(200.))
+        self.assertLess(len(to_rle(cells)), len(to_bitmask(cells)))
+
+    def test_perimeter(self):
+        """
+        GIVEN a burned ring around a hole, and a cell touching it at a corner
+        WHEN their exact perimeter is traced, then simplified
+        THEN the exact perimeter is two polygons, outer boundaries counterclockwise and the hole clockwise, covering
+             the burned cells' area; simplification drops the one cell hole
+        """
+        cell_area = abs((self.X[1] - self.X[0]) * (self.Y[1] - self.Y[0]))
+        polygons = perimeter(self.cells, tolerance=0)
+        self.assertEqual([1, 2], sorted(len(polygon) for polygon in polygons))
+        for polygon in polygons:
+            self.assertGreater(shoelace(polygon[0]), 0)
+            for hole in polygon[1:]:
+                self.assertLess(shoelace(hole), 0)
+        self.assertAlmostEqual(self.FIRES.sum() * cell_area,
+                               sum(shoelace(ring) for polygon in polygons for ring in polygon))
+
+        single = np.zeros((5, 5), dtype=bool)
+        single[1:4, 1:4], single[2, 2] = True, False
+        cells = BurnedCells.from_mask(single, np.arange(5.), np.arange(5.))
+        geojson = to_perimeter(cells, tolerance=1)
+        coordinates = geojson["features"][0]["geometry"]["coordinates"]
+        self.assertEqual(1, len(coordinates))
+        self.assertEqual(1, len(coordinates[0]))
+        self.assertEqual(coordinates[0][0][0], coordinates[0][0][-1])
+
+    def test_arrival(self):
+        """
+        GIVEN burned cells packed from an arrival raster
+        WHEN they are cut at several minutes, and drawn as isochrones
+        THEN the raster comes back, each cut holds the cells reached by then, and there is one perimeter per minute
+        """
+        ARRIVAL = np.full(self.FIRES.shape, -1, dtype=np.int16)
+        ARRIVAL[self.FIRES] = np.arange(self.FIRES.sum())
+        cells = BurnedCells.from_arrival(ARRIVAL, self.X, self.Y)
+        np.testing.assert_array_equal(ARRIVAL, cells.arrival())
+        window = BurnedCells.from_arrival(ARRIVAL[1:6, 1:6], self.X, self.Y, origin=(1, 1))
+        np.testing.assert_array_equal(cells.CELLS, window.CELLS)
+        np.testing.assert_array_equal(cells.MINUTES, window.MINUTES)
+        for minute in [0, 5, 12]:
+            np.testing.assert_array_equal((ARRIVAL >= 0) & (ARRIVAL <= minute), cells.by(minute).mask())
+
+        isochrones = to_isochrones(cells, [5, 12])
+        self.assertEqual([5, 12], [feature["properties"]["minute"] for feature in isochrones["features"]])
+        self.assertEqual([6, 13], [feature["properties"]["cells"] for feature in isochrones["features"]])
+
+    def test_snapshot(self):
+        """
+        GIVEN a shared buffer, never written, then holding the arrival raster of a window while it is burned
+        WHEN it is read, and a window too large for it is published in its place
+        THEN nothing is read at first, then the cells burned so far, then nothing again
+        """
+        SNAPSHOT = multiprocessing.RawArray("B", 200)
+        self.assertIsNone(read_snapshot(SNAPSHOT, self.X, self.Y))
+
+        ARRIVAL = snapshot_arrival(SNAPSHOT, (1, 6, 1, 6), np.int16)
+        self.assertEqual((5, 5), ARRIVAL.shape)
+        self.assertEqual(0, len(read_snapshot(SNAPSHOT, self.X, self.Y)))
+        ARRIVAL[self.FIRES[1:6, 1:6]] = np.arange(self.FIRES.sum())
+        cells = read_snapshot(SNAPSHOT, self.X, self.Y)
+        np.testing.assert_array_equal(self.cells.CELLS, cells.CELLS)
+        np.testing.assert_array_equal(np.arange(self.FIRES.sum()), cells.MINUTES)
+
+        self.assertIsNone(snapshot_arrival(SNAPSHOT, (0, 7, 0, 9), np.int32))
+        self.assertIsNone(read_snapshot(SNAPSHOT, self.X, self.Y))
@@ -0,0 +1,156 @@
+from concurrent.futures import Future
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from modeling.data.landscape import save_landscape
+from modeling.farsite import burn
+from modeling.models.propagation import NON_BURNABLE
+from modeling.risk import ignition_grid, open_risk, risk_map, sample_risk
+from test.test_farsite import random_landscape
+
+
+class RiskTests(unittest.TestCase):
+
+    def setUp(self):
+        self.INPUT, self.FUEL = random_landscape(20, 20, patch=4, seed=5)
+        self.INPUT[..., 5] = 0
+        self.X, self.Y = np.linspace(-122, -121.99, 20), np.linspace(37.01, 37, 20)
+
+    def test_ignition_grid(self):
+        """
+        GIVEN a landscape with patches of unburnable fuel
+        WHEN ignitions are seeded on a regular and on a stratified grid
+        THEN every ignition is in burnable fuel, at most one per block, the regular ones at block centers
+        """
+        regular = ignition_grid(self.FUEL, 5)
+        stratified = ignition_grid(self.FUEL, 5, stratified=True, seed=2)
+        np.testing.assert_array_equal(stratified, ignition_grid(self.FUEL, 5, stratified=True, seed=2))
+        self.assertTrue(np.all(regular % 5 == 2))
+        self.assertGreaterEqual(len(stratified), len(regular))
+        for ignitions in (regular, stratified):
+            self.assertGreater(len(ignitions), 0)
+            self.assertFalse(np.isin(self.FUEL[ignitions[:, 0], ignitions[:, 1]], NON_BURNABLE).any())
+            self.assertEqual(len(ignitions), len(np.unique(ignitions // 5, axis=0)))
+
+    def test_resume(self):
+        """
+        GIVEN a batch which fails part way, after a checkpoint
+        WHEN it is run again
+        THEN it burns only the remaining ignitions, and its map is that of a batch which never failed
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            save_landscape(path_landscape, self.INPUT, self.FUEL, self.X, self.Y)
+            n_ignitions = len(ignition_grid(self.FUEL, 5))
+
+            path_expected = os.path.join(directory, "expected.npz")
+            self.assertEqual(n_ignitions, risk_map(path_expected, path_landscape=path_landscape, spacing=5, mins=10,
+                                                   wind=(5., 30.)))
+
+            calls = []
+
+            def failing_burn(*args, **kwargs):
+                calls.append(args)
+                if len(calls) == 4:
+                    raise RuntimeError("worker lost")
+                return burn(*args, **kwargs)
+
+            path_checkpoint = os.path.join(directory, "risk.npz")
+            with mock.patch("modeling.risk.burn", side_effect=failing_burn):
+                with self.assertRaises(RuntimeError):
+                    risk_map(path_checkpoint, path_landscape=path_landscape, spacing=5, mins=10, wind=(5., 30.),
+                             checkpoint_every=2)
+            self.assertAlmostEqual(3 / n_ignitions, open_risk(path_checkpoint)[4])
+            self.assertEqual(n_ignitions - 3, risk_map(path_checkpoint, path_landscape=path_landscape, spacing=5,
+                                                       mins=10, wind=(5., 30.)))
+
+            RISK, MEAN_AREA, X, Y, done = open_risk(path_checkpoint)
+            for expected, actual in zip(open_risk(path_expected), (RISK, MEAN_AREA, X, Y, done)):
+                np.testing.assert_array_equal(expected, actual)
+            self.assertEqual(1., done)
+            self.assertTrue(np.all((RISK >= 0) & (RISK <= 1)) and RISK.max() > 0)
+            self.assertTrue(np.all((MEAN_AREA > 0) == (RISK > 0)))
+
+            # a batch of other settings starts over
+            self.assertEqual(n_ignitions, risk_map(path_checkpoint, path_landscape=path_landscape, spacing=5,
+                                                   mins=5, wind=(5., 30.)))
+
+    def test_resume_fetched_wind(self):
+        """
+        GIVEN a batch in the wind of the nearest station which fails part way, the station reporting anew meanwhile
+        WHEN it is run again without a wind
+        THEN it resumes in the wind it was started with, its map being that of a batch which never failed
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            save_landscape(path_landscape, self.INPUT, self.FUEL, self.X, self.Y)
+            n_ignitions = len(ignition_grid(self.FUEL, 5))
+
+            path_expected = os.path.join(directory, "expected.npz")
+            risk_map(path_expected, path_landscape=path_landscape, spacing=5, mins=10, wind=(5., 30.))
+
+            calls = []
+
+            def failing_burn(*args, **kwargs):
+                calls.append(kwargs["wind"])
+                if len(calls) == 4:
+                    raise RuntimeError("worker lost")
+                return burn(*args, **kwargs)
+
+            path_checkpoint = os.path.join(directory, "risk.npz")
+            with mock.patch("modeling.risk.burn", side_effect=failing_burn), \
+                    mock.patch("modeling.risk.nearest_wind", side_effect=[(5., 30.), (12., 200.)]) as nearest_wind:
+                with self.assertRaises(RuntimeError):
+                    risk_map(path_checkpoint, path_landscape=path_landscape, spacing=5, mins=10, checkpoint_every=2)
+                self.assertEqual(n_ignitions - 3, risk_map(path_checkpoint, path_landscape=path_landscape, spacing=5,
+                                                           mins=10))
+            self.assertEqual(1, nearest_wind.call_count)
+            self.assertEqual({(5., 30.)}, set(calls))
+            for expected, actual in zip(open_risk(path_expected), open_risk(path_checkpoint)):
+                np.testing.assert_array_equal(expected, actual)
+
+    def test_cancel(self):
+        """
+        GIVEN a batch on a simulator whose first ignition fails while the next two burn and the rest are queued
+        WHEN the failure is raised
+        THEN the queued ignitions are cancelled, and the burning ones through the simulator by their job numbers
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            save_landscape(path_landscape, self.INPUT, self.FUEL, self.X, self.Y)
+            futures, jobs = [], []
+
+            def submit(lat, lon, job, **kwargs):
+                future = Future()
+                if not futures:
+                    future.set_exception(RuntimeError("worker lost"))
+                elif len(futures) < 3:
+                    future.set_running_or_notify_cancel()
+                futures.append(future)
+                jobs.append(job)
+                return future
+
+            simulator = mock.Mock(numbers=itertools.count(-1, -1), submit=mock.Mock(side_effect=submit))
+            with self.assertRaises(RuntimeError):
+                risk_map(os.path.join(directory, "risk.npz"), path_landscape=path_landscape, spacing=5, mins=10,
+                         wind=(5., 30.), simulator=simulator)
+            self.assertEqual(len(ignition_grid(self.FUEL, 5)), len(set(jobs)))
+            self.assertTrue(all(future.cancelled() for future in futures[3:]))
+            self.assertEqual([mock.call(jobs[1]), mock.call(jobs[2])], simulator.cancel.call_args_list)
+
+    def test_sample_risk(self):
+        """
+        GIVEN a risk raster on a grid whose latitudes run south
+        WHEN it is read at points near cells and off the grid
+        THEN each point reads its nearest cell, or the nearest edge
+        """
+        RISK = np.arange(400, dtype=np.float32).reshape(20, 20)
+        lons = [self.X[3] + 1e-5, self.X[0] - 1, self.X[19]]
+        lats = [self.Y[7] - 1e-5, self.Y[5], self.Y[0] + 1]
+        np.testing.assert_array_equal([RISK[3, 7], RISK[0, 5], RISK[19, 0]],
+                                      sample_risk(RISK, self.X, self.Y, lons, lats))
@@ -0,0 +1,102 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from modeling.models.rothermel import (build_fuel_constants, compute_surface_spread, compute_surface_spread_constants,
+                                      compute_surface_spread_fuel_grid, compute_surface_spread_grid)
+
+PATH_FUELDICT = os.path.join(os.path.dirname(__file__), "..", "modeling", "data", "csv", "FUEL_DIC.csv")
+
+
+def random_input(rows, cols, seed=0, codes=None):
+    """
+    Build a small INPUT cube from random FUEL_DIC.csv fuel models, with random slopes in dim 5
+    """
+    fuels = pd.read_csv(PATH_FUELDICT)
+    if codes is not None:
+        fuels = fuels[fuels["VALUE"].isin(codes)]
+    rng = np.random.default_rng(seed)
+    picks = fuels.iloc[rng.integers(len(fuels), size=rows * cols)]
+
+    INPUT = np.zeros((rows * cols, 6), dtype=np.float32)
+    INPUT[:, 0] = picks["FuelBedDepth"]
+    INPUT[:, 1] = picks["SAV"]
+    INPUT[:, 2] = picks["OvenDryLoad"] * .0459137
+    INPUT[:, 3] = picks["Mx"] / 100
+    INPUT[:, 4] = (picks["Mx"] * .95) / 100
+    INPUT[:, 5] = rng.normal(scale=0.2, size=rows * cols)
+    return INPUT.reshape(rows, cols, 6), picks["VALUE"].to_numpy(dtype=np.float32).reshape(rows, cols)
+
+
+class SurfaceSpreadGridTests(unittest.TestCase):
+
+    def setUp(self):
+        self.INPUT, self.FUEL = random_input(20, 30)
+        self.burnable = self.INPUT[..., 1] > 0
+
+    def reference(self, wind_speed):
+        """
+        Cell-by-cell compute_surface_spread, zero where nothing burns
+        """
+        wind_speed = np.broadcast_to(wind_speed, self.FUEL.shape)
+        R = np.zeros(self.FUEL.shape)
+        for i, j in zip(*np.nonzero(self.burnable)):
+            R[i, j] = compute_surface_spread(self.INPUT[i, j], wind_speed[i, j])
+        return R
+
+    def test_scalar_wind(self):
+        """
+        GIVEN an INPUT cube and a scalar wind speed
+        WHEN the grid kernel is evaluated over the whole cube
+        THEN it matches compute_surface_spread cell by cell, as float32
+        """
+        R = compute_surface_spread_grid(self.INPUT, 500.)
+        self.assertEqual(np.float32, R.dtype)
+        self.assertEqual(self.FUEL.shape, R.shape)
+        np.testing.assert_allclose(self.reference(500.), R, rtol=1e-5, atol=1e-6)
+        self.assertTrue(np.all(R[~self.burnable] == 0))
+
+    def test_wind_field_and_cell_subsets(self):
+        """
+        GIVEN a per-cell wind field
+        WHEN the kernel is restricted to a mask or an index list
+        THEN only those cells are evaluated, matching the full-grid result
+        """
+        wind = np.random.default_rng(1).uniform(100, 800, self.FUEL.shape)
+        full = compute_surface_spread_grid(self.INPUT, wind)
+        np.testing.assert_allclose(self.reference(wind), full, rtol=1e-5, atol=1e-6)
+
+        mask = np.zeros(self.FUEL.shape, dtype=bool)
+        mask[::3, ::2] = True
+        masked = compute_surface_spread_grid(self.INPUT, wind, cells=mask)
+        np.testing.assert_array_equal(full[mask], masked[mask])
+        self.assertTrue(np.all(np.isnan(masked[~mask])))
+
+        cells = np.argwhere(mask)
+        listed = compute_surface_spread_grid(self.INPUT, wind, cells=cells)
+        np.testing.assert_array_equal(full[mask], listed)
+
+
+class FuelConstantsTests(unittest.TestCase):
+
+    def test_matches_full_equations(self):
+        """
+        GIVEN the fuel constants table built from FUEL_DIC.csv
+        WHEN spread rates are computed from it over a random landscape
+        THEN they match the full Rothermel equations, and non-burnable fuels do not spread
+        """
+        INPUT, FUEL = random_input(20, 30, seed=2)
+        FUEL_INDEX, CONSTANTS = build_fuel_constants(PATH_FUELDICT)
+        wind = np.random.default_rng(3).uniform(100, 800, FUEL.shape)
+
+        expected = compute_surface_spread_grid(INPUT, wind)
+        R = compute_surface_spread_fuel_grid(FUEL, INPUT, wind, FUEL_INDEX, CONSTANTS)
+        np.testing.assert_allclose(expected, R, rtol=1e-4, atol=1e-6)
+        self.assertTrue(np.all(R[INPUT[..., 1] == 0] == 0))
+
+        i, j = np.argwhere(INPUT[..., 1] > 0)[0]
+        self.assertAlmostEqual(compute_surface_spread(INPUT[i, j], 250.),
+                               compute_surface_spread_constants(CONSTANTS[FUEL_INDEX[int(FUEL[i, j])]],
+                                                                INPUT[i, j, 4], 250., INPUT[i, j, 5]), places=3)
@@ -0,0 +1,89 @@
+import concurrent.futures
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from modeling.data.landscape import save_landscape
+from modeling.farsite import burn
+from modeling.models.propagation import PROGRESS_MINUTE, BurnCancelled
+from modeling.simulator import Simulator
+from test.test_farsite import burnable_center, random_landscape
+
+
+class SimulatorTests(unittest.TestCase):
+
+    def test_matches_burn(self):
+        """
+        GIVEN a simulator started on a saved landscape
+        WHEN fires are submitted to it
+        THEN they burn the same cells as burn() in this process
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            INPUT, FUEL = random_landscape(30, 30, seed=5)
+            INPUT[..., 5] = 0
+            X, Y = np.linspace(-122, -121, 30), np.linspace(37, 38, 30)
+            save_landscape(path_landscape, INPUT, FUEL, X, Y)
+            i, j = burnable_center(INPUT)
+
+            simulator = Simulator(path_landscape=path_landscape, workers=1)
+            try:
+                simulator.wait_ready()
+                futures = [simulator.submit(Y[j], X[i], mins=20, wind=(wind_speed, 30.))
+                           for wind_speed in [2., 5.]]
+                for future, wind_speed in zip(futures, [2., 5.]):
+                    expected = burn(Y[j], X[i], mins=20, path_landscape=path_landscape, wind=(wind_speed, 30.))
+                    pd.testing.assert_frame_equal(expected.sort_values(["x", "y"], ignore_index=True),
+                                                  future.result().sort_values(["x", "y"], ignore_index=True))
+                self.assertGreater(len(expected), 1)
+            finally:
+                simulator.shutdown()
+
+    def test_running(self):
+        """
+        GIVEN a simulator burning a fire far longer than anyone waits for
+        WHEN the cells it has burned so far are read, and it is cancelled while it burns, or a burn of it times out,
+             or a fire is cancelled before it starts
+        THEN the cells read are those the fire reached by the minutes it had burned; each fire stops at the start of
+             its next minute, raising BurnCancelled, and frees the worker for the next
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path_landscape = os.path.join(directory, "landscape")
+            INPUT, FUEL = random_landscape(200, 200, seed=5)
+            INPUT[..., 5] = 0
+            X, Y = np.linspace(-122, -121, 200), np.linspace(37, 38, 200)
+            save_landscape(path_landscape, INPUT, FUEL, X, Y)
+            i, j = burnable_center(INPUT)
+            long_burn = dict(mins=5000, wind=(2., 30.), engine="python")
+
+            simulator = Simulator(path_landscape=path_landscape, workers=1)
+            try:
+                simulator.wait_ready()
+                future = simulator.submit(Y[j], X[i], job=1, **long_burn)
+                while simulator.progress(1) is None or simulator.progress(1)[PROGRESS_MINUTE] < 3:
+                    time.sleep(.1)
+                cells = simulator.snapshot(1)
+                self.assertIsNone(simulator.snapshot(2))
+                self.assertGreater(len(cells), 1)
+                self.assertEqual((200, 200), cells.shape)
+                self.assertTrue(cells.mask()[i, j])
+                self.assertEqual(0, cells.arrival()[i, j])
+                self.assertLessEqual(cells.MINUTES.max(), simulator.progress(1)[PROGRESS_MINUTE])
+                simulator.cancel(1)
+                self.assertRaises(BurnCancelled, future.result, timeout=60)
+                self.assertLess(simulator.progress(1)[PROGRESS_MINUTE], 5000)
+
+                with self.assertRaises(concurrent.futures.TimeoutError):
+                    simulator.burn(Y[j], X[i], timeout=1, **long_burn)
+
+                simulator.cancel(2)
+                self.assertRaises(BurnCancelled, simulator.submit(Y[j], X[i], job=2, **long_burn).result, timeout=60)
+                self.assertEqual(0, simulator.progress(2)[PROGRESS_MINUTE])
+
+                self.assertGreater(len(simulator.burn(Y[j], X[i], timeout=60, mins=20, wind=(5., 30.))), 1)
+            finally:
+                simulator.shutdown()
@@ -0,0 +1,249 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import unittest
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+from modeling.data.current_weather import LEAN_COLUMNS, CurrentWeather, _weatherDataToDF, clear_cache
+from modeling.data.weather import Weather
+
+ADDS_COLUMNS = ("raw_text,station_id,observation_time,latitude,longitude,temp_c,dewpoint_c,wind_dir_degrees,"
+                "wind_speed_kt,wind_gust_kt,visibility_statute_mi,altim_in_hg,sea_level_pressure_mb,corrected,auto,"
+                "auto_station,maintenance_indicator_on,no_signal,lightning_sensor_off,freezing_rain_sensor_off,"
+                "present_weather_sensor_off,wx_string,sky_cover,cloud_base_ft_agl,sky_cover,cloud_base_ft_agl,"
+                "sky_cover,cloud_base_ft_agl,sky_cover,cloud_base_ft_agl,flight_category,"
+                "three_hr_pressure_tendency_mb,maxT_c,minT_c,maxT24hr_c,minT24hr_c,precip_in,pcp3hr_in,pcp6hr_in,"
+                "pcp24hr_in,snow_in,vert_vis_ft,metar_type,elevation_m")
+
+
+def adds_response(reports):
+    """
+    An ADDS METAR csv response holding (station, latitude, longitude, wind direction, wind speed) reports
+    """
+    lines = ["No errors", "No warnings", "3 ms", "data source=metars", f"{len(reports)} results", ADDS_COLUMNS]
+    for station, lat, long, wind_dir, wind_speed in reports:
+        fields = [f"{station} 181853Z {wind_dir:03d}{wind_speed:02d}KT 10SM CLR 21/08 A3002", station,
+                  "2026-10-18T18:53:00Z", str(lat), str(long), "21.1", "8.3", str(wind_dir), str(wind_speed), "",
+                  "10.0", "30.02", "1016.4"] + [""] * 17 + ["VFR"] + [""] * 11 + ["METAR", "12.0"]
+        lines.append(",".join(fields))
+    return "\n".join(lines) + "\n"
+
+
+class StandInADDS:
+    """
+    Local stand-in for the ADDS server, answering every query with the same reports and recording the queries
+    """
+
+    def __init__(self, reports, delay=0.):
+        self.queries = []
+        body, stand_in = adds_response(reports).encode(), self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.queries.append(parse_qs(urlparse(self.path).query))
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/httpparam"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FixedWeather(Weather):
+    """
+    Weather over a fixed set of stations, without any queries
+    """
+
+    def __init__(self, stations, lat, long):
+        self.stations = stations
+        super().__init__(lat, long)
+
+    def refresh_data(self):
+        return self.stations
+
+    def weather_by_station(self, station):
+        return self.data.loc[station]
+
+
+class SlowWeather(FixedWeather):
+    """
+    Weather whose station queries take a while, and fail for station K000
+    """
+    DELAY = 0.2
+
+    def weather_by_station(self, station):
+        time.sleep(self.DELAY)
+        if station == "K000":
+            raise requests.exceptions.Timeout(station)
+        return pd.DataFrame({"value": [len(station), 1.]}, index=pd.Index(["WSF2", "WDF2"], name="datatype"))
+
+
+class NearestStationTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.stations = pd.DataFrame({"latitude": rng.uniform(36, 39, 200), "longitude": rng.uniform(-123, -120, 200)},
+                                     index=[f"K{i:03d}" for i in range(200)])
+        self.weather = FixedWeather(self.stations, 37.39, -121.5)
+
+    def test_matches_geodesic(self):
+        """
+        GIVEN a set of stations around an ignition
+        WHEN the nearest stations are found with great-circle and geodesic distances
+        THEN the distances agree within half a percent and the same station is nearest
+        """
+        geodesic = self.weather.stationDistances(geodesic=True)
+        great_circle = self.weather.stationDistances()
+        np.testing.assert_allclose(geodesic, great_circle, rtol=5e-3)
+        self.assertEqual(self.weather.getNearestStation(geodesic=True), self.weather.getNearestStation())
+
+    def test_k_nearest(self):
+        """
+        GIVEN stations with several reports each
+        WHEN the k nearest are requested
+        THEN k distinct stations come back nearest first, led by the nearest station
+        """
+        self.weather.data = pd.concat([self.stations, self.stations])
+        nearest = self.weather.getNearestStation(k=5)
+        self.assertEqual(5, len(nearest.index.unique()))
+        self.assertTrue(nearest.is_monotonic_increasing)
+        self.assertEqual(self.weather.getNearestStation(), nearest.index[0])
+
+
+class ConcurrentFetchTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.stations = pd.DataFrame({"latitude": rng.uniform(36, 39, 20), "longitude": rng.uniform(-123, -120, 20)},
+                                     index=[f"K{i:03d}" for i in range(20)])
+
+    def test_batch_takes_one_request(self):
+        """
+        GIVEN twenty stations whose queries each take 0.2 seconds
+        WHEN their data is fetched with twenty queries in flight
+        THEN the batch takes about as long as one query, and merges into one frame by station and variable
+        """
+        weather = SlowWeather(self.stations.iloc[1:], 37.39, -121.5)
+        start = time.monotonic()
+        data = weather.weather_by_stations(weather.data.index, max_workers=20)
+        self.assertLess(time.monotonic() - start, 4 * SlowWeather.DELAY)
+        self.assertEqual((38, 1), data.shape)
+        self.assertEqual(["station", "datatype"], data.index.names)
+
+        nearest = FixedWeather(self.stations, 37.39, -121.5).nearest_weather(3)
+        self.assertEqual(list(self.stations.columns) + ["distance"], list(nearest.columns))
+        self.assertTrue(nearest["distance"].is_monotonic_increasing)
+
+    def test_failures(self):
+        """
+        GIVEN a station whose query times out
+        WHEN a batch including it is fetched
+        THEN the timeout is raised, or the station left out if asked
+        """
+        weather = SlowWeather(self.stations, 37.39, -121.5)
+        with self.assertRaises(requests.exceptions.Timeout):
+            weather.weather_by_stations(["K000", "K001"])
+        data = weather.weather_by_stations(["K000", "K001"], skip_failed=True)
+        self.assertEqual(["K001"], list(data.index.get_level_values("station").unique()))
+
+
+class StationIndexTests(unittest.TestCase):
+
+    def test_batch_matches_single_lookups(self):
+        """
+        GIVEN a bulk weather object over many stations, some with several reports
+        WHEN the nearest stations to a batch of ignitions are found through its index
+        THEN each matches the brute-force lookup from that ignition, with the same distances
+        """
+        rng = np.random.default_rng(1)
+        stations = pd.DataFrame({"latitude": rng.uniform(32, 42, 500), "longitude": rng.uniform(-124, -114, 500)},
+                                index=[f"K{i:03d}" for i in range(500)])
+        weather = FixedWeather.bulk(pd.concat([stations, stations.iloc[:50]]))
+        lats, longs = rng.uniform(33, 41, 40), rng.uniform(-123, -115, 40)
+
+        nearest, distances = weather.nearestStations(lats, longs, k=3)
+        self.assertEqual((40, 3), nearest.shape)
+        self.assertEqual(500, len(weather.index))
+        for lat, long, row, row_distances in zip(lats, longs, nearest, distances):
+            expected = FixedWeather(stations, lat, long).getNearestStation(k=3)
+            self.assertEqual(list(expected.index), list(row))
+            np.testing.assert_allclose(expected.to_numpy(), row_distances, rtol=1e-9)
+
+
+class CurrentWeatherTests(unittest.TestCase):
+
+    def setUp(self):
+        clear_cache()
+        self.adds = StandInADDS([("KSJC", 37.36, -121.93, 320, 12), ("KRHV", 37.33, -121.82, 300, 8),
+                                 ("KSJC", 37.36, -121.93, 310, 10)])
+        self.base_url = CurrentWeather.BASE_URL
+        CurrentWeather.BASE_URL = self.adds.url
+
+    def tearDown(self):
+        CurrentWeather.BASE_URL = self.base_url
+        self.adds.close()
+        clear_cache()
+
+    def test_cached_by_rounded_point(self):
+        """
+        GIVEN a stand-in ADDS server
+        WHEN current weather is requested twice around the same rounded point, then with another radius
+        THEN the server is queried once per radius, and stations with several reports give their first
+        """
+        first = CurrentWeather(20, 37.3923, -121.5)
+        second = CurrentWeather(20, 37.3901, -121.5012)
+        self.assertIs(first.data, second.data)
+        self.assertEqual(1, len(self.adds.queries))
+        self.assertEqual(["20;-121.5,37.39"], self.adds.queries[0]["radialDistance"])
+
+        CurrentWeather(30, 37.3923, -121.5)
+        self.assertEqual(2, len(self.adds.queries))
+
+        self.assertEqual("KRHV", second.getNearestStation())
+        weather = second.weather_by_station("KSJC")
+        self.assertEqual((12, 320), (weather["wind_speed_kt"], weather["wind_dir_degrees"]))
+
+    def test_timeout(self):
+        """
+        GIVEN a stand-in ADDS server slower than the timeout
+        WHEN current weather is requested
+        THEN the request gives up instead of hanging
+        """
+        self.adds.close()
+        self.adds = StandInADDS([("KSJC", 37.36, -121.93, 320, 12)], delay=1.)
+        CurrentWeather.BASE_URL = self.adds.url
+        with self.assertRaises(requests.exceptions.Timeout):
+            CurrentWeather(20, 37.3923, -121.5, timeout=0.1)
+
+    def test_lean_parse(self):
+        """
+        GIVEN an ADDS response with several reports for a station
+        WHEN it is parsed lean
+        THEN only the modeled columns remain, as 32 bit floats, with each station's newest report matching the full parse
+        """
+        text = adds_response([("KSJC", 37.36, -121.93, 320, 12), ("KRHV", 37.33, -121.82, 300, 8),
+                              ("KSJC", 37.36, -121.93, 310, 10)])
+        full, lean = _weatherDataToDF(text), _weatherDataToDF(text, lean=True)
+        self.assertEqual(["KSJC", "KRHV"], list(lean.index))
+        self.assertEqual(list(LEAN_COLUMNS)[1:], list(lean.columns))
+        self.assertEqual(np.float32, lean["wind_speed_kt"].dtype)
+        for station in ["KSJC", "KRHV"]:
+            expected = CurrentWeather.weather_by_station(CurrentWeather.bulk(full), station)
+            record = CurrentWeather.weather_by_station(CurrentWeather.bulk(lean), station)
+            for column in ["latitude", "wind_dir_degrees", "wind_speed_kt"]:
+                self.assertAlmostEqual(expected[column], record[column], places=4)
+            self.assertEqual(expected["observation_time"], record["observation_time"])
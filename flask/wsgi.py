@@ -1,8 +1,12 @@
-from application import init_app
+from application import get_simulator, init_app
 
 
 app = init_app()
 
 if __name__ == "__main__":
+    # start the simulation workers with the server, so the first fire doesn't wait for them. Only here: the workers
+    # are spawned, re-importing this module as __mp_main__, and must not start workers of their own as they do
+    get_simulator(app)
+
     # follows standard design pattern from https://hackersandslackers.com/flask-application-factory/.
     app.run(host="127.0.0.1")